@@ -1,35 +1,60 @@
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime
 import glob
+import io
+import logging
+import mimetypes
+import base64
+import binascii
 import re
+import shutil
+import tempfile
+import threading
 import time
-from fastapi import FastAPI, Path, UploadFile, File, HTTPException, Request
-from fastapi.responses import FileResponse, Response
+import weakref
+from fastapi import FastAPI, Path, UploadFile, File, HTTPException, Request, BackgroundTasks, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, Response
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from fastapi.security.utils import get_authorization_scheme_param
 from sqlalchemy.orm import Session 
-from ultralytics import YOLO
 from PIL import Image
 import sqlite3
 import os
 import uuid
-import shutil
-from typing import Optional
+from typing import List, Optional
 from fastapi import Depends
 from starlette.status import HTTP_401_UNAUTHORIZED
 from typing import Annotated
 from db import engine
 from models import Base
 from fastapi import Query
-import torch
+import cv2
+import numpy as np
 from fastapi.responses import FileResponse
-from db import get_db
+from db import DB_ASYNC, get_async_db, get_db, SessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession
 import queries
-import boto3
+import queries_async
+import migrations
+import backends
+import metrics
 from botocore.exceptions import BotoCoreError, ClientError
-torch.cuda.is_available = lambda: False
-
+from fastapi.concurrency import run_in_threadpool
+from inference import BatchScheduler, InferencePool, InferenceQueueFull
+from write_behind import WriteBehindQueue
+from pagination import decode_cursor, encode_cursor, ndjson_response, page_response, sse_response
+from auth import DUMMY_HASH, AuthCache, verify_password
+from result_cache import ResultCache, content_digest
+from s3_storage import S3Storage, build_s3_client
+from video import VideoDecodeError, iter_frames, next_chunk, open_video
+from model_registry import LoadedModel, ModelRegistry, UnknownModel, read_swaps, record_swap
 
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# every queries.py / queries_async.py call is timed in db_query_seconds on /metrics
+metrics.instrument_queries(queries)
+metrics.instrument_queries(queries_async)
 
 security = HTTPBasic()
 
@@ -38,6 +63,64 @@ PREDICTED_DIR = "uploads/predicted"
 DB_PATH = "predictions.db"
 AWS_REGION = os.getenv("AWS_REGION")
 AWS_S3_BUCKET = os.getenv("AWS_S3_BUCKET")
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+INFERENCE_QUEUE_DEPTH = int(os.getenv("INFERENCE_QUEUE_DEPTH", "16"))
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "8"))
+INFERENCE_BATCH_WINDOW_MS = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "10"))
+SAVE_ORIGINALS = os.getenv("SAVE_ORIGINALS", "true").lower() in ("1", "true", "yes")
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_FAILURE_TTL = float(os.getenv("AUTH_FAILURE_TTL", "30"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "1000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))
+WRITE_BEHIND_INTERVAL_MS = float(os.getenv("WRITE_BEHIND_INTERVAL_MS", "50"))
+WRITE_BEHIND_RETRIES = int(os.getenv("WRITE_BEHIND_RETRIES", "3"))
+WRITE_BEHIND_RETRY_BACKOFF_MS = float(os.getenv("WRITE_BEHIND_RETRY_BACKOFF_MS", "100"))
+# skip drawing the annotated image in /predict; the image endpoints render it on first request
+LAZY_ANNOTATION = os.getenv("LAZY_ANNOTATION", "false").lower() in ("1", "true", "yes")
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "0"))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_REUSE_UID = os.getenv("RESULT_CACHE_REUSE_UID", "false").lower() in ("1", "true", "yes")
+BATCH_MAX_IMAGES = int(os.getenv("BATCH_MAX_IMAGES", "256"))
+VIDEO_FRAME_STRIDE = int(os.getenv("VIDEO_FRAME_STRIDE", "5"))
+S3_MAX_CONNECTIONS = int(os.getenv("S3_MAX_CONNECTIONS", "32"))
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", "16"))
+S3_BACKGROUND_UPLOAD = os.getenv("S3_BACKGROUND_UPLOAD", "false").lower() in ("1", "true", "yes")
+S3_UPLOAD_RETRIES = int(os.getenv("S3_UPLOAD_RETRIES", "3"))
+# run dummy inferences at startup so the first real request doesn't pay for lazy initialisation
+WARMUP = os.getenv("WARMUP", "true").lower() in ("1", "true", "yes")
+WARMUP_IMAGE_SIZE = int(os.getenv("WARMUP_IMAGE_SIZE", "640"))
+MODEL_NAME = "yolov8n.pt"
+# registry name of MODEL_NAME; /predict uses it when no ?model= is given
+DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "yolov8n")
+# more models for ?model=, as "<name>=<weights>" pairs, e.g. "yolov8s=yolov8s.pt,signs=weights/signs.pt"
+MODELS = dict(
+    pair.split("=", 1) for pair in os.getenv("MODELS", "").split(",") if "=" in pair
+)
+MAX_LOADED_MODELS = int(os.getenv("MAX_LOADED_MODELS", "2"))
+# file where /admin/models/{name} records swaps so every worker process applies them; serve.py sets it
+MODEL_SWAP_FILE = os.getenv("MODEL_SWAP_FILE")
+MODEL_SWAP_INTERVAL = float(os.getenv("MODEL_SWAP_INTERVAL", "2"))
+# usernames allowed to swap model weights through /admin/models/{name}
+ADMIN_USERS = {name for name in os.getenv("ADMIN_USERS", "").split(",") if name}
+# torch (eager PyTorch), onnx (ONNX Runtime) or openvino; see backends.py
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "torch").lower()
+MODEL_IMAGE_SIZE = int(os.getenv("MODEL_IMAGE_SIZE", "640"))
+# CPU threads per onnx / openvino model call (0: all cores); serve.py sets it for each worker
+MODEL_THREADS = int(os.getenv("MODEL_THREADS", "0"))
+# opt-in INT8 model for MODEL_BACKEND=onnx: dynamic or static (calibrated on QUANTIZATION_CALIBRATION)
+MODEL_QUANTIZATION = os.getenv("MODEL_QUANTIZATION", "").lower() or None
+QUANTIZATION_CALIBRATION = os.getenv("QUANTIZATION_CALIBRATION", "*.jpg")
+MAX_IMAGE_SIZE = int(os.getenv("MAX_IMAGE_SIZE", "1280"))
+MAX_DETECTIONS = int(os.getenv("MAX_DETECTIONS", "1000"))
+# "<pending inference calls>:<image size>" pairs, e.g. "4:480,12:320"; while that many model calls are
+# running or queued, new images run at most at that size
+ADAPTIVE_IMGSZ = sorted(
+    (tuple(int(v) for v in step.split(":")) for step in os.getenv("ADAPTIVE_IMGSZ", "").split(",") if step.strip()),
+    reverse=True,
+)
 labels = [
    "person", "bicycle", "car", "motorcycle", "airplane", "bus", "train", "truck", "boat", "traffic light", "fire hydrant", "stop sign", "parking meter", "bench", "bird", "cat", "dog", "horse", "sheep", "cow", "elephant", "bear", "zebra", "giraffe", "backpack", "umbrella", "handbag", "tie", "suitcase", "frisbee", "skis", "snowboard", "sports ball", "kite", "baseball bat", "baseball glove", "skateboard", "surfboard", "tennis racket", "bottle", "wine glass", "cup", "fork", "knife", "spoon", "bowl", "banana", "apple", "sandwich", "orange", "broccoli", "carrot", "hot dog", "pizza", "donut", "cake", "chair", "couch", "potted plant", "bed", "dining table", "toilet", "tv", "laptop", "mouse", "remote", "keyboard", "cell phone", "microwave", "oven", "toaster", "sink", "refrigerator", "book", "clock", "vase", "scissors", "teddy bear", "hair drier", "toothbrush"
 ]
@@ -45,8 +128,105 @@ labels = [
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(PREDICTED_DIR, exist_ok=True)
 
-# Download the AI model (tiny model ~6MB)
-model = YOLO("yolov8n.pt")  
+def load_weights(weights: str):
+    # torch and ultralytics are only imported here so the app starts (and /health answers) quickly
+    import torch
+    torch.cuda.is_available = lambda: False
+    # Download the AI model (tiny model ~6MB), exported for MODEL_BACKEND if needed
+    return backends.load_model(
+        weights,
+        MODEL_BACKEND,
+        imgsz=MODEL_IMAGE_SIZE,
+        quantization=MODEL_QUANTIZATION,
+        calibration=QUANTIZATION_CALIBRATION,
+        threads=MODEL_THREADS,
+    )
+
+
+# models are loaded on first use; the default one is never evicted
+model_registry = ModelRegistry(load_weights, max_loaded=MAX_LOADED_MODELS, pinned=[DEFAULT_MODEL])
+model_registry.register(DEFAULT_MODEL, MODEL_NAME)
+for name, weights in MODELS.items():
+    model_registry.register(name, weights)
+
+# the default model; loaded by the lifespan warm-up, or by the first request if the app is used without it
+model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    global model
+    if model is None:
+        with _model_lock:
+            if model is None:
+                model = model_registry.get(DEFAULT_MODEL).model
+    return model
+
+
+def resolve_model(name: Optional[str] = None) -> LoadedModel:
+    """The model for ?model=`name` (the default one when None), loading it if needed."""
+    if name is None or name == DEFAULT_MODEL:
+        default = get_model()
+        current = model_registry.loaded(DEFAULT_MODEL)
+        if current is not None and current.model is default:
+            return current
+        # set from outside the registry, e.g. in tests
+        return LoadedModel(DEFAULT_MODEL, None, default)
+    return model_registry.get(name)
+
+# model calls run on their own worker threads so a slow image never blocks the event loop
+inference_pool = InferencePool(workers=INFERENCE_WORKERS, queue_depth=INFERENCE_QUEUE_DEPTH)
+
+# An ultralytics model is not safe to call from two threads at once: it stores the call's
+# settings on its predictor before taking the predictor's lock, so concurrent calls can run
+# with each other's conf / iou / classes / imgsz. Each model runs one call at a time; the
+# inference workers overlap calls on different models, and a call gets all of the threads.
+_call_locks = weakref.WeakKeyDictionary()
+_call_locks_lock = threading.Lock()
+
+
+def call_lock(net) -> threading.Lock:
+    with _call_locks_lock:
+        lock = _call_locks.get(net)
+        if lock is None:
+            lock = _call_locks[net] = threading.Lock()
+        return lock
+
+
+def predict_batch(sources: list, handle: Optional[LoadedModel] = None, **params):
+    # params are the per-request settings from inference_settings(): imgsz, conf, iou, max_det, classes
+    if "classes" in params:
+        params["classes"] = list(params["classes"])
+    net = handle.model if handle is not None else get_model()
+    metrics.INFERENCE_BATCH_SIZE.observe(len(sources))
+    with call_lock(net), metrics.INFERENCE_BATCH_SECONDS.time():
+        return net(sources, device="cpu", batch=len(sources), **params)
+
+
+# images from concurrent /predict calls are grouped into a single model call
+batch_scheduler = BatchScheduler(
+    inference_pool,
+    predict_batch,
+    max_batch=INFERENCE_BATCH_SIZE,
+    window_ms=INFERENCE_BATCH_WINDOW_MS,
+)
+
+# successful logins are remembered for AUTH_CACHE_TTL seconds so most requests skip the users table,
+# failed ones for AUTH_FAILURE_TTL so bad credentials don't cost a password hash every time
+auth_cache = AuthCache(ttl=AUTH_CACHE_TTL, max_size=AUTH_CACHE_SIZE, failure_ttl=AUTH_FAILURE_TTL)
+
+# opt-in: /predict hands its rows to a background writer instead of committing them itself
+write_behind = WriteBehindQueue(
+    SessionLocal,
+    max_pending=WRITE_BEHIND_MAX_PENDING,
+    batch_size=WRITE_BEHIND_BATCH_SIZE,
+    interval_ms=WRITE_BEHIND_INTERVAL_MS,
+    retries=WRITE_BEHIND_RETRIES,
+    retry_backoff_ms=WRITE_BEHIND_RETRY_BACKOFF_MS,
+) if WRITE_BEHIND else None
+
+# opt-in: an image that was already processed (same bytes or S3 ETag) reuses the stored result
+result_cache = ResultCache(ttl=RESULT_CACHE_TTL, max_size=RESULT_CACHE_SIZE) if RESULT_CACHE_TTL > 0 else None
 
 ############################################################### helper functions ###############################################
 
@@ -57,9 +237,43 @@ model = YOLO("yolov8n.pt")
 # the optional is to for the optional predict endpoint
 
 def verify_credentials(credentials: HTTPBasicCredentials, db: Session) -> int | None:
+    user_id = auth_cache.get(credentials.username, credentials.password)
+    if user_id is not None:
+        return user_id
+    if auth_cache.rejected(credentials.username, credentials.password):
+        return None
     user = queries.get_user_by_credentials(db, credentials.username, credentials.password)
-    return user.id if user else None
+    return remember_login(credentials, user)
+
+def remember_login(credentials: HTTPBasicCredentials, user) -> int | None:
+    # a checked login goes into the auth cache either way
+    if user is None:
+        auth_cache.put_failure(credentials.username, credentials.password)
+        return None
+    auth_cache.put(credentials.username, credentials.password, user.id)
+    return user.id
 
+async def verify_credentials_async(credentials: HTTPBasicCredentials, db) -> int | None:
+    """
+    verify_credentials() for async endpoints. With an AsyncSession (DB_ASYNC) a cache hit is
+    answered on the event loop and only the password hash of a miss runs on a worker thread;
+    a sync session needs a worker thread for the whole check.
+    """
+    if not isinstance(db, AsyncSession):
+        return await run_in_threadpool(verify_credentials, credentials, db)
+    user_id = auth_cache.get(credentials.username, credentials.password)
+    if user_id is not None:
+        return user_id
+    if auth_cache.rejected(credentials.username, credentials.password):
+        return None
+    user = await queries_async.get_user_by_username(db, credentials.username)
+    # an unknown username is checked against the dummy hash so it takes as long as a wrong password
+    stored = user.pass_field if user is not None else DUMMY_HASH
+    matches = await run_in_threadpool(verify_password, credentials.password, stored)
+    return remember_login(credentials, user if matches else None)
+
+# read endpoints take their session from here: an AsyncSession when DB_ASYNC is on, else the usual one
+get_read_db = get_async_db if DB_ASYNC else get_db
 
 async def optional_auth(request: Request) -> Optional[HTTPBasicCredentials]:
     try:
@@ -73,14 +287,34 @@ def get_current_user(
 ) -> int | None:
     user_id = verify_credentials(credentials, db)
     if user_id is None:
-        raise HTTPException(
-            status_code=HTTP_401_UNAUTHORIZED,
-            detail="Invalid or missing credentials",
-            headers={"WWW-Authenticate": "Basic"},
-        )
+        raise invalid_credentials()
     return user_id
 
-s3 = boto3.client("s3", region_name=AWS_REGION) if AWS_REGION else None
+async def get_current_user_async(
+    credentials: Optional[HTTPBasicCredentials] = Depends(security),
+    db: Session = Depends(get_read_db),
+) -> int | None:
+    # get_current_user() for the async read endpoints; it shares their session (dependencies
+    # are resolved once per request)
+    user_id = await verify_credentials_async(credentials, db)
+    if user_id is None:
+        raise invalid_credentials()
+    return user_id
+
+def invalid_credentials() -> HTTPException:
+    return HTTPException(
+        status_code=HTTP_401_UNAUTHORIZED,
+        detail="Invalid or missing credentials",
+        headers={"WWW-Authenticate": "Basic"},
+    )
+
+# S3 calls run on their own bounded thread pool over a pooled client
+s3 = S3Storage(
+    build_s3_client(AWS_REGION, max_connections=S3_MAX_CONNECTIONS),
+    AWS_S3_BUCKET,
+    max_concurrency=S3_MAX_CONCURRENCY,
+    upload_retries=S3_UPLOAD_RETRIES,
+) if AWS_REGION else None
 
 def require_s3():
     if not AWS_REGION or not AWS_S3_BUCKET:
@@ -89,30 +323,654 @@ def require_s3():
         raise HTTPException(status_code=500, detail="S3 client not initialized.")
     return s3
 
+async def optional_user(credentials: Optional[HTTPBasicCredentials], db: Session) -> int | None:
+    if not credentials:
+        return None
+    try:
+        # password hashing is CPU-bound, keep it off the event loop
+        return await run_in_threadpool(verify_credentials, credentials, db)
+    except HTTPException:
+        return None
+
+def websocket_credentials(websocket: WebSocket) -> Optional[HTTPBasicCredentials]:
+    # the same Basic header HTTPBasic reads, taken from the handshake request
+    scheme, param = get_authorization_scheme_param(websocket.headers.get("Authorization"))
+    if scheme.lower() != "basic":
+        return None
+    try:
+        username, separator, password = base64.b64decode(param).decode("ascii").partition(":")
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    if not separator:
+        return None
+    return HTTPBasicCredentials(username=username, password=password)
+
 def _safe_prefix(raw: str | None) -> str:
     if not raw:
         return "anonymous"
     # allow letters, digits, slash, dash, underscore (avoid weird chars)
     safe = re.sub(r"[^a-zA-Z0-9/_-]", "_", raw)
     return safe or "anonymous"
+
+def inference_settings(
+    imgsz: Optional[int] = Query(None, ge=32, le=MAX_IMAGE_SIZE, description="Model input size, a multiple of 32"),
+    conf: Optional[float] = Query(None, ge=0, le=1, description="Minimum confidence of a detection"),
+    iou: Optional[float] = Query(None, ge=0, le=1, description="IoU threshold of non-maximum suppression"),
+    max_det: Optional[int] = Query(None, ge=1, le=MAX_DETECTIONS, description="Maximum detections per image"),
+    classes: List[str] = Query(None, description="Only detect these labels"),
+) -> dict:
+    """
+    Per-request model settings; only the ones the caller set are passed to the model. The
+    class filter is still by label here; model_settings() maps it to the chosen model's classes.
+    """
+    if imgsz is not None and imgsz % 32:
+        raise HTTPException(status_code=400, detail="imgsz must be a multiple of 32")
+    params = {"imgsz": imgsz, "conf": conf, "iou": iou, "max_det": max_det}
+    if classes:
+        # a tuple, so requests with the same filter can share a batch
+        params["classes"] = tuple(sorted(set(classes)))
+    return {name: value for name, value in params.items() if value is not None}
+
+async def requested_model(name: Optional[str]) -> LoadedModel:
+    # loading can take seconds, so it happens off the event loop
+    try:
+        return await run_in_threadpool(resolve_model, name)
+    except UnknownModel:
+        raise HTTPException(status_code=400, detail=f"Unknown model: {name}")
+
+def model_names(handle: LoadedModel) -> dict:
+    names = handle.model.names
+    return names if isinstance(names, dict) else dict(enumerate(names))
+
+def model_settings(handle: LoadedModel, params: dict) -> dict:
+    """`params` with the class filter turned into class ids of `handle`'s model; unknown labels are a 400."""
+    if "classes" not in params:
+        return params
+    ids = {label: idx for idx, label in model_names(handle).items()}
+    unknown = [label for label in params["classes"] if label not in ids]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown labels: {', '.join(unknown)}")
+    return {**params, "classes": tuple(sorted(ids[label] for label in params["classes"]))}
+
+def choose_imgsz(requested: Optional[int]) -> int:
+    """
+    The input size for a new image: the requested one (or MODEL_IMAGE_SIZE), capped by the
+    ADAPTIVE_IMGSZ step for the current inference backlog so a busy server degrades instead of timing out.
+    """
+    imgsz = requested or MODEL_IMAGE_SIZE
+    pending = inference_pool.pending
+    for depth, size in ADAPTIVE_IMGSZ:
+        if pending >= depth:
+            return min(imgsz, size)
+    return imgsz
+
+async def run_inference(source, params: Optional[dict] = None):
+    try:
+        return await batch_scheduler.submit(source, **(params or {}))
+    except InferenceQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Inference queue is full, try again later",
+            headers={"Retry-After": "1"},
+        )
+
+async def read_query(name: str, db, *args, **kwargs):
+    # async sessions await the queries_async twin; sync ones run the queries.py version on a worker thread
+    if isinstance(db, AsyncSession):
+        return await getattr(queries_async, name)(db, *args, **kwargs)
+    return await run_in_threadpool(getattr(queries, name), db, *args, **kwargs)
+
+def find_prediction(db: Session, uid: str):
+    # predictions still waiting in the write-behind buffer are not in the database yet
+    if write_behind is not None:
+        pending = write_behind.get_pending(uid)
+        if pending is not None:
+            return pending
+    return queries.get_prediction_by_uid(db, uid)
+
+def detection_to_dict(obj) -> dict:
+    return {
+        "label": obj.label,
+        "score": obj.score,
+        "box": obj.box,
+        "prediction_uid": obj.prediction_uid
+    }
+
+def stream_rows(query_fn, *args):
+    # a streamed response outlives the request's session, so it reads through its own
+    db = SessionLocal()
+    try:
+        yield from query_fn(db, *args)
+    finally:
+        db.close()
+
+def decode_image(data: bytes) -> np.ndarray:
+    # same BGR layout the model gets when it reads a file with cv2.imread
+    with metrics.stage("decode"):
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise HTTPException(status_code=400, detail="Invalid image file")
+    return image
+
+def save_upload(data: bytes, path: str):
+    with open(path, "wb") as f:
+        f.write(data)
+
+def save_annotated(result, path: str):
+    with metrics.stage("annotate"):
+        annotated_frame = result.plot()
+        annotated_image = Image.fromarray(annotated_frame)
+        annotated_image.save(path)
+
+def encode_annotated(result, ext: str) -> bytes:
+    # same image save_annotated writes, encoded in memory for put_object
+    buffer = io.BytesIO()
+    image_format = Image.registered_extensions().get(ext.lower(), "JPEG")
+    with metrics.stage("annotate"):
+        Image.fromarray(result.plot()).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def render_annotated(original_path: str, detections, path: str):
+    # draws the stored detections the way result.plot() does, so lazy and eager images match
+    image = cv2.imread(original_path)
+    if image is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    from ultralytics.utils.plotting import Annotator, colors
+
+    annotator = Annotator(image, example=str(labels))
+    for detection in reversed(detections):
+        class_idx = labels.index(detection.label) if detection.label in labels else 0
+        annotator.box_label(detection.box, f"{detection.label} {detection.score:.2f}", color=colors(class_idx, True))
+    # write then rename so a concurrent request never serves a half-written file
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp{os.path.splitext(path)[1]}"
+    Image.fromarray(annotator.result()).save(tmp_path)
+    os.replace(tmp_path, path)
+
+def ensure_annotated(db: Session, prediction) -> bool:
+    """
+    Render a prediction's annotated image if it is not on disk yet.
+    Returns False when there is nothing to render it from.
+    """
+    path = prediction.predicted_image
+    if not path or path.startswith("s3://"):
+        return False
+    if os.path.exists(path):
+        return True
+    if not prediction.original_image or not os.path.exists(prediction.original_image):
+        return False
+    # the detections of a prediction still in the write-behind buffer are not in the database yet
+    if write_behind is not None and write_behind.is_pending(prediction.uid):
+        write_behind.flush(timeout=5)
+    render_annotated(prediction.original_image, queries.get_detections_by_uid(db, prediction.uid), path)
+    return True
+
+def save_prediction(
+    db: Session, uid: str, original_image, predicted_image, username, detections, image_width, image_height,
+    model_name=None, model_version=None,
+):
+    # Persist session + detections in one transaction, or hand them to the write-behind buffer
+    with metrics.stage("db_write"):
+        queued = write_behind is not None and write_behind.put(
+            uid, original_image, predicted_image, username, detections,
+            image_width=image_width, image_height=image_height, model_name=model_name, model_version=model_version,
+        )
+        if not queued:
+            queries.save_prediction_with_detections(
+                db,
+                uid,
+                original_image,
+                predicted_image,
+                username,
+                detections,
+                image_width=image_width,
+                image_height=image_height,
+                model_name=model_name,
+                model_version=model_version,
+            )
+
+def cached_result(key: str) -> Optional[dict]:
+    cached = result_cache.get(key)
+    if cached is None or cached["predicted_image"].startswith("s3://"):
+        return cached
+    # the local files may have been deleted since the result was cached; an annotated
+    # image that was never rendered is fine as long as the original is still there
+    original = cached["original_image"]
+    if not os.path.exists(cached["predicted_image"]) and not (original and os.path.exists(original)):
+        result_cache.discard(key)
+        return None
+    return cached
+
+def reuse_cached_result(uid: str, cached: dict, user_id, prefix: str) -> dict:
+    # the first prediction is only handed out again to whoever may read it, in the same folder
+    if RESULT_CACHE_REUSE_UID and cached["owner"] == (user_id, prefix):
+        return {**cached, "cached": True, "stored": True}
+    # a new prediction row that points at the files of the first one
+    return {**cached, "uid": uid, "cached": True, "stored": False}
+
+async def reuse_cached_s3_result(uid: str, cached: dict, user_id, prefix: str, img: str, ext: str) -> dict:
+    record = reuse_cached_result(uid, cached, user_id, prefix)
+    if record["stored"]:
+        return record
+    # the annotated image is copied into the caller's <prefix>/predicted/ rather than pointing
+    # at another chat's object; ClientError (e.g. a background upload not finished yet) is a miss
+    predicted_key = f"{prefix}/predicted/{uid}{ext}"
+    source_key = cached["predicted_image"].removeprefix(f"s3://{AWS_S3_BUCKET}/")
+    await require_s3().copy(source_key, predicted_key)
+    return {
+        **record,
+        "original_image": f"s3://{AWS_S3_BUCKET}/{img}",
+        "predicted_image": f"s3://{AWS_S3_BUCKET}/{predicted_key}",
+    }
+
+def extract_detections(result, names=None) -> list[dict]:
+    # names: class names of the model that produced the result (the default model's if not given)
+    names = names if names is not None else get_model().names
+    detections = []
+    for box in result.boxes:
+        label_idx = int(box.cls[0].item())
+        label = names[label_idx]
+        score = float(box.conf[0])
+        bbox = box.xyxy[0].tolist()
+        detections.append({"label": label, "score": score, "box": bbox})
+    metrics.record_detections(detections)
+    return detections
+
+async def process_image(
+    uid: str,
+    prefix: str,
+    background_tasks: BackgroundTasks,
+    data: Optional[bytes] = None,
+    ext: str = "",
+    img: Optional[str] = None,
+    params: Optional[dict] = None,
+    handle: Optional[LoadedModel] = None,
+    user_id: Optional[int] = None,
+) -> dict:
+    """
+    Run one image (uploaded bytes, or the S3 key `img`) through the model `handle` (the
+    default one if None) with the settings in `params` (see model_settings()) and store its
+    files. Returns the prediction record - uid, image paths, detections, size, the input
+    size and the model used - for the caller to save; "stored" is set when a cache hit
+    points at an existing prediction of `user_id`.
+    """
+    cache_key = None
+    if handle is None:
+        handle = await run_in_threadpool(resolve_model, None)
+    # the input size is picked now, so the cache key matches what the model will run
+    params = {**(params or {}), "imgsz": choose_imgsz((params or {}).get("imgsz"))}
+    # results are cached per model version, so swapped weights never serve stale detections
+    cache_model = f"{handle.name}@{handle.version}"
+
+    # Either: S3 download (if img=...) OR classic file upload
+    if img:
+        storage = require_s3()
+        ext = os.path.splitext(img)[1] or ".jpg"
+        try:
+            if result_cache is not None:
+                # the ETag identifies the object's content without downloading it
+                etag = await storage.etag(img)
+                cache_key = ResultCache.key(f"s3:{AWS_S3_BUCKET}:{etag}", cache_model, **params)
+                cached = cached_result(cache_key)
+                if cached is not None:
+                    try:
+                        return await reuse_cached_s3_result(uid, cached, user_id, prefix, img, ext)
+                    except ClientError:
+                        result_cache.discard(cache_key)
+            # read the object straight into memory; nothing is written under UPLOAD_DIR
+            with metrics.stage("s3_download"):
+                data = await storage.get(img)
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code", "")
+            if code in ("NoSuchKey", "404"):
+                raise HTTPException(status_code=404, detail=f"S3 key not found: {img}")
+            raise HTTPException(status_code=502, detail=f"S3 download error: {str(e)}")
+
+        image = await run_in_threadpool(decode_image, data)
+        with metrics.stage("inference"):
+            result = await run_inference(image, {**params, "handle": handle})
+        image_height, image_width = image.shape[:2]
+
+        # Create annotated image and upload to S3 under <prefix>/predicted/<uuid>.<ext>
+        predicted_key = f"{prefix}/predicted/{uid}{ext}"
+        body = await run_in_threadpool(encode_annotated, result, ext)
+        content_type = mimetypes.guess_type(predicted_key)[0] or "image/jpeg"
+        if S3_BACKGROUND_UPLOAD:
+            # the response does not wait for the upload; failures are retried and counted in /stats/s3
+            storage.upload_in_background(predicted_key, body, content_type)
+        else:
+            try:
+                with metrics.stage("s3_upload"):
+                    await storage.put(predicted_key, body, content_type)
+            except ClientError as e:
+                raise HTTPException(status_code=502, detail=f"S3 upload error: {str(e)}")
+
+        # store S3 URIs for the S3 flow
+        original_image = f"s3://{AWS_S3_BUCKET}/{img}"
+        predicted_image = f"s3://{AWS_S3_BUCKET}/{predicted_key}"
+
+    else:
+        if result_cache is not None:
+            cache_key = ResultCache.key(await run_in_threadpool(content_digest, data), cache_model, **params)
+            cached = cached_result(cache_key)
+            if cached is not None:
+                return reuse_cached_result(uid, cached, user_id, prefix)
+        image = await run_in_threadpool(decode_image, data)
+
+        # the model gets the decoded array; keeping the original on disk happens after the response
+        original_image = None
+        if LAZY_ANNOTATION:
+            # the annotated image is drawn from the original later, so it has to be there before we answer
+            original_image = os.path.join(UPLOAD_DIR, uid + ext)
+            await run_in_threadpool(save_upload, data, original_image)
+        elif SAVE_ORIGINALS:
+            original_image = os.path.join(UPLOAD_DIR, uid + ext)
+            background_tasks.add_task(save_upload, data, original_image)
+
+        with metrics.stage("inference"):
+            result = await run_inference(image, {**params, "handle": handle})
+        image_height, image_width = image.shape[:2]
+
+        # Local flow: keep your existing local behavior
+        predicted_image = os.path.join(PREDICTED_DIR, uid + ext)
+        if not LAZY_ANNOTATION:
+            await run_in_threadpool(save_annotated, result, predicted_image)
+
+    record = {
+        "uid": uid,
+        "original_image": original_image,
+        "predicted_image": predicted_image,
+        "detections": extract_detections(result, handle.model.names),
+        "image_width": image_width,
+        "image_height": image_height,
+        "imgsz": params["imgsz"],
+        "model_name": handle.name,
+        "model_version": handle.version,
+    }
+    if cache_key is not None:
+        result_cache.put(cache_key, {**record, "owner": (user_id, prefix)})
+    return {**record, "cached": False, "stored": False}
+
+def copy_upload(upload: UploadFile, path: str):
+    with open(path, "wb") as f:
+        shutil.copyfileobj(upload.file, f, 1024 * 1024)
+
+async def run_frames(frames: list, handle: Optional[LoadedModel] = None):
+    # frames are batched already, so they go straight to the pool; when it is full the video waits
+    while True:
+        try:
+            return await inference_pool.run(predict_batch, frames, handle=handle)
+        except InferenceQueueFull:
+            await asyncio.sleep(0.05)
+
+async def stream_video(
+    capture, source: str, stride: int, max_frames: Optional[int], username, cleanup_path: Optional[str],
+    handle: Optional[LoadedModel] = None,
+):
+    """
+    Run every `stride`-th frame of an opened video through the model, INFERENCE_BATCH_SIZE
+    frames per call, and yield each frame's detections once its chunk is saved. Only one
+    chunk of decoded frames is held at a time.
+    """
+    frames = iter_frames(capture, stride, max_frames)
+    db = SessionLocal()
+    try:
+        if handle is None:
+            handle = await run_in_threadpool(resolve_model, None)
+        while True:
+            chunk = await run_in_threadpool(next_chunk, frames, max(1, INFERENCE_BATCH_SIZE))
+            if not chunk:
+                break
+            results = await run_frames([frame for _, _, frame in chunk], handle)
+            records, rows = [], []
+            for (index, timestamp_ms, frame), result in zip(chunk, results):
+                uid = str(uuid.uuid4())
+                detections = extract_detections(result, handle.model.names)
+                frame_height, frame_width = frame.shape[:2]
+                records.append({
+                    "uid": uid,
+                    "original_image": f"{source}#frame={index}",
+                    "predicted_image": None,
+                    "detections": detections,
+                    "image_width": frame_width,
+                    "image_height": frame_height,
+                    "model_name": handle.name,
+                    "model_version": handle.version,
+                })
+                rows.append({
+                    "frame": index,
+                    "timestamp_ms": round(timestamp_ms, 1),
+                    "prediction_uid": uid,
+                    "detection_count": len(detections),
+                    "detections": detections,
+                })
+            await run_in_threadpool(save_prediction_records, db, records, username)
+            for row in rows:
+                yield row
+    finally:
+        frames.close()
+        capture.release()
+        db.close()
+        if cleanup_path:
+            os.remove(cleanup_path)
+
+async def receive_frames(websocket: WebSocket, mailbox: asyncio.Queue, stats: dict):
+    """
+    Read frames off the socket as fast as they arrive. The mailbox holds one frame; a frame
+    that is still waiting when a newer one arrives is stale and gets dropped.
+    """
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            data = message.get("bytes")
+            if data is None:
+                continue  # frames are binary messages; text is ignored
+            stats["received"] += 1
+            if mailbox.full():
+                mailbox.get_nowait()
+                stats["dropped"] += 1
+            mailbox.put_nowait((stats["received"] - 1, data))
+    finally:
+        if mailbox.full():
+            mailbox.get_nowait()
+        mailbox.put_nowait(None)
+
+def prediction_summary(record: dict, start_time: float) -> dict:
+    return {
+        "prediction_uid": record["uid"],
+        "detection_count": len(record["detections"]),
+        "labels": [d["label"] for d in record["detections"]],
+        "time_took": round(time.time() - start_time, 2),
+        "cached": record["cached"],
+        "imgsz": record["imgsz"],
+        "model": record["model_name"],
+        "model_version": record["model_version"],
+    }
+
+def save_prediction_records(db: Session, records: list[dict], username):
+    # one commit for every image of a /predict/batch group
+    rows = []
+    for record in records:
+        queued = write_behind is not None and write_behind.put(
+            record["uid"], record["original_image"], record["predicted_image"], username,
+            record["detections"], image_width=record["image_width"], image_height=record["image_height"],
+            model_name=record.get("model_name"), model_version=record.get("model_version"),
+        )
+        if not queued:
+            rows.append({**record, "user_id": username, "timestamp": datetime.now()})
+    with metrics.stage("db_write"):
+        queries.save_prediction_batch(db, rows)
+
+async def stream_batch(
+    sources: list[dict], prefix: str, username, background_tasks: BackgroundTasks,
+    params: Optional[dict] = None, handle: Optional[LoadedModel] = None,
+):
+    """
+    Process a /predict/batch request and yield one result per image as they finish. Images
+    that finish together are saved with a single commit before their results are sent.
+    """
+    # enough images in flight to fill every inference worker with a full batch, and no more,
+    # so one large request cannot overflow the inference queue
+    in_flight = asyncio.Semaphore(max(1, INFERENCE_BATCH_SIZE * INFERENCE_WORKERS))
+
+    async def run(index: int, source: dict) -> dict:
+        name = {"img": source["img"]} if "img" in source else {"filename": source["filename"]}
+        async with in_flight:
+            start_time = time.time()
+            try:
+                record = await process_image(
+                    str(uuid.uuid4()), prefix, background_tasks,
+                    data=source.get("data"), ext=source.get("ext", ""), img=source.get("img"), params=params, handle=handle,
+                    user_id=username,
+                )
+            except HTTPException as e:
+                return {"index": index, **name, "status_code": e.status_code, "error": e.detail}
+            except Exception:
+                # the model, S3 or a decoder failing on one image must not end the stream for the others
+                logger.exception("batch image %s failed", index)
+                return {"index": index, **name, "status_code": 500, "error": "Internal error while processing the image"}
+        return {"index": index, **name, **prediction_summary(record, start_time), "record": record}
+
+    tasks = {asyncio.create_task(run(index, source)) for index, source in enumerate(sources)}
+    db = SessionLocal()
+    try:
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            results = sorted((task.result() for task in done), key=lambda result: result["index"])
+            records = [r["record"] for r in results if "record" in r and not r["record"]["stored"]]
+            if records:
+                await run_in_threadpool(save_prediction_records, db, records, username)
+            for result in results:
+                result.pop("record", None)
+                yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+        db.close()
+
 ##########################################################  end of helper functions ############################################
 # Initialize SQLite
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    # creates missing tables and adds indexes to predictions.db files made by older versions
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        queries.add_test_user(db)
+    finally:
+        db.close()
+
 
-init_db()
-db = next(get_db())
-queries.add_test_user(db)
+# filled in by the lifespan; /ready reports it
+startup = {"ready": False, "error": None, "timings": {}, "preloaded": False}
+
+
+def timed(step: str, fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    startup["timings"][step] = round(time.perf_counter() - started, 3)
+    return result
+
+
+async def warm_up(started: float):
+    """
+    Load the model and push dummy images through the inference pool (one image, then a full
+    batch) so weight loading, layer fusing and the first-call allocations happen before traffic.
+    """
+    try:
+        if MODEL_SWAP_FILE:
+            # a worker (re)started after a swap must not serve the weights it was forked with
+            await run_in_threadpool(apply_swaps)
+        await run_in_threadpool(timed, "load_model", get_model)
+        if WARMUP:
+            dummy = np.zeros((WARMUP_IMAGE_SIZE, WARMUP_IMAGE_SIZE, 3), dtype=np.uint8)
+            sizes = [1] + ([INFERENCE_BATCH_SIZE] if INFERENCE_BATCH_SIZE > 1 else [])
+            for step, size in zip(("warmup", "warmup_batch"), sizes):
+                step_started = time.perf_counter()
+                await inference_pool.run(predict_batch, [dummy] * size)
+                startup["timings"][step] = round(time.perf_counter() - step_started, 3)
+    except Exception as exc:
+        logger.exception("model warm-up failed")
+        startup["error"] = str(exc)
+        return
+    startup["timings"]["total"] = round(time.perf_counter() - started, 3)
+    startup["ready"] = True
+    logger.info("ready after %s", startup["timings"])
+
+
+def warm_up_weights(net):
+    # run on swapped-in weights before requests are routed to them
+    if WARMUP:
+        net([np.zeros((WARMUP_IMAGE_SIZE, WARMUP_IMAGE_SIZE, 3), dtype=np.uint8)], device="cpu")
+
+
+# weights another worker swapped in that failed to load here; not retried until they change
+failed_swaps = {}
+
+
+def apply_swaps():
+    """Catch up with the swaps other worker processes recorded in MODEL_SWAP_FILE."""
+    global model
+    for name, weights in read_swaps(MODEL_SWAP_FILE).items():
+        if model_registry.weights(name) == weights or failed_swaps.get(name) == weights:
+            continue
+        try:
+            handle = model_registry.follow(name, weights, warm_up_weights)
+        except Exception:
+            logger.exception("cannot load %s for model %s", weights, name)
+            failed_swaps[name] = weights
+            continue
+        if handle is not None and name == DEFAULT_MODEL:
+            model = handle.model
+        logger.info("model %s follows swap to %s", name, weights)
+
+
+async def follow_swaps():
+    while True:
+        await asyncio.sleep(MODEL_SWAP_INTERVAL)
+        await run_in_threadpool(apply_swaps)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    if not startup["preloaded"]:
+        # serve.py has already done this in the master process
+        await run_in_threadpool(timed, "init_db", init_db)
+    # the server accepts connections while this runs: /health is up at once, /ready once it finishes
+    warm_up_task = asyncio.create_task(warm_up(started))
+    swaps_task = asyncio.create_task(follow_swaps()) if MODEL_SWAP_FILE else None
+    try:
+        yield
+    finally:
+        startup["ready"] = False
+        warm_up_task.cancel()
+        if swaps_task is not None:
+            swaps_task.cancel()
+        inference_pool.shutdown()
+        if write_behind is not None:
+            write_behind.stop()
+        if s3 is not None:
+            # lets background uploads finish
+            s3.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(metrics.RequestMetrics)
 
 
 @app.post("/predict")
 async def predict(
     request: Request,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(None),
     credentials: Annotated[Optional[HTTPBasicCredentials], Depends(optional_auth)] = None,
     img: Optional[str] = Query(None, description="S3 key of the image inside your bucket"),
-    chat_id: Optional[str] = Query(None, description="Chat/session id used as S3 folder prefix")
+    chat_id: Optional[str] = Query(None, description="Chat/session id used as S3 folder prefix"),
+    model: Optional[str] = Query(None, description="Name of the model to run (default: DEFAULT_MODEL)"),
+    params: dict = Depends(inference_settings),
 ):
     """
     Predict objects in an image
@@ -121,118 +979,263 @@ async def predict(
 
     uid = str(uuid.uuid4())
     db = next(get_db())
-
-    username = None
-    if credentials:
-        try:
-            username = verify_credentials(credentials, db)
-        except HTTPException:
-            username = None
+    username = await optional_user(credentials, db)
 
     # who’s folder (for S3 organization)
     # precedence: chat_id (from caller) -> username (if authenticated) -> "anonymous"
     prefix = _safe_prefix(chat_id) if chat_id else _safe_prefix(str(username) if username else None)
 
-    predicted_key = None  # will be set for S3 flow
-
-    # Either: S3 download (if img=...) OR classic file upload (if file sent)
+    if not img and file is None:
+        raise HTTPException(status_code=400, detail="Provide either a file or ?img=<s3_key>")
+    handle = await requested_model(model)
+    params = model_settings(handle, params)
     if img:
-        s3_client = require_s3()
-        ext = os.path.splitext(img)[1] or ".jpg"
-        original_path = os.path.join(UPLOAD_DIR, uid + ext)  # temp local for inference
+        record = await process_image(
+            uid, prefix, background_tasks, img=img, params=params, handle=handle, user_id=username,
+        )
+    else:
+        with metrics.stage("read"):
+            data = await file.read()
+        record = await process_image(
+            uid, prefix, background_tasks, data=data, ext=os.path.splitext(file.filename)[1],
+            params=params, handle=handle, user_id=username,
+        )
+
+    if not record["stored"]:
+        # the commit blocks (up to busy_timeout on a locked SQLite file), so it runs on a worker thread
+        await run_in_threadpool(
+            save_prediction,
+            db, record["uid"], record["original_image"], record["predicted_image"], username,
+            record["detections"], record["image_width"], record["image_height"],
+            model_name=record["model_name"], model_version=record["model_version"],
+        )
+    db.close()
+    return prediction_summary(record, start_time)
+
+
+@app.post("/predict/batch")
+async def predict_many(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(None),
+    credentials: Annotated[Optional[HTTPBasicCredentials], Depends(optional_auth)] = None,
+    img: List[str] = Query(None, description="S3 keys of the images inside your bucket"),
+    chat_id: Optional[str] = Query(None, description="Chat/session id used as S3 folder prefix"),
+    model: Optional[str] = Query(None, description="Name of the model to run (default: DEFAULT_MODEL)"),
+    params: dict = Depends(inference_settings),
+):
+    """
+    Predict objects in many images. Results are streamed as NDJSON, one line per image
+    in the order they finish, each with the index of the image in the request.
+    """
+    files = files or []
+    img = img or []
+    if not files and not img:
+        raise HTTPException(status_code=400, detail="Provide files or ?img=<s3_key> parameters")
+    if len(files) + len(img) > BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_IMAGES} images per batch")
+    handle = await requested_model(model)
+    params = model_settings(handle, params)
+
+    db = next(get_db())
+    username = await optional_user(credentials, db)
+    db.close()
+    prefix = _safe_prefix(chat_id) if chat_id else _safe_prefix(str(username) if username else None)
+
+    # uploads are read now; the form is gone by the time the stream runs
+    sources = [
+        {"data": await f.read(), "ext": os.path.splitext(f.filename)[1], "filename": f.filename}
+        for f in files
+    ] + [{"img": key} for key in img]
+    return ndjson_response(stream_batch(sources, prefix, username, background_tasks, params, handle))
+
+
+@app.post("/predict/video")
+async def predict_video(
+    file: UploadFile = File(None),
+    credentials: Annotated[Optional[HTTPBasicCredentials], Depends(optional_auth)] = None,
+    video: Optional[str] = Query(None, description="S3 key of the video inside your bucket"),
+    stride: int = Query(VIDEO_FRAME_STRIDE, ge=1, description="Run every n-th frame through the model"),
+    max_frames: Optional[int] = Query(None, ge=1, description="Stop after this many sampled frames"),
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$", description="ndjson or sse"),
+    model: Optional[str] = Query(None, description="Name of the model to run (default: DEFAULT_MODEL)"),
+):
+    """
+    Detect objects in a video. Sampled frames are saved as predictions and their detections
+    are streamed back as NDJSON or server-sent events while the video is decoded.
+    """
+    if not video and file is None:
+        raise HTTPException(status_code=400, detail="Provide either a file or ?video=<s3_key>")
+    handle = await requested_model(model)
+
+    db = next(get_db())
+    username = await optional_user(credentials, db)
+    db.close()
+
+    uid = str(uuid.uuid4())
+    cleanup_path = None
+    if video:
+        storage = require_s3()
+        fd, path = tempfile.mkstemp(suffix=os.path.splitext(video)[1])
+        os.close(fd)
+        cleanup_path = path
+        source = f"s3://{AWS_S3_BUCKET}/{video}"
         try:
-            s3_client.download_file(AWS_S3_BUCKET, img, original_path)
+            # OpenCV needs a seekable file; it is copied in chunks, never held in memory
+            await storage.download(video, path)
         except ClientError as e:
+            os.remove(path)
             code = e.response.get("Error", {}).get("Code", "")
             if code in ("NoSuchKey", "404"):
-                raise HTTPException(status_code=404, detail=f"S3 key not found: {img}")
+                raise HTTPException(status_code=404, detail=f"S3 key not found: {video}")
             raise HTTPException(status_code=502, detail=f"S3 download error: {str(e)}")
-
-        results = model(original_path, device="cpu")
-
-        # Create annotated image and upload to S3 under <prefix>/predicted/<uuid>.<ext>
-        annotated_frame = results[0].plot()
-        annotated_image = Image.fromarray(annotated_frame)
-
-        import tempfile
-        predicted_key = f"{prefix}/predicted/{uid}{ext}"
-        with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp:
-            tmp_path = tmp.name
-        annotated_image.save(tmp_path)
-        try:
-            s3_client.upload_file(tmp_path, AWS_S3_BUCKET, predicted_key)
-        finally:
-            try:
-                os.remove(tmp_path)
-            except OSError:
-                pass
-
     else:
-        if file is None:
-            raise HTTPException(status_code=400, detail="Provide either a file or ?img=<s3_key>")
-
         ext = os.path.splitext(file.filename)[1]
-        original_path = os.path.join(UPLOAD_DIR, uid + ext)
-        with open(original_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+        if SAVE_ORIGINALS:
+            path = os.path.join(UPLOAD_DIR, uid + ext)
+        else:
+            fd, path = tempfile.mkstemp(suffix=ext)
+            os.close(fd)
+            cleanup_path = path
+        source = path
+        await run_in_threadpool(copy_upload, file, path)
 
-        results = model(original_path, device="cpu")
+    try:
+        capture = await run_in_threadpool(open_video, path)
+    except VideoDecodeError:
+        os.remove(path)
+        raise HTTPException(status_code=400, detail="Invalid video file")
 
-        # Local flow: keep your existing local behavior
-        annotated_frame = results[0].plot()
-        annotated_image = Image.fromarray(annotated_frame)
-        predicted_path = os.path.join(PREDICTED_DIR, uid + ext)
-        annotated_image.save(predicted_path)
-
-    # Persist session + detections (store S3 URIs if S3 flow)
-    queries.save_prediction_session(
-        db,
-        uid,
-        f"s3://{AWS_S3_BUCKET}/{img}" if img else original_path,
-        f"s3://{AWS_S3_BUCKET}/{predicted_key}" if img else predicted_path,
-        username
-    )
+    rows = stream_video(capture, source, stride, max_frames, username, cleanup_path, handle)
+    return sse_response(rows) if format == "sse" else ndjson_response(rows)
 
-    detected_labels = []
-    for box in results[0].boxes:
-        label_idx = int(box.cls[0].item())
-        label = model.names[label_idx]
-        score = float(box.conf[0])
-        bbox = box.xyxy[0].tolist()
-        queries.save_detection_object(db, uid, label, score, str(bbox))
-        detected_labels.append(label)
 
-    processing_time = round(time.time() - start_time, 2)
-    db.close()
-    return {
-        "prediction_uid": uid,
-        "detection_count": len(results[0].boxes),
-        "labels": detected_labels,
-        "time_took": processing_time
-    }
+@app.websocket("/ws/predict")
+async def predict_stream(
+    websocket: WebSocket,
+    persist: bool = Query(False, description="Save every processed frame as a prediction"),
+    model: Optional[str] = Query(None, description="Name of the model to run (default: DEFAULT_MODEL)"),
+):
+    """
+    Continuous inference over one connection. The client sends encoded images as binary
+    messages and gets one JSON message back per processed frame. When inference falls
+    behind, frames that were overtaken by newer ones are dropped rather than queued.
+    """
+    credentials = websocket_credentials(websocket)
+    db = SessionLocal()
+    try:
+        user_id = await run_in_threadpool(verify_credentials, credentials, db) if credentials else None
+    finally:
+        db.close()
+    if user_id is None:
+        # 1008: policy violation, the handshake is refused
+        await websocket.close(code=1008, reason="Invalid or missing credentials")
+        return
+    try:
+        handle = await run_in_threadpool(resolve_model, model)
+    except UnknownModel:
+        await websocket.close(code=1008, reason=f"Unknown model: {model}")
+        return
+    await websocket.accept()
+
+    mailbox = asyncio.Queue(maxsize=1)
+    stats = {"received": 0, "dropped": 0}
+    receiver = asyncio.create_task(receive_frames(websocket, mailbox, stats))
+    db = SessionLocal() if persist else None
+    try:
+        while True:
+            item = await mailbox.get()
+            if item is None:
+                break
+            frame, data = item
+            start_time = time.perf_counter()
+            try:
+                image = await run_in_threadpool(decode_image, data)
+            except HTTPException as e:
+                await websocket.send_json({"frame": frame, "error": e.detail})
+                continue
+            try:
+                # straight to the pool, a batching window would only add latency here
+                result = (await inference_pool.run(predict_batch, [image], handle=handle))[0]
+            except InferenceQueueFull:
+                stats["dropped"] += 1
+                continue
+            detections = extract_detections(result, handle.model.names)
+            message = {
+                "frame": frame,
+                "detections": detections,
+                "inference_ms": round((time.perf_counter() - start_time) * 1000, 1),
+                "dropped": stats["dropped"],
+            }
+            if persist:
+                uid = str(uuid.uuid4())
+                image_height, image_width = image.shape[:2]
+                record = {
+                    "uid": uid,
+                    "original_image": None,
+                    "predicted_image": None,
+                    "detections": detections,
+                    "image_width": image_width,
+                    "image_height": image_height,
+                    "model_name": handle.name,
+                    "model_version": handle.version,
+                }
+                await run_in_threadpool(save_prediction_records, db, [record], user_id)
+                message["prediction_uid"] = uid
+            await websocket.send_json(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        if db is not None:
+            db.close()
 
 
 @app.get("/prediction/count")
-def prediction_count(db: Session = Depends(get_db), credentials: HTTPBasicCredentials = Depends(security)) -> dict:
-    verify_credentials(credentials, db)
-    count = queries.count_recent_predictions(db)
+async def prediction_count(db: Session = Depends(get_read_db), user_id: int = Depends(get_current_user_async)) -> dict:
+    count = await read_query("count_recent_predictions", db)
     return {"count": count}
 
 @app.get("/prediction/labels")
-def get_all_labels(
+async def get_all_labels(
+    db: Session = Depends(get_read_db),
+    user_id: int = Depends(get_current_user_async)
+):
+    return await read_query("get_all_labels", db, user_id)
+
+
+@app.get("/prediction/time")
+def get_predictions_by_time(
+    start: str = Query(..., description="Start time in ISO format"),
+    end: str = Query(..., description="End time in ISO format"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    stream: bool = Query(False, description="Stream all rows as NDJSON"),
     db: Session = Depends(get_db),
     user_id: int = Depends(get_current_user)
 ):
-    return queries.get_all_labels(db,user_id)
+    start_dt = datetime.fromisoformat(start)
+    end_dt = datetime.fromisoformat(end)
+    after_key = None
+    if after:
+        after_key = tuple(decode_cursor(after, datetime, str))
+    if stream:
+        return ndjson_response(stream_rows(queries.stream_predictions_by_time, start_dt, end_dt, after_key))
+    rows = queries.get_predictions_by_time(db, start_dt, end_dt, after=after_key, limit=limit)
+    if limit is None and after is None:
+        return rows
+    next_cursor = encode_cursor(rows[-1]["timestamp"], rows[-1]["uid"]) if limit and len(rows) == limit else None
+    return page_response(rows, next_cursor)
 
 
 @app.get("/prediction/{uid}")
-def get_prediction(
+async def get_prediction(
     uid: str,
-    db: Session = Depends(get_db),
-    user_id: int = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    user_id: int = Depends(get_current_user_async)
 ):
-    prediction = queries.get_prediction_by_uid(db, uid)
+    prediction = write_behind.get_pending(uid) if write_behind is not None else None
+    if prediction is None:
+        prediction = await read_query("get_prediction_by_uid", db, uid)
     if not prediction:
         raise HTTPException(status_code=404, detail="Prediction not found")
     
@@ -243,35 +1246,30 @@ def get_prediction(
         "uid": prediction.uid,
         "timestamp": prediction.timestamp,
         "original_image": prediction.original_image,
-        "predicted_image": prediction.predicted_image
+        "predicted_image": prediction.predicted_image,
+        "model_name": prediction.model_name,
+        "model_version": prediction.model_version,
     }
 
 
-@app.get("/prediction/time")
-def get_predictions_by_time(
-    start: str = Query(..., description="Start time in ISO format"),
-    end: str = Query(..., description="End time in ISO format"),
-    db: Session = Depends(get_db),
-    user_id: int = Depends(get_current_user)
-):
-    start_dt = datetime.fromisoformat(start)
-    end_dt = datetime.fromisoformat(end)
-    return queries.get_predictions_by_time(db, start_dt, end_dt)
-
-
 @app.delete("/prediction/{uid}")
 def delete_prediction(uid: str, db: Session = Depends(get_db), credentials: HTTPBasicCredentials = Depends(security)):
     user_id = verify_credentials(credentials, db)
 
+    # a prediction still in the write-behind buffer has to reach the database before it can be deleted
+    if write_behind is not None and write_behind.is_pending(uid):
+        write_behind.flush(timeout=5)
     session = queries.get_prediction_by_uid(db, uid)
     if not session:
         raise HTTPException(status_code=404, detail="Prediction not found")
     if session.user_id != user_id:
         raise HTTPException(status_code=403, detail="Unauthorized access to this prediction")
-    # Delete image files if they exist
+    # Delete image files if they exist and no deduplicated prediction still points at them
     for path in [session.original_image, session.predicted_image]:
-        if os.path.exists(path):
+        if path and os.path.exists(path) and not queries.image_shared_with_other_predictions(db, uid, path):
             os.remove(path)
+    if result_cache is not None:
+        result_cache.forget_prediction(uid)
 
     # Delete from database
     queries.delete_detection_objects_by_uid(db, uid)
@@ -281,47 +1279,114 @@ def delete_prediction(uid: str, db: Session = Depends(get_db), credentials: HTTP
 
         
 @app.get("/predictions/label/{label}")
-def get_predictions_by_label(label: str, db: Session = Depends(get_db), user_id: int = Depends(get_current_user)):
+async def get_predictions_by_label(
+    label: str,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    stream: bool = Query(False, description="Stream all rows as NDJSON"),
+    db: Session = Depends(get_read_db),
+    user_id: int = Depends(get_current_user_async)
+):
     """
     Get prediction sessions containing objects with specified label
     """
     if label not in labels:
         raise HTTPException(status_code=400, detail="Invalid label")
-    
-    return queries.get_predictions_by_label(db, label)
+
+    after_uid = decode_cursor(after, str)[0] if after else None
+    if stream:
+        return ndjson_response(stream_rows(queries.stream_predictions_by_label, label, after_uid))
+    rows = await read_query("get_predictions_by_label", db, label, after=after_uid, limit=limit)
+    if limit is None and after is None:
+        return rows
+    next_cursor = encode_cursor(rows[-1]["uid"]) if limit and len(rows) == limit else None
+    return page_response(rows, next_cursor)
 
 
 @app.get("/predictions/score/{min_score}")
-def get_predictions_by_score(
+async def get_predictions_by_score(
     min_score: float = Path(...),
-    db: Session = Depends(get_db),
-    user_id: int | None = Depends(get_current_user)
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    stream: bool = Query(False, description="Stream all rows as NDJSON"),
+    db: Session = Depends(get_read_db),
+    user_id: int | None = Depends(get_current_user_async)
 ):
     if user_id is None:
         raise HTTPException(status_code=401, detail="Authentication required")
     if min_score < 0 or min_score > 1:
         raise HTTPException(status_code=400, detail="Invalid score")
-    results = queries.get_predictions_by_score(db, user_id, min_score)
-    return [
-        {
-            "label": obj.label,
-            "score": obj.score,
-            "box": obj.box,
-            "prediction_uid": obj.prediction_uid
-        }
-        for obj in results
-    ]
+    after_id = decode_cursor(after, int)[0] if after else None
+    if stream:
+        objects = stream_rows(queries.stream_predictions_by_score, user_id, min_score, after_id)
+        return ndjson_response(detection_to_dict(obj) for obj in objects)
+    results = await read_query("get_predictions_by_score", db, user_id, min_score, after=after_id, limit=limit)
+    rows = [detection_to_dict(obj) for obj in results]
+    if limit is None and after is None:
+        return rows
+    next_cursor = encode_cursor(results[-1].id) if limit and len(results) == limit else None
+    return page_response(rows, next_cursor)
+
+
+
+@app.get("/predictions/box")
+def get_detections_by_box(
+    min_area: Optional[float] = Query(None, ge=0, description="Minimum box area in square pixels"),
+    max_area: Optional[float] = Query(None, ge=0, description="Maximum box area in square pixels"),
+    x1: Optional[float] = Query(None, description="Left edge of the region boxes must lie inside"),
+    y1: Optional[float] = Query(None, description="Top edge of the region"),
+    x2: Optional[float] = Query(None, description="Right edge of the region"),
+    y2: Optional[float] = Query(None, description="Bottom edge of the region"),
+    label: Optional[str] = Query(None, description="Only detections with this label"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    stream: bool = Query(False, description="Stream all rows as NDJSON"),
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user)
+):
+    """
+    Get detections filtered by bounding box area and/or a region they lie inside
+    """
+    corners = [x1, y1, x2, y2]
+    region = None
+    if any(v is not None for v in corners):
+        if any(v is None for v in corners):
+            raise HTTPException(status_code=400, detail="Region needs x1, y1, x2 and y2")
+        if x1 > x2 or y1 > y2:
+            raise HTTPException(status_code=400, detail="Invalid region")
+        region = (x1, y1, x2, y2)
+    if min_area is not None and max_area is not None and min_area > max_area:
+        raise HTTPException(status_code=400, detail="Invalid area range")
+    if label is not None and label not in labels:
+        raise HTTPException(status_code=400, detail="Invalid label")
 
+    after_id = decode_cursor(after, int)[0] if after else None
+    if stream:
+        objects = stream_rows(queries.stream_detections_by_box, user_id, min_area, max_area, region, label, after_id)
+        return ndjson_response(detection_to_dict(obj) for obj in objects)
+    results = queries.get_detections_by_box(
+        db, user_id, min_area, max_area, region, label, after=after_id, limit=limit
+    )
+    rows = [detection_to_dict(obj) for obj in results]
+    if limit is None and after is None:
+        return rows
+    next_cursor = encode_cursor(results[-1].id) if limit and len(results) == limit else None
+    return page_response(rows, next_cursor)
 
 
 @app.get("/image/{type}/{filename}")
-def get_image(type: str, filename: str,user_id: int = Depends(get_current_user)):
+def get_image(type: str, filename: str, db: Session = Depends(get_db), user_id: int = Depends(get_current_user)):
     """
     Get image by type and filename
     """
     if type not in ["original", "predicted"]:
         raise HTTPException(status_code=400, detail="Invalid image type")
     path = os.path.join("uploads", type, filename)
+    if not os.path.exists(path) and type == "predicted":
+        # annotated images are named after their prediction and may not have been drawn yet
+        prediction = find_prediction(db, os.path.splitext(filename)[0])
+        if prediction is not None and prediction.predicted_image == path:
+            ensure_annotated(db, prediction)
     if not os.path.exists(path):
         raise HTTPException(status_code=404, detail="Image not found")
     return FileResponse(path)
@@ -335,14 +1400,14 @@ def get_prediction_image(
     db: Session = Depends(get_db),
 ):
     user_id = verify_credentials(credentials, db)
-    prediction = queries.get_prediction_by_uid(db, uid)
+    prediction = find_prediction(db, uid)
     if not prediction:
         raise HTTPException(status_code=404, detail="Prediction not found")
     if prediction.user_id != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
 
     image_path = prediction.predicted_image
-    if not os.path.exists(image_path):
+    if not ensure_annotated(db, prediction):
         raise HTTPException(status_code=404, detail="Image not found")
 
     # Guess media type from file extension
@@ -356,6 +1421,92 @@ def get_prediction_image(
     return FileResponse(image_path, media_type=media_type)
 
 
+@app.get("/stats/write-behind")
+def write_behind_stats():
+    """
+    Write-behind buffer depth and lag
+    """
+    if write_behind is None:
+        return {"enabled": False}
+    return {"enabled": True, **write_behind.stats()}
+
+
+@app.get("/stats/s3")
+def s3_stats():
+    """
+    Background upload counters and the keys of uploads that gave up
+    """
+    if s3 is None:
+        return {"enabled": False}
+    return {"enabled": True, "background_upload": S3_BACKGROUND_UPLOAD, **s3.stats()}
+
+
+@app.get("/stats/result-cache")
+def result_cache_stats():
+    """
+    Deduplication cache size and hit/miss counters
+    """
+    if result_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **result_cache.stats()}
+
+
+def runtime_stats() -> dict:
+    # the /stats/* numbers, read when /metrics is scraped
+    stats = {"inference": {"pending": inference_pool.pending, "capacity": inference_pool.workers + inference_pool.queue_depth}}
+    if write_behind is not None:
+        stats["write_behind"] = write_behind.stats()
+    if s3 is not None:
+        stats["s3"] = s3.stats()
+    if result_cache is not None:
+        stats["result_cache"] = result_cache.stats()
+    return stats
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """
+    Prometheus metrics: latency of each prediction stage, model calls, database queries and
+    HTTP requests by status, detections per label, and the /stats/* counters
+    """
+    return Response(metrics.render(runtime_stats()), media_type=metrics.CONTENT_TYPE_LATEST)
+
+
+@app.get("/models")
+def list_models():
+    """
+    Registered models, which of them are loaded and the version of their weights
+    """
+    return {"default": DEFAULT_MODEL, **model_registry.stats()}
+
+
+@app.post("/admin/models/{name}")
+async def swap_model(
+    name: str,
+    weights: str = Query(..., description="Weights file (or ultralytics model name) to load"),
+    credentials: HTTPBasicCredentials = Depends(security),
+    user_id: int = Depends(get_current_user),
+):
+    """
+    Load new weights for a model, or add a new model, and switch to them once they are
+    warmed up. Requests that are already running finish on the old weights. Under serve.py
+    the other workers follow within MODEL_SWAP_INTERVAL seconds.
+    """
+    global model
+    if credentials.username not in ADMIN_USERS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    try:
+        handle = await run_in_threadpool(model_registry.swap, name, weights, warm_up_weights)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Cannot load {weights}: {e}")
+    if name == DEFAULT_MODEL:
+        model = handle.model
+    if MODEL_SWAP_FILE:
+        await run_in_threadpool(record_swap, MODEL_SWAP_FILE, name, weights)
+    logger.info("%s swapped model %s to %s (version %s)", credentials.username, name, weights, handle.version)
+    return {"name": handle.name, "weights": weights, "version": handle.version}
+
+
 @app.get("/health")
 def health():
     """
@@ -363,6 +1514,25 @@ def health():
     """
     return {"status": "ok"}
 
+
+@app.get("/ready")
+def ready():
+    """
+    Readiness check: 503 until the database is initialised and the model has been warmed up
+    """
+    body = {
+        "ready": startup["ready"],
+        "backend": MODEL_BACKEND,
+        "quantization": MODEL_QUANTIZATION,
+        "timings": startup["timings"],
+    }
+    if startup["error"]:
+        body["error"] = startup["error"]
+    if not startup["ready"]:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
 if __name__ == "__main__":
+    # development server with auto-reload; run serve.py in production
     import uvicorn
     uvicorn.run("app:app", host="0.0.0.0", port=8080,reload=True)
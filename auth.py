@@ -0,0 +1,135 @@
+# auth.py
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+HASH_SCHEME = "pbkdf2_sha256"
+PBKDF2_ITERATIONS = 600_000
+
+
+def hash_password(password: str, iterations: int = PBKDF2_ITERATIONS) -> str:
+    """
+    Return a salted PBKDF2-SHA256 hash in the form pbkdf2_sha256$<iterations>$<salt>$<hash>.
+    """
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return "$".join([
+        HASH_SCHEME,
+        str(iterations),
+        base64.b64encode(salt).decode(),
+        base64.b64encode(digest).decode(),
+    ])
+
+
+# checked when the username does not exist, so a miss costs as much as a wrong password and
+# the response time does not tell whether a username is taken
+DUMMY_HASH = "$".join([
+    HASH_SCHEME,
+    str(PBKDF2_ITERATIONS),
+    base64.b64encode(os.urandom(16)).decode(),
+    base64.b64encode(os.urandom(32)).decode(),
+])
+
+
+def is_password_hash(value: Optional[str]) -> bool:
+    return bool(value) and value.startswith(HASH_SCHEME + "$")
+
+
+def verify_password(password: str, stored: Optional[str]) -> bool:
+    if not is_password_hash(stored):
+        return False
+    try:
+        _, iterations, salt, expected = stored.split("$")
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode(), base64.b64decode(salt), int(iterations))
+    except ValueError:
+        return False
+    return hmac.compare_digest(digest, base64.b64decode(expected))
+
+
+class AuthCache:
+    """
+    Remembers successful credential checks for `ttl` seconds so repeated requests skip the
+    database lookup and the password hash. Entries are keyed on a keyed hash of the
+    username and password (never the password itself) and the least recently used entry
+    is dropped once `max_size` is reached. A ttl of 0 disables the cache.
+
+    Failed checks are remembered the same way for `failure_ttl` seconds, so repeating bad
+    credentials does not cost a password hash each time. Only that exact username and
+    password pair is refused; the right password is always checked.
+    """
+
+    def __init__(self, ttl: float = 60, max_size: int = 10000, failure_ttl: float = 30):
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        self.failure_ttl = failure_ttl
+        self._key = secrets.token_bytes(32)
+        self._entries = OrderedDict()  # credentials hash -> (user_id, expires_at)
+        self._failures = OrderedDict()  # credentials hash -> expires_at
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejections = 0
+
+    def _credentials_key(self, username: str, password: str) -> bytes:
+        return hmac.new(self._key, f"{username}\0{password}".encode(), hashlib.sha256).digest()
+
+    def rejected(self, username: str, password: str) -> bool:
+        """True when these exact credentials failed within the last `failure_ttl` seconds."""
+        if self.failure_ttl <= 0:
+            return False
+        key = self._credentials_key(username, password)
+        with self._lock:
+            expires_at = self._failures.get(key)
+            if expires_at is None or expires_at <= time.monotonic():
+                if expires_at is not None:
+                    del self._failures[key]
+                return False
+            self.rejections += 1
+            return True
+
+    def put_failure(self, username: str, password: str):
+        if self.failure_ttl <= 0:
+            return
+        key = self._credentials_key(username, password)
+        with self._lock:
+            self._failures[key] = time.monotonic() + self.failure_ttl
+            self._failures.move_to_end(key)
+            while len(self._failures) > self.max_size:
+                self._failures.popitem(last=False)
+
+    def get(self, username: str, password: str) -> Optional[int]:
+        if self.ttl <= 0:
+            return None
+        key = self._credentials_key(username, password)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, username: str, password: str, user_id: int):
+        if self.ttl <= 0:
+            return
+        key = self._credentials_key(username, password)
+        with self._lock:
+            self._entries[key] = (user_id, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._failures.clear()
@@ -0,0 +1,285 @@
+# backends.py
+#
+# Runs the YOLO weights through a CPU runtime other than eager PyTorch. The .pt file is
+# exported once (at image build time, or on first start) and the exported model is loaded
+# through ultralytics, so callers keep using model(sources, ...) and model.names.
+#
+#     python backends.py --backend onnx
+#     python backends.py --backend onnx --quantize static --calibration "calibration/*.jpg"
+
+import argparse
+import functools
+import glob
+import os
+
+import cv2
+import numpy as np
+
+BACKENDS = ("torch", "onnx", "openvino")
+# post-training INT8 quantization of the ONNX export: "dynamic" quantizes the weights only,
+# "static" also the activations, with ranges calibrated on sample images
+QUANTIZATIONS = ("dynamic", "static")
+
+
+class UnknownBackend(ValueError):
+    """Raised for a MODEL_BACKEND that is not one of BACKENDS."""
+
+
+def exported_path(weights: str, backend: str) -> str:
+    """Where ultralytics puts the export of `weights` for `backend`."""
+    stem, _ = os.path.splitext(weights)
+    if backend == "onnx":
+        return f"{stem}.onnx"
+    if backend == "openvino":
+        return f"{stem}_openvino_model"
+    raise UnknownBackend(f"Cannot export to {backend!r}")
+
+
+def export_model(weights: str, backend: str, imgsz: int = 640) -> str:
+    """
+    Export `weights` for `backend` unless the export already exists, and return its path.
+    Exports use a dynamic batch axis so the batch scheduler can still group images.
+    """
+    path = exported_path(weights, backend)
+    if os.path.exists(path):
+        return path
+    from ultralytics import YOLO
+
+    return YOLO(weights).export(format=backend, imgsz=imgsz, dynamic=True, simplify=True)
+
+
+def letterbox(image: np.ndarray, imgsz: int) -> np.ndarray:
+    """Resize to fit imgsz x imgsz keeping the aspect ratio, pad with grey, as ultralytics does."""
+    height, width = image.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    resized = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_LINEAR)
+    top = (imgsz - resized.shape[0]) // 2
+    left = (imgsz - resized.shape[1]) // 2
+    return cv2.copyMakeBorder(
+        resized, top, imgsz - resized.shape[0] - top, left, imgsz - resized.shape[1] - left,
+        cv2.BORDER_CONSTANT, value=(114, 114, 114),
+    )
+
+
+def calibration_batches(pattern: str, imgsz: int):
+    """Yield the images matching `pattern` as 1x3ximgszximgsz float tensors, preprocessed like the model input."""
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        raise FileNotFoundError(f"No calibration images match {pattern!r}")
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        rgb = letterbox(image, imgsz)[:, :, ::-1]
+        yield np.ascontiguousarray(rgb.transpose(2, 0, 1)[None], dtype=np.float32) / 255
+
+
+def quantized_path(weights: str, mode: str) -> str:
+    stem, _ = os.path.splitext(weights)
+    return f"{stem}.int8-{mode}.onnx"
+
+
+def quantize_model(weights: str, mode: str, calibration: str = "*.jpg", imgsz: int = 640) -> str:
+    """
+    Write an INT8 copy of the ONNX export of `weights` unless it already exists, and return its
+    path. Static quantization calibrates activation ranges on the images matching `calibration`.
+    """
+    if mode not in QUANTIZATIONS:
+        raise UnknownBackend(f"MODEL_QUANTIZATION must be one of {', '.join(QUANTIZATIONS)}, not {mode!r}")
+    path = quantized_path(weights, mode)
+    if os.path.exists(path):
+        return path
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    fp32 = export_model(weights, "onnx", imgsz)
+    if mode == "dynamic":
+        quantize_dynamic(fp32, path, weight_type=QuantType.QUInt8)
+    else:
+        input_name = onnx.load(fp32).graph.input[0].name
+
+        class Reader(CalibrationDataReader):
+            def __init__(self):
+                self.batches = calibration_batches(calibration, imgsz)
+
+            def get_next(self):
+                batch = next(self.batches, None)
+                return None if batch is None else {input_name: batch}
+
+        quantize_static(
+            fp32, path, Reader(),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+        )
+    # ultralytics reads the class names and stride from the metadata of the export
+    quantized = onnx.load(path)
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(onnx.load(fp32).metadata_props)
+    onnx.save(quantized, path)
+    return path
+
+
+def limit_threads(net, backend: str, path: str, threads: int):
+    """
+    Cap the CPU threads one call of `net` may use. ultralytics creates the ONNX Runtime session
+    and the OpenVINO compiled model without options, so they use every core; they are rebuilt
+    here with `threads` intra-op threads. torch threads are per process (torch.set_num_threads).
+    """
+    if backend == "torch" or threads <= 0:
+        return
+    # the runtime session is created by the predictor on the first call
+    net(np.zeros((64, 64, 3), dtype=np.uint8), device="cpu", verbose=False)
+    runtime = net.predictor.model.backend
+    if backend == "onnx":
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        runtime.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+    else:
+        compile_model = runtime.compile_model
+        config = {**compile_model.keywords["config"], "INFERENCE_NUM_THREADS": threads}
+        core = compile_model.func.__self__
+        xml = path if path.endswith(".xml") else glob.glob(os.path.join(path, "*.xml"))[0]
+        runtime.compile_model = functools.partial(
+            compile_model.func, device_name=compile_model.keywords["device_name"], config=config
+        )
+        runtime.ov_compiled_model = runtime.compile_model(core.read_model(model=xml))
+
+
+def load_model(
+    weights: str,
+    backend: str = "torch",
+    imgsz: int = 640,
+    quantization: str | None = None,
+    calibration: str = "*.jpg",
+    threads: int = 0,
+):
+    """`threads`: CPU threads per call for onnx / openvino (0: all cores); see limit_threads()."""
+    if backend not in BACKENDS:
+        raise UnknownBackend(f"MODEL_BACKEND must be one of {', '.join(BACKENDS)}, not {backend!r}")
+    from ultralytics import YOLO
+
+    if quantization:
+        if backend != "onnx":
+            raise UnknownBackend("MODEL_QUANTIZATION needs MODEL_BACKEND=onnx")
+        path = quantize_model(weights, quantization, calibration, imgsz)
+    elif backend == "torch":
+        return YOLO(weights)
+    else:
+        path = export_model(weights, backend, imgsz)
+    net = YOLO(path, task="detect")
+    limit_threads(net, backend, path, threads)
+    return net
+
+
+def box_iou(a: list, b: list) -> float:
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    inter = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def compare_detections(reference: list[dict], candidate: list[dict], iou_threshold: float = 0.5) -> dict:
+    """
+    Greedily match `candidate` detections to `reference` ones with the same label and
+    IoU >= iou_threshold, highest reference score first. Both lists use the
+    {"label", "score", "box"} dicts the API returns.
+    """
+    unmatched = list(candidate)
+    matched = 0
+    score_diffs, ious = [], []
+    for ref in sorted(reference, key=lambda d: d["score"], reverse=True):
+        best, best_iou = None, iou_threshold
+        for det in unmatched:
+            if det["label"] != ref["label"]:
+                continue
+            iou = box_iou(ref["box"], det["box"])
+            if iou >= best_iou:
+                best, best_iou = det, iou
+        if best is None:
+            continue
+        unmatched.remove(best)
+        matched += 1
+        ious.append(best_iou)
+        score_diffs.append(abs(best["score"] - ref["score"]))
+    return {
+        "reference": len(reference),
+        "candidate": len(candidate),
+        "matched": matched,
+        "missing": len(reference) - matched,
+        "extra": len(unmatched),
+        "min_iou": min(ious, default=1.0),
+        "max_score_diff": max(score_diffs, default=0.0),
+    }
+
+
+def average_precision(ground_truth: dict, predictions: dict, label: str, iou_threshold: float) -> float:
+    """All-point interpolated AP of `label` over the images in `ground_truth` ({image: [detection, ...]})."""
+    truth = {name: [d["box"] for d in dets if d["label"] == label] for name, dets in ground_truth.items()}
+    total = sum(len(boxes) for boxes in truth.values())
+    if total == 0:
+        return 0.0
+    ranked = sorted(
+        ((d["score"], name, d["box"]) for name, dets in predictions.items() for d in dets if d["label"] == label),
+        key=lambda item: item[0],
+        reverse=True,
+    )
+    used = {name: [False] * len(boxes) for name, boxes in truth.items()}
+    tp, fp, precisions, recalls = 0, 0, [], []
+    for _, name, box in ranked:
+        ious = [box_iou(box, other) for other in truth.get(name, [])]
+        best = max(range(len(ious)), key=ious.__getitem__, default=None)
+        if best is not None and ious[best] >= iou_threshold and not used[name][best]:
+            used[name][best] = True
+            tp += 1
+        else:
+            fp += 1
+        precisions.append(tp / (tp + fp))
+        recalls.append(tp / total)
+    # area under the precision envelope (best precision at this recall or higher)
+    for i in range(len(precisions) - 2, -1, -1):
+        precisions[i] = max(precisions[i], precisions[i + 1])
+    ap, previous_recall = 0.0, 0.0
+    for precision, recall in zip(precisions, recalls):
+        ap += (recall - previous_recall) * precision
+        previous_recall = recall
+    return ap
+
+
+def mean_average_precision(ground_truth: dict, predictions: dict, iou_thresholds=(0.5,)) -> float:
+    """
+    mAP of `predictions` against `ground_truth`, both {image: [detection, ...]}, averaged over the
+    labels present in the ground truth and over `iou_thresholds`. With no ground truth boxes at
+    all the result is 1.0 if there are no predictions either, else 0.0.
+    """
+    labels = {d["label"] for dets in ground_truth.values() for d in dets}
+    if not labels:
+        return 0.0 if any(predictions.values()) else 1.0
+    scores = [average_precision(ground_truth, predictions, label, t) for label in labels for t in iou_thresholds]
+    return sum(scores) / len(scores)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the YOLO weights for a CPU inference backend")
+    parser.add_argument("--weights", default="yolov8n.pt")
+    parser.add_argument("--backend", default=os.getenv("MODEL_BACKEND", "onnx"), choices=BACKENDS)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--quantize", default=os.getenv("MODEL_QUANTIZATION") or None, choices=QUANTIZATIONS)
+    parser.add_argument("--calibration", default=os.getenv("QUANTIZATION_CALIBRATION", "*.jpg"), help="glob of calibration images")
+    args = parser.parse_args()
+    if args.quantize:
+        print(quantize_model(args.weights, args.quantize, args.calibration, args.imgsz))
+    elif args.backend == "torch":
+        # nothing to export; loading the weights once downloads them
+        from ultralytics import YOLO
+
+        print(YOLO(args.weights).ckpt_path)
+    else:
+        print(export_model(args.weights, args.backend, args.imgsz))
@@ -0,0 +1,94 @@
+# benchmarks/backend_parity.py
+#
+# Runs the same images through the PyTorch model and an exported backend, checks that the
+# detections agree (same label, IoU >= --iou, small score drift) and compares the latency
+# and peak memory of both. Exits with status 1 when the backend misses or adds detections.
+#
+#     python benchmarks/backend_parity.py --backend onnx --images path/to/images
+
+import argparse
+import glob
+import os
+import resource
+import statistics
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backends  # noqa: E402
+
+
+def load_images(directory: str | None) -> dict:
+    if directory is None:
+        from ultralytics.utils import ASSETS
+
+        directory = str(ASSETS)
+    paths = sorted(p for p in glob.glob(os.path.join(directory, "*")) if p.lower().endswith((".jpg", ".jpeg", ".png")))
+    return {os.path.basename(p): cv2.imread(p) for p in paths}
+
+
+def to_detections(result, names) -> list[dict]:
+    return [
+        {"label": names[int(cls)], "score": float(conf), "box": box}
+        for cls, conf, box in zip(result.boxes.cls.tolist(), result.boxes.conf.tolist(), result.boxes.xyxy.tolist())
+    ]
+
+
+def run(model, images: dict, repeat: int) -> tuple[dict, float]:
+    """Detections per image and the median per-image latency in ms (after one warm-up call)."""
+    model(list(images.values())[:1], device="cpu", verbose=False)
+    detections, timings = {}, []
+    for name, image in images.items():
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = model([image], device="cpu", verbose=False)[0]
+            timings.append((time.perf_counter() - started) * 1000)
+        detections[name] = to_detections(result, model.names)
+    return detections, statistics.median(timings)
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check an exported backend against the PyTorch model")
+    parser.add_argument("--weights", default="yolov8n.pt")
+    parser.add_argument("--backend", default="onnx", choices=backends.BACKENDS[1:])
+    parser.add_argument("--images", help="directory of test images (default: the ultralytics sample images)")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--iou", type=float, default=0.5)
+    parser.add_argument("--max-score-diff", type=float, default=0.05)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        sys.exit(f"no images found in {args.images}")
+
+    # the candidate runs first so its peak memory is not hidden by the PyTorch model's
+    candidate, candidate_ms = run(backends.load_model(args.weights, args.backend, args.imgsz), images, args.repeat)
+    candidate_rss = peak_rss_mb()
+    reference, reference_ms = run(backends.load_model(args.weights, "torch"), images, args.repeat)
+    reference_rss = peak_rss_mb()
+
+    failed = False
+    print(f"{'image':<24}{'torch':>7}{args.backend:>10}{'matched':>9}{'missing':>9}{'extra':>7}{'min IoU':>9}{'score diff':>12}")
+    for name in images:
+        report = backends.compare_detections(reference[name], candidate[name], args.iou)
+        failed |= bool(report["missing"] or report["extra"] or report["max_score_diff"] > args.max_score_diff)
+        print(
+            f"{name:<24}{report['reference']:>7}{report['candidate']:>10}{report['matched']:>9}"
+            f"{report['missing']:>9}{report['extra']:>7}{report['min_iou']:>9.3f}{report['max_score_diff']:>12.4f}"
+        )
+    print(f"median latency: torch {reference_ms:.1f} ms, {args.backend} {candidate_ms:.1f} ms ({reference_ms / candidate_ms:.1f}x)")
+    print(f"peak RSS: after {args.backend} {candidate_rss:.0f} MB, after torch as well {reference_rss:.0f} MB")
+    print("parity: " + ("FAILED" if failed else "ok"))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
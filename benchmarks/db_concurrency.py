@@ -0,0 +1,113 @@
+# benchmarks/db_concurrency.py
+#
+# Load test for the SQLite engine profiles: writer threads save predictions the way /predict
+# does while reader threads run the listing queries, against a fresh database per profile.
+#
+#     python benchmarks/db_concurrency.py --writers 4 --readers 8 --seconds 10
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db as database  # noqa: E402
+import migrations  # noqa: E402
+import queries  # noqa: E402
+
+DETECTIONS = [{"label": "person", "score": 0.9, "box": [0, 0, 10, 10]}] * 5
+
+
+def worker(SessionLocal, action, stop, latencies, errors):
+    session = SessionLocal()
+    try:
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                action(session)
+                latencies.append(time.perf_counter() - start)
+            except OperationalError:
+                session.rollback()
+                errors.append(1)
+    finally:
+        session.close()
+
+
+def write(session):
+    queries.save_prediction_with_detections(session, str(uuid.uuid4()), "o.jpg", "p.jpg", 1, DETECTIONS)
+
+
+def read(session):
+    queries.get_all_labels(session, 1)
+    queries.count_recent_predictions(session)
+    session.rollback()  # end the read transaction like a request would
+
+
+def run(profile: str, path: str, writers: int, readers: int, seconds: float) -> dict:
+    engine = database.build_engine(f"sqlite:///{path}", profile)
+    migrations.upgrade(engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+    # seed some history so reads have something to scan
+    seed = SessionLocal()
+    for _ in range(200):
+        write(seed)
+    seed.close()
+
+    stop = threading.Event()
+    results = {"write": ([], []), "read": ([], [])}
+    threads = [
+        threading.Thread(target=worker, args=(SessionLocal, write, stop, *results["write"]))
+        for _ in range(writers)
+    ] + [
+        threading.Thread(target=worker, args=(SessionLocal, read, stop, *results["read"]))
+        for _ in range(readers)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    summary = {}
+    for kind, (latencies, errors) in results.items():
+        latencies.sort()
+        summary[kind] = {
+            "ops": len(latencies) / seconds,
+            "p50": statistics.median(latencies) * 1000 if latencies else float("nan"),
+            "p95": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else float("nan"),
+            "errors": len(errors),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent read/write load on each SQLite profile")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers, {args.readers} readers, {args.seconds:g}s per profile")
+    print(f"{'profile':<12}{'kind':<7}{'ops/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'locked':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in ("default", "production"):
+            summary = run(profile, os.path.join(tmp, f"{profile}.db"), args.writers, args.readers, args.seconds)
+            for kind, stats in summary.items():
+                print(
+                    f"{profile:<12}{kind:<7}{stats['ops']:>9.1f}{stats['p50']:>9.2f}"
+                    f"{stats['p95']:>9.2f}{stats['errors']:>8}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/quantization_eval.py
+#
+# Compares an INT8 quantized model (MODEL_QUANTIZATION) with the FP32 ONNX export it was made
+# from, on the same images: mAP drift and single-image latency / batched throughput. Without
+# --labels the FP32 detections are the reference, so the mAP reported is agreement with FP32;
+# with a directory of YOLO-format label files (<image stem>.txt) both models are scored against it.
+#
+#     python benchmarks/quantization_eval.py --mode static --calibration "calibration/*.jpg" --images calibration
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backends  # noqa: E402
+from backend_parity import load_images, run  # noqa: E402
+
+IOU_THRESHOLDS = tuple(np.linspace(0.5, 0.95, 10).round(2))
+
+
+def load_labels(directory: str, images: dict, names: dict) -> dict:
+    truth = {}
+    for name, image in images.items():
+        height, width = image.shape[:2]
+        path = os.path.join(directory, os.path.splitext(name)[0] + ".txt")
+        truth[name] = []
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                cls, cx, cy, w, h = line.split()[:5]
+                cx, cy, w, h = float(cx) * width, float(cy) * height, float(w) * width, float(h) * height
+                truth[name].append({"label": names[int(cls)], "score": 1.0, "box": [cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2]})
+    return truth
+
+
+def throughput(model, images: dict, batch: int, repeat: int) -> float:
+    """Images per second when the images are sent `batch` at a time."""
+    frames = list(images.values())
+    frames = (frames * (batch // len(frames) + 1))[:batch]
+    model(frames, device="cpu", batch=batch, verbose=False)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        model(frames, device="cpu", batch=batch, verbose=False)
+    return batch * repeat / (time.perf_counter() - started)
+
+
+def scores(truth: dict, predictions: dict) -> tuple[float, float]:
+    return (
+        backends.mean_average_precision(truth, predictions, (0.5,)),
+        backends.mean_average_precision(truth, predictions, IOU_THRESHOLDS),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="mAP drift and speed of the INT8 model against FP32")
+    parser.add_argument("--weights", default="yolov8n.pt")
+    parser.add_argument("--mode", default="static", choices=backends.QUANTIZATIONS)
+    parser.add_argument("--calibration", default="*.jpg", help="glob of calibration images for static quantization")
+    parser.add_argument("--images", help="directory of evaluation images (default: the ultralytics sample images)")
+    parser.add_argument("--labels", help="directory of YOLO-format label files for the evaluation images")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        sys.exit(f"no images found in {args.images}")
+
+    fp32_model = backends.load_model(args.weights, "onnx", args.imgsz)
+    int8_model = backends.load_model(args.weights, "onnx", args.imgsz, quantization=args.mode, calibration=args.calibration)
+
+    fp32, fp32_ms = run(fp32_model, images, args.repeat)
+    int8, int8_ms = run(int8_model, images, args.repeat)
+    fp32_ips = throughput(fp32_model, images, args.batch, args.repeat)
+    int8_ips = throughput(int8_model, images, args.batch, args.repeat)
+
+    print(f"{len(images)} images, INT8 {args.mode} vs FP32 ONNX")
+    if args.labels:
+        truth = load_labels(args.labels, images, fp32_model.names)
+        fp32_50, fp32_5095 = scores(truth, fp32)
+        int8_50, int8_5095 = scores(truth, int8)
+        print(f"{'':<12}{'mAP50':>10}{'mAP50-95':>10}")
+        print(f"{'FP32':<12}{fp32_50:>10.4f}{fp32_5095:>10.4f}")
+        print(f"{'INT8':<12}{int8_50:>10.4f}{int8_5095:>10.4f}")
+        print(f"{'drift':<12}{int8_50 - fp32_50:>+10.4f}{int8_5095 - fp32_5095:>+10.4f}")
+    else:
+        agree_50, agree_5095 = scores(fp32, int8)
+        print(f"mAP of INT8 against the FP32 detections: mAP50 {agree_50:.4f}, mAP50-95 {agree_5095:.4f}")
+    print(f"median latency: FP32 {fp32_ms:.1f} ms, INT8 {int8_ms:.1f} ms ({fp32_ms / int8_ms:.1f}x)")
+    print(f"throughput at batch {args.batch}: FP32 {fp32_ips:.1f} img/s, INT8 {int8_ips:.1f} img/s ({int8_ips / fp32_ips:.1f}x)")
+    print(f"detections per image: FP32 {statistics.mean(len(d) for d in fp32.values()):.1f}, "
+          f"INT8 {statistics.mean(len(d) for d in int8.values()):.1f}")
+
+
+if __name__ == "__main__":
+    main()
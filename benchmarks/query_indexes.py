@@ -0,0 +1,127 @@
+# benchmarks/query_indexes.py
+#
+# Times the read queries used by the API on a synthetic SQLite database, once with the
+# schema as it was before indexes were declared and once after migrations.upgrade().
+#
+#     python benchmarks/query_indexes.py --sessions 50000 --detections 8
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrations  # noqa: E402
+import queries  # noqa: E402
+from models import Base, DetectionObjects, PredictionSession, User  # noqa: E402
+
+LABELS = ["person", "car", "dog", "cat", "bicycle", "bus", "truck", "bird", "horse", "toothbrush"]
+
+
+def populate(engine, sessions: int, detections: int, users: int):
+    rng = random.Random(0)
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"username": f"user{i}", "pass_field": "pass"} for i in range(1, users + 1)])
+        for start in range(0, sessions, 5000):
+            chunk = range(start, min(start + 5000, sessions))
+            conn.execute(insert(PredictionSession), [
+                {
+                    "uid": f"uid-{i}",
+                    "timestamp": now - timedelta(minutes=rng.randint(0, 60 * 24 * 60)),
+                    "original_image": f"uploads/original/uid-{i}.jpg",
+                    "predicted_image": f"uploads/predicted/uid-{i}.jpg",
+                    "user_id": rng.randint(1, users),
+                }
+                for i in chunk
+            ])
+            conn.execute(insert(DetectionObjects), [
+                queries.detection_row(f"uid-{i}", {
+                    # rare labels make the label lookups selective, like real traffic
+                    "label": LABELS[min(int(rng.expovariate(0.6)), len(LABELS) - 1)],
+                    "score": rng.random(),
+                    "box": [0, 0, 10, 10],
+                })
+                for i in chunk
+                for _ in range(detections)
+            ])
+
+
+def build(path: str, indexed: bool, sessions: int, detections: int, users: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    if not indexed:
+        with engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    populate(engine, sessions, detections, users)
+    if indexed:
+        migrations.upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    return engine
+
+
+def time_query(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def run(engine, repeat: int) -> dict:
+    db = sessionmaker(bind=engine)()
+    now = datetime.now()
+    cases = {
+        "get_prediction_by_uid": lambda: queries.get_prediction_by_uid(db, "uid-1234"),
+        "get_all_labels": lambda: queries.get_all_labels(db, 1),
+        "get_predictions_by_label": lambda: queries.get_predictions_by_label(db, "toothbrush"),
+        "get_predictions_by_score": lambda: queries.get_predictions_by_score(db, 1, 0.99),
+        "get_predictions_by_time": lambda: queries.get_predictions_by_time(db, now - timedelta(hours=6), now),
+        "count_recent_predictions": lambda: queries.count_recent_predictions(db, 1),
+        "detections_of_one_prediction": lambda: (
+            db.query(DetectionObjects).filter_by(prediction_uid="uid-4321").count()
+        ),
+    }
+    try:
+        return {name: time_query(fn, repeat) for name, fn in cases.items()}
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the API queries before and after indexing")
+    parser.add_argument("--sessions", type=int, default=50000)
+    parser.add_argument("--detections", type=int, default=8, help="detections per session")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for indexed in (False, True):
+            path = os.path.join(tmp, f"{'after' if indexed else 'before'}.db")
+            engine = build(path, indexed, args.sessions, args.detections, args.users)
+            results[indexed] = run(engine, args.repeat)
+            engine.dispose()
+
+    print(f"{args.sessions} sessions, {args.sessions * args.detections} detections, median of {args.repeat} runs")
+    print(f"{'query':<34}{'before (ms)':>12}{'after (ms)':>12}{'speedup':>10}")
+    for name, before in results[False].items():
+        after = results[True][name]
+        print(f"{name:<34}{before:>12.2f}{after:>12.2f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# inference.py
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class InferenceQueueFull(Exception):
+    """Raised when every inference worker is busy and the wait queue is full."""
+
+
+class InferencePool:
+    """
+    Runs blocking model calls on a dedicated thread pool so the event loop stays free.
+    At most `workers` calls run at once and up to `queue_depth` more may wait for a worker;
+    anything beyond that is rejected right away with InferenceQueueFull.
+    """
+
+    def __init__(self, workers: int = 1, queue_depth: int = 16):
+        self.workers = max(1, workers)
+        self.queue_depth = max(0, queue_depth)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """Number of calls currently running or waiting for a worker."""
+        return self._pending
+
+    async def run(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._pending >= self.workers + self.queue_depth:
+                raise InferenceQueueFull(f"{self._pending} inference calls already pending")
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+            executor = self._executor
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+class BatchScheduler:
+    """
+    Micro-batches concurrent inference requests. Sources submitted within `window_ms` of the
+    first one (or until `max_batch` are waiting) go through `run_batch` as a single model call
+    on the inference pool, and each caller gets back its own result. Sources submitted with
+    different keyword parameters (image size, thresholds, ...) are batched separately and the
+    parameters are passed on to `run_batch`; they must be hashable.
+    """
+
+    def __init__(self, pool: InferencePool, run_batch, max_batch: int = 8, window_ms: float = 10):
+        self.pool = pool
+        self.run_batch = run_batch
+        self.max_batch = max(1, max_batch)
+        self.window = max(0.0, window_ms) / 1000
+        self._waiting = {}
+        self._timers = {}
+
+    async def submit(self, source, **params):
+        if self.max_batch == 1 or self.window == 0:
+            results = await self.pool.run(self.run_batch, [source], **params)
+            return results[0]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = tuple(sorted(params.items()))
+        waiting = self._waiting.setdefault(key, [])
+        waiting.append((source, future))
+        if len(waiting) >= self.max_batch:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        return await future
+
+    def _flush(self, key=()):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._waiting.pop(key, [])
+        if batch:
+            asyncio.ensure_future(self._run(batch, dict(key)))
+
+    async def _run(self, batch, params):
+        try:
+            results = await self.pool.run(self.run_batch, [source for source, _ in batch], **params)
+            if len(results) != len(batch):
+                raise RuntimeError(f"model returned {len(results)} results for a batch of {len(batch)}")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,161 @@
+# metrics.py
+
+import functools
+import inspect
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# 1 ms .. 10 s; a stage that takes longer is broken, not slow
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_SECONDS = Histogram(
+    "predict_stage_seconds",
+    "Time spent in each stage of a prediction",
+    ["stage"],
+    buckets=BUCKETS,
+)
+INFERENCE_BATCH_SECONDS = Histogram(
+    "inference_batch_seconds", "Time of one model call, excluding the wait for a worker", buckets=BUCKETS
+)
+INFERENCE_BATCH_SIZE = Histogram(
+    "inference_batch_size", "Images per model call", buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds", "Time of each queries.py / queries_async.py function", ["query"], buckets=BUCKETS
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds", "HTTP request latency by route and status", ["method", "route", "status"], buckets=BUCKETS
+)
+DETECTIONS = Counter("detections", "Objects detected, by label", ["label"])
+
+# exported from the stats() of the write-behind buffer, S3 storage, result cache and inference pool
+# when /metrics is scraped: (group, key) -> (type, help)
+STATS = {
+    ("inference", "pending"): ("gauge", "Model calls running or waiting for an inference worker"),
+    ("inference", "capacity"): ("gauge", "Model calls that may run or wait before /predict answers 503"),
+    ("write_behind", "pending"): ("gauge", "Predictions waiting in the write-behind buffer"),
+    ("write_behind", "lag_seconds"): ("gauge", "Age of the oldest prediction in the write-behind buffer"),
+    ("write_behind", "written"): ("counter", "Predictions saved by the write-behind writer"),
+    ("write_behind", "failed"): ("counter", "Predictions the write-behind writer failed to save"),
+    ("s3", "pending_uploads"): ("gauge", "Background S3 uploads not finished yet"),
+    ("s3", "uploaded"): ("counter", "Background S3 uploads that succeeded"),
+    ("s3", "retried"): ("counter", "Background S3 upload retries"),
+    ("s3", "failed"): ("counter", "Background S3 uploads that gave up"),
+    ("result_cache", "size"): ("gauge", "Entries in the result cache"),
+    ("result_cache", "hits"): ("counter", "Result cache lookups that skipped the model"),
+    ("result_cache", "misses"): ("counter", "Result cache lookups that ran the model"),
+}
+
+
+def stage(name: str):
+    """`with stage("decode"): ...` records the block in predict_stage_seconds."""
+    return STAGE_SECONDS.labels(name).time()
+
+
+def record_detections(detections: list[dict]):
+    for detection in detections:
+        DETECTIONS.labels(detection["label"]).inc()
+
+
+def timed_query(fn):
+    """Record every call of `fn` (plain, generator or coroutine function) in db_query_seconds."""
+    histogram = DB_QUERY_SECONDS.labels(fn.__name__)
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with histogram.time():
+                return await fn(*args, **kwargs)
+    elif inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            # a streamed query runs while it is consumed, so the whole iteration is timed
+            with histogram.time():
+                yield from fn(*args, **kwargs)
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with histogram.time():
+                return fn(*args, **kwargs)
+    wrapper.timed_query = True
+    return wrapper
+
+
+def instrument_queries(module):
+    """Wrap the public functions of `module` that take a session as first argument with timed_query()."""
+    for name, fn in list(vars(module).items()):
+        if name.startswith("_") or not inspect.isfunction(fn) or fn.__module__ != module.__name__:
+            continue
+        if getattr(fn, "timed_query", False) or next(iter(inspect.signature(fn).parameters), None) != "db":
+            continue
+        setattr(module, name, timed_query(fn))
+
+
+class StatsCollector:
+    """Turns a {group: stats() dict} snapshot into Prometheus metrics named <group>_<key>."""
+
+    def __init__(self, stats: dict, labels: dict = None):
+        self.stats = stats
+        self.labels = labels or {}
+
+    def collect(self):
+        for (group, key), (kind, documentation) in STATS.items():
+            value = (self.stats.get(group) or {}).get(key)
+            if value is None:
+                continue
+            family = CounterMetricFamily if kind == "counter" else GaugeMetricFamily
+            metric = family(f"{group}_{key}", documentation, labels=list(self.labels))
+            metric.add_metric(list(self.labels.values()), value)
+            yield metric
+
+
+def render(stats: dict) -> bytes:
+    """
+    The text exposition of every metric above plus the `stats` snapshot. Under serve.py
+    (PROMETHEUS_MULTIPROC_DIR set) the metrics above are summed over all workers, while the
+    snapshot is only the answering worker's, so it is labelled with its pid.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        labels = {"pid": str(os.getpid())}
+    else:
+        from prometheus_client import REGISTRY as registry
+
+        labels = {}
+    snapshot = CollectorRegistry()
+    snapshot.register(StatsCollector(stats, labels))
+    return generate_latest(registry) + generate_latest(snapshot)
+
+
+class RequestMetrics:
+    """
+    ASGI middleware recording http_request_seconds by route template and status code.
+    Streamed responses are timed until their last chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_and_record_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_record_status)
+        finally:
+            # the router stores the matched route in the scope; /prediction/{uid}, not every uid
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route, str(status)).observe(time.perf_counter() - started)
@@ -0,0 +1,137 @@
+# migrations.py
+#
+# Brings an existing database up to the current models. create_all() only creates missing
+# tables, so anything added to a table that already exists is applied here.
+#
+# Run against the configured database with:
+#     python migrations.py
+
+import json
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from auth import hash_password, is_password_hash
+from models import Base
+
+
+def add_missing_columns(engine: Engine) -> list[str]:
+    """
+    Add every column declared on the models that an existing table does not have yet.
+    Returns the added columns as "table.column".
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                    added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def backfill_box_columns(engine: Engine, batch_size: int = 1000) -> int:
+    """
+    Older databases kept each bounding box as a stringified list in detection_objects.box.
+    Parse those into x1/y1/x2/y2/area. Returns the number of rows converted.
+    """
+    columns = {column["name"] for column in inspect(engine).get_columns("detection_objects")}
+    if "box" not in columns:
+        return 0
+    converted = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT id, box FROM detection_objects "
+                    "WHERE id > :last_id AND x1 IS NULL AND box IS NOT NULL ORDER BY id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": batch_size},
+            ).fetchall()
+            if not rows:
+                return converted
+            updates = []
+            for row_id, box in rows:
+                try:
+                    x1, y1, x2, y2 = (float(v) for v in json.loads(box))
+                except (ValueError, TypeError):
+                    continue
+                updates.append({
+                    "id": row_id, "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+                    "area": max(0.0, x2 - x1) * max(0.0, y2 - y1),
+                })
+            if updates:
+                conn.execute(
+                    text("UPDATE detection_objects SET x1 = :x1, y1 = :y1, x2 = :x2, y2 = :y2, area = :area WHERE id = :id"),
+                    updates,
+                )
+            converted += len(updates)
+            last_id = rows[-1][0]
+
+
+def hash_plaintext_passwords(engine: Engine) -> int:
+    """
+    Older databases stored users.pass in plain text. Replace those with salted hashes.
+    Returns the number of users updated.
+    """
+    if "users" not in inspect(engine).get_table_names():
+        return 0
+    with engine.begin() as conn:
+        rows = conn.execute(text('SELECT id, "pass" FROM users WHERE "pass" IS NOT NULL')).fetchall()
+        updates = [
+            {"id": user_id, "password": hash_password(password)}
+            for user_id, password in rows
+            if not is_password_hash(password)
+        ]
+        if updates:
+            conn.execute(text('UPDATE users SET "pass" = :password WHERE id = :id'), updates)
+    return len(updates)
+
+
+def create_missing_indexes(engine: Engine) -> list[str]:
+    """
+    Create every index declared on the models that the database does not have yet.
+    Returns the names of the indexes that were created.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+                created.append(index.name)
+    return created
+
+
+def upgrade(engine: Engine) -> list[str]:
+    """
+    Apply all pending schema changes. Safe to run on every startup.
+    Returns a description of each change that was applied.
+    """
+    Base.metadata.create_all(bind=engine)
+    applied = add_missing_columns(engine)
+    converted = backfill_box_columns(engine)
+    if converted:
+        applied.append(f"detection_objects.box: {converted} rows converted")
+    hashed = hash_plaintext_passwords(engine)
+    if hashed:
+        applied.append(f"users.pass: {hashed} passwords hashed")
+    return applied + create_missing_indexes(engine)
+
+
+if __name__ == "__main__":
+    from db import engine
+
+    applied = upgrade(engine)
+    print("\n".join(applied) if applied else "Database is up to date")
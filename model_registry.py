@@ -0,0 +1,204 @@
+# model_registry.py
+
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+
+class UnknownModel(KeyError):
+    """Raised for a model name that was never registered."""
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """
+    A loaded model and the weights version it was loaded from. Two handles are equal when
+    name and version match, so requests for the same weights can share a batch.
+    """
+
+    name: str
+    version: Optional[str]
+    model: object = field(compare=False, repr=False)
+
+
+def weights_version(path: str) -> Optional[str]:
+    """Short content hash of a weights file; None for anything that is not a local file."""
+    if not os.path.isfile(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def loaded_version(weights: str, model) -> Optional[str]:
+    """
+    weights_version() of what `model` was loaded from. Called after loading: weights like
+    yolov8s.pt only exist once ultralytics has downloaded them, possibly somewhere else
+    (the model's ckpt_path).
+    """
+    version = weights_version(weights)
+    path = getattr(model, "ckpt_path", None)
+    if version is None and isinstance(path, str):
+        version = weights_version(path)
+    return version
+
+
+def read_swaps(path: str) -> dict:
+    """The {name: weights} swaps recorded in `path` by record_swap()."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def record_swap(path: str, name: str, weights: str):
+    """
+    Record that `name` now serves `weights` in the JSON file at `path`, which the other
+    worker processes follow (see ModelRegistry.follow()).
+    """
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        swaps = read_swaps(path)
+        swaps[name] = weights
+        # readers never see a half-written file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(swaps, f)
+        os.replace(tmp_path, path)
+
+
+class ModelRegistry:
+    """
+    Named model weights, loaded on first use with `loader(weights)`. At most `max_loaded`
+    models stay resident; the least recently used one that is not pinned is dropped when
+    another is loaded. Calls already running keep the model object they were given, so
+    eviction and swap() never interrupt them - the memory is freed when they finish.
+    """
+
+    def __init__(self, loader: Callable, max_loaded: int = 2, pinned=()):
+        self.loader = loader
+        self.max_loaded = max(1, max_loaded)
+        self.pinned = set(pinned)
+        self._weights = {}
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.loads = 0
+        self.evictions = 0
+        self.swaps = 0
+
+    def register(self, name: str, weights: str):
+        with self._lock:
+            self._weights[name] = weights
+
+    def weights(self, name: str) -> Optional[str]:
+        with self._lock:
+            return self._weights.get(name)
+
+    def names(self) -> list[str]:
+        with self._lock:
+            return list(self._weights)
+
+    def loaded(self, name: str) -> Optional[LoadedModel]:
+        """The resident model for `name`, without loading it or touching the LRU order."""
+        with self._lock:
+            return self._loaded.get(name)
+
+    def get(self, name: str) -> LoadedModel:
+        with self._lock:
+            if name not in self._weights:
+                raise UnknownModel(name)
+            handle = self._touch(name)
+            if handle is not None:
+                return handle
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        # one load per model at a time; other models load (and are served) meanwhile
+        with load_lock:
+            with self._lock:
+                handle = self._touch(name)
+                if handle is not None:
+                    return handle
+                weights = self._weights[name]
+            model = self.loader(weights)
+            handle = LoadedModel(name, loaded_version(weights, model), model)
+            with self._lock:
+                self._loaded[name] = handle
+                self.loads += 1
+                self._evict()
+            return handle
+
+    def swap(self, name: str, weights: str, warm_up: Optional[Callable] = None) -> LoadedModel:
+        """
+        Load `weights` under `name` (registering it if it is new), run `warm_up(model)` on it,
+        and only then make it the model new requests get.
+        """
+        with self._lock:
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        with load_lock:
+            model = self.loader(weights)
+            with self._lock:
+                # without a version the result cache key would not change with the weights
+                version = loaded_version(weights, model) or f"swap-{self.swaps + 1}"
+            handle = LoadedModel(name, version, model)
+            if warm_up is not None:
+                warm_up(handle.model)
+            with self._lock:
+                self._weights[name] = weights
+                self._loaded[name] = handle
+                self._loaded.move_to_end(name)
+                self.swaps += 1
+                self._evict()
+        return handle
+
+    def follow(self, name: str, weights: str, warm_up: Optional[Callable] = None) -> Optional[LoadedModel]:
+        """
+        Apply a swap made in another process: a resident model is swapped (and returned), one
+        that is not loaded just loads `weights` the next time it is used.
+        """
+        with self._lock:
+            resident = name in self._loaded
+            if not resident:
+                self._weights[name] = weights
+        if resident:
+            return self.swap(name, weights, warm_up)
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_loaded": self.max_loaded,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "swaps": self.swaps,
+                "models": [
+                    {
+                        "name": name,
+                        "weights": weights,
+                        "loaded": name in self._loaded,
+                        "version": self._loaded[name].version if name in self._loaded else None,
+                    }
+                    for name, weights in self._weights.items()
+                ],
+            }
+
+    def _touch(self, name: str) -> Optional[LoadedModel]:
+        handle = self._loaded.get(name)
+        if handle is not None:
+            self._loaded.move_to_end(name)
+        return handle
+
+    def _evict(self):
+        while len(self._loaded) > self.max_loaded:
+            victim = next((name for name in self._loaded if name not in self.pinned), None)
+            if victim is None:
+                return
+            del self._loaded[victim]
+            self.evictions += 1
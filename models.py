@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Integer, Float, ForeignKey
+from sqlalchemy import Column, String, DateTime, Integer, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 
@@ -16,21 +16,47 @@ class User(Base):
 
 class PredictionSession(Base):
     __tablename__ = 'prediction_sessions'
+    __table_args__ = (
+        # per-user listings filtered by time
+        Index("ix_prediction_sessions_user_id_timestamp", "user_id", "timestamp"),
+    )
     
     uid = Column(String, primary_key=True)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     original_image = Column(String)
     predicted_image = Column(String)
+    image_width = Column(Integer)
+    image_height = Column(Integer)
     user_id = Column(Integer, ForeignKey("users.id"))
+    # registry name of the model that produced the prediction and the hash of its weights
+    model_name = Column(String)
+    model_version = Column(String)
 
     user = relationship("User", back_populates="predictions")
 
 
 class DetectionObjects(Base):
     __tablename__ = 'detection_objects'
+    __table_args__ = (
+        # label lookups that join back to their sessions
+        Index("ix_detection_objects_label_prediction_uid", "label", "prediction_uid"),
+        # region lookups range over the top-left corner first
+        Index("ix_detection_objects_x1_y1", "x1", "y1"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    prediction_uid = Column(String, ForeignKey("prediction_sessions.uid"))
+    prediction_uid = Column(String, ForeignKey("prediction_sessions.uid"), index=True)
     label = Column(String)
-    score = Column(Float)
-    box = Column(String)
+    score = Column(Float, index=True)
+    # bounding box corners in pixels (xyxy) and its area, so the database can filter on them
+    x1 = Column(Float)
+    y1 = Column(Float)
+    x2 = Column(Float)
+    y2 = Column(Float)
+    area = Column(Float, index=True)
+
+    @property
+    def box(self) -> list[float] | None:
+        if self.x1 is None:
+            return None
+        return [self.x1, self.y1, self.x2, self.y2]
@@ -0,0 +1,78 @@
+# pagination.py
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import AsyncIterable, Iterable, Optional, Union
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values) -> str:
+    """Pack the sort key of the last row of a page into an opaque cursor."""
+    raw = json.dumps(jsonable_encoder(list(values))).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: type) -> list:
+    """
+    Unpack a cursor made by encode_cursor(). It must hold one value per entry of `types`
+    (str, int or datetime, which travels as an ISO timestamp); anything else is a 400.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(types):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return [_cursor_value(value, kind) for value, kind in zip(values, types)]
+
+
+def _cursor_value(value, kind: type):
+    if kind is datetime and isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    # bool is an int to isinstance(), but never a valid key
+    elif isinstance(value, kind) and not isinstance(value, bool):
+        return value
+    raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def page_response(items: list, next_cursor: Optional[str]) -> JSONResponse:
+    """
+    Return a page as a plain JSON list, the same body the unpaginated endpoint returns.
+    The cursor for the following page, if any, goes in the X-Next-Cursor header.
+    """
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return JSONResponse(jsonable_encoder(items), headers=headers)
+
+
+def ndjson_response(rows: Union[Iterable[dict], AsyncIterable[dict]]) -> StreamingResponse:
+    """Stream rows as newline-delimited JSON, one object per line."""
+    if hasattr(rows, "__aiter__"):
+        async def lines():
+            async for row in rows:
+                yield json.dumps(jsonable_encoder(row)) + "\n"
+    else:
+        def lines():
+            for row in rows:
+                yield json.dumps(jsonable_encoder(row)) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def sse_response(rows: AsyncIterable[dict]) -> StreamingResponse:
+    """Stream rows as server-sent events, one `data:` event per row."""
+    async def events():
+        async for row in rows:
+            yield f"data: {json.dumps(jsonable_encoder(row))}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
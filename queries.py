@@ -1,11 +1,15 @@
 # repository/queries.py
 
-from sqlalchemy import and_, func, select
+from sqlalchemy import and_, func, insert, or_, select
 from sqlalchemy.orm import Session
 from models import PredictionSession, DetectionObjects
-from typing import List, Optional
+from typing import Iterator, List, Optional
 from datetime import datetime, timedelta
 from models import User
+from auth import DUMMY_HASH, hash_password, verify_password
+
+# rows fetched per round trip when a listing is streamed from a server-side cursor
+STREAM_BATCH_SIZE = 500
 
 
 def save_prediction_session(db: Session, uid: str, original_image: str, predicted_image: str, user_id: Optional[int] = None):
@@ -20,21 +24,111 @@ def save_prediction_session(db: Session, uid: str, original_image: str, predicte
     db.commit()
 
 
-def save_detection_object(db: Session, prediction_uid: str, label: str, score: float, box: str):
-    obj = DetectionObjects(
-        prediction_uid=prediction_uid,
-        label=label,
-        score=score,
-        box=box
-    )
+def save_detection_object(db: Session, prediction_uid: str, label: str, score: float, box: List[float]):
+    obj = DetectionObjects(**detection_row(prediction_uid, {"label": label, "score": score, "box": box}))
     db.add(obj)
     db.commit()
 
 
+def detection_row(prediction_uid: str, detection: dict) -> dict:
+    """
+    Turn a detection dict (label, score, box as [x1, y1, x2, y2]) into a detection_objects row.
+    """
+    x1, y1, x2, y2 = (float(v) for v in detection["box"])
+    return {
+        "prediction_uid": prediction_uid,
+        "label": detection["label"],
+        "score": detection["score"],
+        "x1": x1,
+        "y1": y1,
+        "x2": x2,
+        "y2": y2,
+        "area": max(0.0, x2 - x1) * max(0.0, y2 - y1),
+    }
+
+
+def save_prediction_with_detections(
+    db: Session,
+    uid: str,
+    original_image: str,
+    predicted_image: str,
+    user_id: Optional[int] = None,
+    detections: Optional[List[dict]] = None,
+    image_width: Optional[int] = None,
+    image_height: Optional[int] = None,
+    model_name: Optional[str] = None,
+    model_version: Optional[str] = None,
+):
+    """
+    Save a prediction session and all of its detections in a single transaction.
+    Each detection is a dict with label, score and box ([x1, y1, x2, y2]); rows are written
+    with one bulk insert.
+    """
+    prediction = PredictionSession(
+        uid=uid,
+        original_image=original_image,
+        predicted_image=predicted_image,
+        image_width=image_width,
+        image_height=image_height,
+        user_id=user_id,
+        model_name=model_name,
+        model_version=model_version,
+        timestamp=datetime.now()
+    )
+    db.add(prediction)
+    db.flush()
+    if detections:
+        db.execute(
+            insert(DetectionObjects),
+            [detection_row(uid, detection) for detection in detections],
+        )
+    db.commit()
+
+
+def save_prediction_batch(db: Session, predictions: List[dict]):
+    """
+    Save many prediction sessions and their detections in a single transaction.
+    Each prediction is a dict with uid, original_image, predicted_image, image_width,
+    image_height, user_id, timestamp, model_name, model_version and a list of detections
+    (label, score, box).
+    """
+    if not predictions:
+        return
+    db.execute(
+        insert(PredictionSession),
+        [
+            {
+                "uid": p["uid"],
+                "original_image": p["original_image"],
+                "predicted_image": p["predicted_image"],
+                "image_width": p.get("image_width"),
+                "image_height": p.get("image_height"),
+                "user_id": p["user_id"],
+                "model_name": p.get("model_name"),
+                "model_version": p.get("model_version"),
+                "timestamp": p["timestamp"],
+            }
+            for p in predictions
+        ],
+    )
+    rows = [
+        detection_row(p["uid"], detection)
+        for p in predictions
+        for detection in p["detections"]
+    ]
+    if rows:
+        db.execute(insert(DetectionObjects), rows)
+    db.commit()
+
+
 def get_prediction_by_uid(db: Session, uid: str) -> Optional[PredictionSession]:
     return db.query(PredictionSession).filter_by(uid=uid).first()
 
 
+def get_detections_by_uid(db: Session, uid: str) -> list[DetectionObjects]:
+    return db.query(DetectionObjects).filter_by(prediction_uid=uid).order_by(DetectionObjects.id).all()
+
+
 def delete_prediction_session(db: Session, uid: str):
     db.query(PredictionSession).filter_by(uid=uid).delete()
     db.commit()
@@ -44,6 +138,19 @@ def delete_detection_objects_by_uid(db: Session, uid: str):
     db.query(DetectionObjects).filter_by(prediction_uid=uid).delete()
     db.commit()
 
+
+def image_shared_with_other_predictions(db: Session, uid: str, path: str) -> bool:
+    # deduplicated predictions point at the image files of the first one
+    other = (
+        db.query(PredictionSession.uid)
+        .filter(
+            PredictionSession.uid != uid,
+            or_(PredictionSession.original_image == path, PredictionSession.predicted_image == path),
+        )
+        .first()
+    )
+    return other is not None
+
 def get_all_labels(db: Session, user_id: int) -> list[dict]:
     results = (
         db.query(DetectionObjects.label, func.count(DetectionObjects.label))
@@ -55,14 +162,42 @@ def get_all_labels(db: Session, user_id: int) -> list[dict]:
     return [{"label": label, "count": count} for label, count in results]
 
 
-def get_predictions_by_time(db: Session, start: datetime, end: datetime) -> list[dict]:
-    rows = (
+def _predictions_by_time_query(db: Session, start: datetime, end: datetime, after: Optional[tuple] = None):
+    query = (
         db.query(PredictionSession.uid, PredictionSession.timestamp)
         .filter(PredictionSession.timestamp.between(start, end))
-        .all()
     )
+    if after is not None:
+        after_timestamp, after_uid = after
+        query = query.filter(or_(
+            PredictionSession.timestamp > after_timestamp,
+            and_(PredictionSession.timestamp == after_timestamp, PredictionSession.uid > after_uid),
+        ))
+    return query.order_by(PredictionSession.timestamp, PredictionSession.uid)
+
+
+def get_predictions_by_time(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    after: Optional[tuple] = None,
+    limit: Optional[int] = None,
+) -> list[dict]:
+    """
+    Return predictions (uid, timestamp) made between start and end, oldest first.
+    `after` is the (timestamp, uid) of the last row of the previous page.
+    """
+    rows = _predictions_by_time_query(db, start, end, after).limit(limit).all()
     return [{"uid": uid, "timestamp": timestamp} for uid, timestamp in rows]
 
+
+def stream_predictions_by_time(
+    db: Session, start: datetime, end: datetime, after: Optional[tuple] = None
+) -> Iterator[dict]:
+    query = _predictions_by_time_query(db, start, end, after)
+    for uid, timestamp in query.execution_options(stream_results=True).yield_per(STREAM_BATCH_SIZE):
+        yield {"uid": uid, "timestamp": timestamp}
+
 def get_prediction_count_last_week(db: Session) -> int:
     one_week_ago = datetime.now() - timedelta(days=7)
     return db.query(func.count(PredictionSession.uid)).filter(PredictionSession.timestamp >= one_week_ago).scalar()
@@ -75,19 +210,33 @@ def count_recent_predictions(db: Session, days: int = 7) -> int:
     since = datetime.utcnow() - timedelta(days=days)
     return db.query(func.count(PredictionSession.uid)).filter(PredictionSession.timestamp >= since).scalar()
 
-def get_predictions_by_label(db: Session, label: str) -> List[dict]:
-    """
-    Return list of predictions (uid, timestamp) that contain the given label
-    """
-    results = (
+def _predictions_by_label_query(db: Session, label: str, after: Optional[str] = None):
+    query = (
         db.query(PredictionSession.uid, PredictionSession.timestamp)
         .join(DetectionObjects, DetectionObjects.prediction_uid == PredictionSession.uid)
         .filter(DetectionObjects.label == label)
-        .distinct()
-        .all()
     )
+    if after is not None:
+        query = query.filter(PredictionSession.uid > after)
+    return query.distinct().order_by(PredictionSession.uid)
+
+
+def get_predictions_by_label(
+    db: Session, label: str, after: Optional[str] = None, limit: Optional[int] = None
+) -> List[dict]:
+    """
+    Return list of predictions (uid, timestamp) that contain the given label, ordered by uid.
+    `after` is the last uid of the previous page.
+    """
+    results = _predictions_by_label_query(db, label, after).limit(limit).all()
     return [{"uid": uid, "timestamp": timestamp} for uid, timestamp in results]
 
+
+def stream_predictions_by_label(db: Session, label: str, after: Optional[str] = None) -> Iterator[dict]:
+    query = _predictions_by_label_query(db, label, after)
+    for uid, timestamp in query.execution_options(stream_results=True).yield_per(STREAM_BATCH_SIZE):
+        yield {"uid": uid, "timestamp": timestamp}
+
 def get_predictions_by_min_score(db: Session, user_id: int, min_score: float) -> list[dict]:
     results = (
         db.query(DetectionObjects.label, func.count(DetectionObjects.id))
@@ -103,21 +252,111 @@ def get_predictions_by_min_score(db: Session, user_id: int, min_score: float) ->
     )
     return [{"label": label, "count": count} for label, count in results]
 
-def get_predictions_by_score(db: Session, user_id: int, min_score: float) -> list[DetectionObjects]:
-    return (
+def _predictions_by_score_query(db: Session, user_id: int, min_score: float, after: Optional[int] = None):
+    query = (
         db.query(DetectionObjects)
         .join(PredictionSession, DetectionObjects.prediction_uid == PredictionSession.uid)
         .filter(PredictionSession.user_id == user_id, DetectionObjects.score >= min_score)
-        .all()
     )
+    if after is not None:
+        query = query.filter(DetectionObjects.id > after)
+    return query.order_by(DetectionObjects.id)
+
+
+def get_predictions_by_score(
+    db: Session, user_id: int, min_score: float, after: Optional[int] = None, limit: Optional[int] = None
+) -> list[DetectionObjects]:
+    """
+    Return the user's detections scoring at least min_score, ordered by id.
+    `after` is the last detection id of the previous page.
+    """
+    return _predictions_by_score_query(db, user_id, min_score, after).limit(limit).all()
+
+
+def stream_predictions_by_score(
+    db: Session, user_id: int, min_score: float, after: Optional[int] = None
+) -> Iterator[DetectionObjects]:
+    query = _predictions_by_score_query(db, user_id, min_score, after)
+    yield from query.execution_options(stream_results=True).yield_per(STREAM_BATCH_SIZE)
+
+
+def _detections_by_box_query(
+    db: Session,
+    user_id: int,
+    min_area: Optional[float] = None,
+    max_area: Optional[float] = None,
+    region: Optional[tuple] = None,
+    label: Optional[str] = None,
+    after: Optional[int] = None,
+):
+    query = (
+        db.query(DetectionObjects)
+        .join(PredictionSession, DetectionObjects.prediction_uid == PredictionSession.uid)
+        .filter(PredictionSession.user_id == user_id)
+    )
+    if min_area is not None:
+        query = query.filter(DetectionObjects.area >= min_area)
+    if max_area is not None:
+        query = query.filter(DetectionObjects.area <= max_area)
+    if region is not None:
+        rx1, ry1, rx2, ry2 = region
+        query = query.filter(
+            DetectionObjects.x1 >= rx1,
+            DetectionObjects.y1 >= ry1,
+            DetectionObjects.x2 <= rx2,
+            DetectionObjects.y2 <= ry2,
+        )
+    if label is not None:
+        query = query.filter(DetectionObjects.label == label)
+    if after is not None:
+        query = query.filter(DetectionObjects.id > after)
+    return query.order_by(DetectionObjects.id)
+
+
+def get_detections_by_box(
+    db: Session,
+    user_id: int,
+    min_area: Optional[float] = None,
+    max_area: Optional[float] = None,
+    region: Optional[tuple] = None,
+    label: Optional[str] = None,
+    after: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> list[DetectionObjects]:
+    """
+    Return the user's detections whose box area lies in [min_area, max_area] and/or whose box
+    lies entirely inside region (x1, y1, x2, y2), ordered by id.
+    """
+    query = _detections_by_box_query(db, user_id, min_area, max_area, region, label, after)
+    return query.limit(limit).all()
+
+
+def stream_detections_by_box(
+    db: Session,
+    user_id: int,
+    min_area: Optional[float] = None,
+    max_area: Optional[float] = None,
+    region: Optional[tuple] = None,
+    label: Optional[str] = None,
+    after: Optional[int] = None,
+) -> Iterator[DetectionObjects]:
+    query = _detections_by_box_query(db, user_id, min_area, max_area, region, label, after)
+    yield from query.execution_options(stream_results=True).yield_per(STREAM_BATCH_SIZE)
 
 
 def get_user_by_credentials(db: Session, username: str, password: str) -> User | None:
     """
-    Fetch a user by username and password.
+    Fetch a user by username and check the password against its stored hash.
     Returns None if no match found.
     """
-    return db.query(User).filter(User.username == username, User.pass_field == password).first()
+    user = db.query(User).filter(User.username == username).first()
+    if user is None:
+        # as slow as a wrong password, so the timing does not reveal which usernames exist
+        verify_password(password, DUMMY_HASH)
+        return None
+    if not verify_password(password, user.pass_field):
+        return None
+    return user
 
 
 def add_test_user(db: Session, username: str = "user", password: str = "pass"):
@@ -126,7 +365,6 @@ def add_test_user(db: Session, username: str = "user", password: str = "pass"):
     """
     user = db.query(User).filter(User.username == username).first()
     if not user:
-        test_user = User(username=username, pass_field=password)
+        test_user = User(username=username, pass_field=hash_password(password))
         db.add(test_user)
         db.commit()
-
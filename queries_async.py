@@ -0,0 +1,70 @@
+# queries_async.py
+#
+# AsyncSession twins of the read queries in queries.py, used by the read endpoints when
+# DB_ASYNC is on. Each function takes the same arguments and returns the same shape as
+# its namesake in queries.py.
+
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import DetectionObjects, PredictionSession, User
+
+
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
+    # the password is checked by the caller, off the event loop
+    result = await db.execute(select(User).filter_by(username=username).limit(1))
+    return result.scalars().first()
+
+
+async def get_prediction_by_uid(db: AsyncSession, uid: str) -> Optional[PredictionSession]:
+    result = await db.execute(select(PredictionSession).filter_by(uid=uid).limit(1))
+    return result.scalars().first()
+
+
+async def get_all_labels(db: AsyncSession, user_id: int) -> list[dict]:
+    result = await db.execute(
+        select(DetectionObjects.label, func.count(DetectionObjects.label))
+        .join(PredictionSession, DetectionObjects.prediction_uid == PredictionSession.uid)
+        .where(PredictionSession.user_id == user_id)
+        .group_by(DetectionObjects.label)
+    )
+    return [{"label": label, "count": count} for label, count in result.all()]
+
+
+async def count_recent_predictions(db: AsyncSession, days: int = 7) -> int:
+    since = datetime.utcnow() - timedelta(days=days)
+    result = await db.execute(
+        select(func.count(PredictionSession.uid)).where(PredictionSession.timestamp >= since)
+    )
+    return result.scalar()
+
+
+async def get_predictions_by_label(
+    db: AsyncSession, label: str, after: Optional[str] = None, limit: Optional[int] = None
+) -> List[dict]:
+    query = (
+        select(PredictionSession.uid, PredictionSession.timestamp)
+        .join(DetectionObjects, DetectionObjects.prediction_uid == PredictionSession.uid)
+        .where(DetectionObjects.label == label)
+    )
+    if after is not None:
+        query = query.where(PredictionSession.uid > after)
+    result = await db.execute(query.distinct().order_by(PredictionSession.uid).limit(limit))
+    return [{"uid": uid, "timestamp": timestamp} for uid, timestamp in result.all()]
+
+
+async def get_predictions_by_score(
+    db: AsyncSession, user_id: int, min_score: float, after: Optional[int] = None, limit: Optional[int] = None
+) -> list[DetectionObjects]:
+    query = (
+        select(DetectionObjects)
+        .join(PredictionSession, DetectionObjects.prediction_uid == PredictionSession.uid)
+        .where(PredictionSession.user_id == user_id, DetectionObjects.score >= min_score)
+    )
+    if after is not None:
+        query = query.where(DetectionObjects.id > after)
+    result = await db.execute(query.order_by(DetectionObjects.id).limit(limit))
+    return list(result.scalars().all())
@@ -0,0 +1,76 @@
+# result_cache.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def content_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed cache of finished predictions. Keys combine the image identity (a
+    SHA-256 of the uploaded bytes, or the S3 ETag) with the model and inference settings,
+    values are whatever the caller needs to answer without running the model again.
+    Entries live for `ttl` seconds and the least recently used one is dropped once
+    `max_size` is reached. A ttl of 0 disables the cache.
+    """
+
+    def __init__(self, ttl: float = 3600, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(source: str, model: str, **params) -> str:
+        settings = ",".join(f"{name}={params[name]}" for name in sorted(params))
+        return f"{model}|{settings}|{source}"
+
+    def get(self, key: str) -> Optional[dict]:
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: dict):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def forget_prediction(self, uid: str):
+        # drop entries whose files belonged to a prediction that was just deleted
+        with self._lock:
+            for key in [k for k, (value, _) in self._entries.items() if value.get("uid") == uid]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        return {"size": size, "max_size": self.max_size, "ttl": self.ttl, "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
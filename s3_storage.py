@@ -0,0 +1,166 @@
+# s3_storage.py
+
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+logger = logging.getLogger(__name__)
+
+
+def build_s3_client(region: str, max_connections: int = 32, max_attempts: int = 3):
+    """
+    boto3 client whose HTTP connection pool is sized for `max_connections` concurrent calls.
+    botocore itself retries throttling and transient network errors up to `max_attempts` times.
+    """
+    config = Config(
+        max_pool_connections=max_connections,
+        retries={"max_attempts": max_attempts, "mode": "adaptive"},
+        tcp_keepalive=True,
+    )
+    return boto3.client("s3", region_name=region, config=config)
+
+
+class S3Storage:
+    """
+    Runs blocking boto3 calls on a dedicated thread pool so the event loop stays free.
+    At most `max_concurrency` S3 calls run at once. Uploads handed to `upload_in_background`
+    run on the same pool after the caller moves on. A failed upload is retried `upload_retries`
+    times with exponential backoff, then counted as failed and logged.
+    """
+
+    def __init__(
+        self,
+        client,
+        bucket: str,
+        max_concurrency: int = 16,
+        upload_retries: int = 3,
+        retry_backoff: float = 0.5,
+    ):
+        self.client = client
+        self.bucket = bucket
+        self.max_concurrency = max(1, max_concurrency)
+        self.upload_retries = max(0, upload_retries)
+        self.retry_backoff = retry_backoff
+        self._executor = None
+        self._lock = threading.Lock()
+        self._uploads = set()
+        self.uploaded = 0
+        self.retried = 0
+        self.failed = 0
+        self.failed_keys = deque(maxlen=100)
+
+    def _submit(self, fn, *args, **kwargs) -> Future:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="s3")
+            return self._executor.submit(fn, *args, **kwargs)
+
+    async def _run(self, fn, *args, **kwargs):
+        return await asyncio.wrap_future(self._submit(functools.partial(fn, *args, **kwargs)))
+
+    def _read(self, key: str) -> bytes:
+        response = self.client.get_object(Bucket=self.bucket, Key=key)
+        with response["Body"] as body:
+            return body.read()
+
+    async def get(self, key: str) -> bytes:
+        return await self._run(self._read, key)
+
+    def _download(self, key: str, path: str, chunk_size: int):
+        body = self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+        try:
+            with open(path, "wb") as f:
+                for chunk in body.iter_chunks(chunk_size):
+                    f.write(chunk)
+        finally:
+            body.close()
+
+    async def download(self, key: str, path: str, chunk_size: int = 1024 * 1024):
+        """Copy an object to `path` in chunks, for files too large to hold in memory."""
+        await self._run(self._download, key, path, chunk_size)
+
+    async def etag(self, key: str) -> str:
+        response = await self._run(self.client.head_object, Bucket=self.bucket, Key=key)
+        return response["ETag"]
+
+    async def copy(self, source_key: str, key: str):
+        """Server-side copy inside the bucket; the bytes never pass through this process."""
+        await self._run(
+            self.client.copy_object, Bucket=self.bucket, Key=key, CopySource={"Bucket": self.bucket, "Key": source_key}
+        )
+
+    def _put(self, key: str, body: bytes, content_type: str):
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType=content_type)
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    async def put(self, key: str, body: bytes, content_type: str):
+        await self._run(self._put, key, body, content_type)
+        self._count("uploaded")
+
+    def _put_with_retry(self, key: str, body: bytes, content_type: str):
+        for attempt in range(self.upload_retries + 1):
+            try:
+                self._put(key, body, content_type)
+                self._count("uploaded")
+                return
+            except (BotoCoreError, ClientError):
+                if attempt == self.upload_retries:
+                    self._count("failed")
+                    self.failed_keys.append(key)
+                    logger.exception("upload of s3://%s/%s failed after %d attempts", self.bucket, key, attempt + 1)
+                    return
+                self._count("retried")
+                time.sleep(self.retry_backoff * 2 ** attempt)
+
+    def upload_in_background(self, key: str, body: bytes, content_type: str) -> Future:
+        future = self._submit(self._put_with_retry, key, body, content_type)
+        with self._lock:
+            self._uploads.add(future)
+        future.add_done_callback(self._upload_done)
+        return future
+
+    def _upload_done(self, future: Future):
+        with self._lock:
+            self._uploads.discard(future)
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._uploads)
+        return {
+            "pending_uploads": pending,
+            "uploaded": self.uploaded,
+            "retried": self.retried,
+            "failed": self.failed,
+            "failed_keys": list(self.failed_keys),
+        }
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the background uploads queued so far. Returns False on timeout."""
+        with self._lock:
+            uploads = list(self._uploads)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for future in uploads:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                future.result(timeout=remaining)
+            except TimeoutError:
+                return False
+        return True
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
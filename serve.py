@@ -0,0 +1,114 @@
+# serve.py
+#
+# Production launcher: gunicorn with uvicorn workers, sized to the CPUs this process may use.
+# The master process creates the schema and loads the default model once, then forks the
+# workers, so the weights are shared copy-on-write instead of being loaded per worker (torch
+# backend, which the Docker image uses). Each worker gets its own slice of the cores for the
+# model's intra-op threads.
+#
+#     python serve.py
+#     WEB_WORKERS=4 PORT=8080 python serve.py
+#
+# `python app.py` is still the single-process development server with auto-reload.
+
+import gc
+import os
+import tempfile
+
+import numpy as np
+from gunicorn.app.base import BaseApplication
+
+
+def available_cpus() -> int:
+    # respects taskset / cgroup cpusets, unlike os.cpu_count()
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+def plan_workers(cpus: int, workers: int = 0) -> dict:
+    """
+    How many worker processes to run and how many threads each model call may use.
+    A worker runs one call at a time on its model (see app.call_lock), so each call gets
+    all of the worker's share of the cores and the workers together use all `cpus`.
+    """
+    workers = workers if workers > 0 else max(1, cpus // 2)
+    return {"workers": workers, "threads": max(1, cpus // workers)}
+
+
+def build_predictor(net):
+    net(np.zeros((64, 64, 3), dtype=np.uint8), device="cpu", verbose=False)
+
+
+def preload():
+    """Runs once in the master before the workers are forked."""
+    import torch
+
+    # with one thread torch never starts an OpenMP pool here, which would not survive the fork
+    torch.set_num_threads(1)
+    import app
+
+    app.timed("init_db", app.init_db)
+    if app.MODEL_BACKEND == "torch":
+        # the first call builds the predictor, which copies and fuses the weights; done in a
+        # worker, every worker would hold its own copy. ONNX Runtime / OpenVINO sessions own
+        # thread pools that do not survive a fork, so those are created in each worker instead
+        app.timed("preload_model", build_predictor, app.get_model())
+    # the lifespan of each worker skips what was done here
+    app.startup["preloaded"] = True
+    # objects that exist now are never touched by the collector, so the pages stay shared
+    gc.freeze()
+    return app.app
+
+
+class Server(BaseApplication):
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return preload()
+
+
+def main():
+    plan = plan_workers(available_cpus(), workers=int(os.getenv("WEB_WORKERS", "0")))
+    threads = int(os.getenv("MODEL_THREADS", "0")) or plan["threads"]
+    # /metrics adds up the counters of every worker from files here; set before prometheus_client is imported
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="prometheus-"))
+    # /admin/models/{name} reaches one worker; it records the swap here for the others to follow
+    os.environ.setdefault("MODEL_SWAP_FILE", os.path.join(tempfile.mkdtemp(prefix="model-swaps-"), "swaps.json"))
+
+    def post_fork(server, worker):
+        import torch
+        import app
+        import db
+
+        torch.set_num_threads(threads)
+        # ONNX Runtime / OpenVINO take their thread count when the worker loads the model
+        app.MODEL_THREADS = threads
+        # connections opened by the master must not be shared with the workers
+        db.engine.dispose(close=False)
+
+    def child_exit(server, worker):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
+
+    print(f"starting {plan['workers']} workers with {threads} threads per model call")
+    Server({
+        "bind": f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8080')}",
+        "workers": plan["workers"],
+        "worker_class": "uvicorn_worker.UvicornWorker",
+        "preload_app": True,
+        "post_fork": post_fork,
+        "child_exit": child_exit,
+        "timeout": int(os.getenv("WEB_TIMEOUT", "120")),
+    }).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+# Stand-ins for ultralytics models and their results, shared by the endpoint tests.
+
+from unittest.mock import MagicMock
+import numpy as np
+
+
+def fake_box(cls=0, conf=0.9, xyxy=(0, 0, 5, 5)):
+    """A detection box read the way app.py reads it: cls[0].item(), conf[0], xyxy[0].tolist()."""
+    box = MagicMock()
+    box.cls = [MagicMock()]
+    box.cls[0].item.return_value = cls
+    box.conf = [conf]
+    box.xyxy = [MagicMock()]
+    box.xyxy[0].tolist.return_value = list(xyxy)
+    return box
+
+
+def fake_result(*boxes):
+    """A result holding `boxes` (one default box if none are given) whose plot() is a blank image."""
+    result = MagicMock()
+    result.boxes = list(boxes) or [fake_box()]
+    result.plot.return_value = np.zeros((10, 10, 3), dtype=np.uint8)
+    return result
+
+
+def fake_model(*boxes, names=None):
+    """A model that answers every call with one fake_result(*boxes) per source."""
+    model = MagicMock(side_effect=lambda sources, **kwargs: [fake_result(*boxes) for _ in sources])
+    model.names = {0: "person"} if names is None else names
+    return model
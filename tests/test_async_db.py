@@ -0,0 +1,125 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+from tests.test_pagination import PaginationTestCase, client
+from app import auth_cache, get_current_user_async
+from auth import DUMMY_HASH, verify_password
+import db as database
+import queries
+import queries_async
+
+
+class AsyncDbTestCase(PaginationTestCase):
+    """Serves the read endpoints from an aiosqlite session over the same seeded database."""
+
+    def setUp(self):
+        super().setUp()
+        self.async_engine = database.build_async_engine(f"sqlite+aiosqlite:///{self.db_path}")
+        self.AsyncSessionLocal = database.build_async_sessionmaker(self.async_engine)
+
+        async def override_get_db():
+            async with self.AsyncSessionLocal() as db:
+                yield db
+
+        # the read endpoints pick the queries_async twin whenever they are handed an AsyncSession
+        client.app.dependency_overrides[database.get_db] = override_get_db
+
+    def tearDown(self):
+        asyncio.run(self.async_engine.dispose())
+        super().tearDown()
+
+
+class TestAsyncQueries(AsyncDbTestCase):
+    def run_query(self, fn, *args, **kwargs):
+        async def go():
+            async with self.AsyncSessionLocal() as db:
+                return await fn(db, *args, **kwargs)
+        return asyncio.run(go())
+
+    def test_get_prediction_by_uid(self):
+        prediction = self.run_query(queries_async.get_prediction_by_uid, "uid-2")
+        self.assertEqual((prediction.uid, prediction.user_id), ("uid-2", 1))
+        self.assertIsNone(self.run_query(queries_async.get_prediction_by_uid, "missing"))
+
+    def test_labels_and_count(self):
+        self.assertEqual(self.run_query(queries_async.get_all_labels, 1), [{"label": "dog", "count": 5}])
+        self.assertEqual(self.run_query(queries_async.get_all_labels, 2), [])
+        # the seeded predictions are dated 2024
+        self.assertEqual(self.run_query(queries_async.count_recent_predictions, days=100000), 5)
+
+    def test_keyset_pages(self):
+        rows = self.run_query(queries_async.get_predictions_by_label, "dog", after="uid-1", limit=2)
+        self.assertEqual([r["uid"] for r in rows], ["uid-2", "uid-3"])
+        detections = self.run_query(queries_async.get_predictions_by_score, 1, 0.5, limit=10)
+        self.assertEqual([d.prediction_uid for d in detections], ["uid-3", "uid-4"])
+
+
+class TestAsyncReadEndpoints(AsyncDbTestCase):
+    def test_prediction_by_uid(self):
+        response = client.get("/prediction/uid-3")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["uid"], "uid-3")
+        self.assertEqual(client.get("/prediction/missing").status_code, 404)
+
+    def test_labels(self):
+        response = client.get("/prediction/labels")
+        self.assertEqual(response.json(), [{"label": "dog", "count": 5}])
+
+    def test_label_pages_match_sync_path(self):
+        pages = self.collect_pages("/predictions/label/dog", 2)
+        self.assertEqual([[r["uid"] for r in page] for page in pages], [["uid-0", "uid-1"], ["uid-2", "uid-3"], ["uid-4"]])
+
+    def test_score(self):
+        response = client.get("/predictions/score/0.5")
+        self.assertEqual([r["prediction_uid"] for r in response.json()], ["uid-3", "uid-4"])
+
+    @patch("app.queries.count_recent_predictions")
+    def test_count_does_not_touch_sync_queries(self, mock_count):
+        response = client.get("/prediction/count")
+        self.assertEqual(response.json(), {"count": 0})
+        mock_count.assert_not_called()
+
+
+class TestAsyncAuth(AsyncDbTestCase):
+    """The read endpoints check Basic credentials through the AsyncSession as well."""
+
+    def setUp(self):
+        super().setUp()
+        db = self.SessionLocal()
+        queries.add_test_user(db, "user", "pass")
+        db.close()
+        client.app.dependency_overrides.pop(get_current_user_async)
+        auth_cache.clear()
+
+    def tearDown(self):
+        auth_cache.clear()
+        super().tearDown()
+
+    @patch("app.queries.get_user_by_credentials")
+    def test_password_is_hashed_once_per_ttl(self, mock_sync_lookup):
+        with patch("app.verify_password", wraps=verify_password) as mock_verify:
+            first = client.get("/prediction/labels", auth=("user", "pass"))
+            second = client.get("/prediction/labels", auth=("user", "pass"))
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(second.json(), [{"label": "dog", "count": 5}])
+        # the cache hit never left the event loop, and the sync query path was not used
+        self.assertEqual(mock_verify.call_count, 1)
+        mock_sync_lookup.assert_not_called()
+
+    def test_wrong_and_unknown_credentials(self):
+        with patch("app.verify_password", return_value=False) as mock_verify:
+            self.assertEqual(client.get("/prediction/labels", auth=("user", "bad")).status_code, 401)
+            self.assertEqual(client.get("/prediction/labels", auth=("nobody", "pass")).status_code, 401)
+        # an unknown username costs the same hash as a wrong password
+        self.assertEqual(mock_verify.call_args.args, ("pass", DUMMY_HASH))
+        self.assertEqual(client.get("/prediction/labels").status_code, 401)
+
+    def test_wrong_passwords_do_not_lock_out_the_account(self):
+        with patch("app.verify_password", side_effect=lambda password, stored: password == "pass"):
+            for i in range(20):
+                self.assertEqual(client.get("/prediction/count", auth=("user", f"bad-{i}")).status_code, 401)
+            self.assertEqual(client.get("/prediction/count", auth=("user", "pass")).status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
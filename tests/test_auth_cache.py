@@ -0,0 +1,153 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app import verify_credentials, auth_cache
+from auth import DUMMY_HASH, AuthCache, hash_password, verify_password, is_password_hash
+from models import Base, User
+import migrations
+import queries
+
+
+class FakeCred:
+    def __init__(self, username, password):
+        self.username = username
+        self.password = password
+
+
+class TestPasswordHashing(unittest.TestCase):
+    def test_hash_is_salted_and_verifies(self):
+        first = hash_password("secret", iterations=1000)
+        second = hash_password("secret", iterations=1000)
+        self.assertNotEqual(first, second)
+        self.assertTrue(is_password_hash(first))
+        self.assertTrue(verify_password("secret", first))
+        self.assertFalse(verify_password("wrong", first))
+
+    def test_plaintext_or_malformed_values_never_verify(self):
+        self.assertFalse(verify_password("pass", "pass"))
+        self.assertFalse(verify_password("pass", None))
+        self.assertFalse(verify_password("pass", "pbkdf2_sha256$broken"))
+
+
+class TestAuthCache(unittest.TestCase):
+    def test_hit_after_put(self):
+        cache = AuthCache(ttl=60)
+        self.assertIsNone(cache.get("user", "pass"))
+        cache.put("user", "pass", 7)
+        self.assertEqual(cache.get("user", "pass"), 7)
+        self.assertIsNone(cache.get("user", "other"))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_entries_expire(self):
+        cache = AuthCache(ttl=10)
+        with patch("auth.time.monotonic", return_value=100):
+            cache.put("user", "pass", 7)
+        with patch("auth.time.monotonic", return_value=111):
+            self.assertIsNone(cache.get("user", "pass"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = AuthCache(ttl=60, max_size=2)
+        cache.put("a", "pass", 1)
+        cache.put("b", "pass", 2)
+        cache.get("a", "pass")
+        cache.put("c", "pass", 3)
+        self.assertEqual(cache.get("a", "pass"), 1)
+        self.assertIsNone(cache.get("b", "pass"))
+        self.assertEqual(cache.get("c", "pass"), 3)
+
+    def test_zero_ttl_disables_cache(self):
+        cache = AuthCache(ttl=0)
+        cache.put("user", "pass", 7)
+        self.assertIsNone(cache.get("user", "pass"))
+
+    def test_plaintext_password_is_not_stored(self):
+        cache = AuthCache(ttl=60)
+        cache.put("user", "hunter2", 7)
+        self.assertNotIn(b"hunter2", b"".join(cache._entries.keys()))
+
+    def test_failures_expire(self):
+        cache = AuthCache(failure_ttl=30)
+        with patch("auth.time.monotonic", return_value=100):
+            cache.put_failure("user", "bad")
+            self.assertTrue(cache.rejected("user", "bad"))
+            self.assertFalse(cache.rejected("user", "other"))
+        with patch("auth.time.monotonic", return_value=131):
+            self.assertFalse(cache.rejected("user", "bad"))
+
+    def test_failures_never_lock_out_other_passwords(self):
+        cache = AuthCache(failure_ttl=30)
+        for i in range(100):
+            cache.put_failure("user", f"guess-{i}")
+        self.assertTrue(cache.rejected("user", "guess-0"))
+        self.assertFalse(cache.rejected("user", "right"))
+        self.assertEqual(cache.rejections, 1)
+
+    def test_zero_failure_ttl_disables_failure_tracking(self):
+        cache = AuthCache(failure_ttl=0)
+        cache.put_failure("user", "bad")
+        self.assertFalse(cache.rejected("user", "bad"))
+
+
+class TestVerifyCredentialsCache(unittest.TestCase):
+    def setUp(self):
+        auth_cache.clear()
+
+    def tearDown(self):
+        auth_cache.clear()
+
+    @patch("app.queries.get_user_by_credentials")
+    def test_database_is_queried_once_per_ttl(self, mock_get_user):
+        mock_get_user.return_value = MagicMock(id=5)
+        for _ in range(3):
+            self.assertEqual(verify_credentials(FakeCred("user", "pass"), db=MagicMock()), 5)
+        mock_get_user.assert_called_once()
+
+    @patch("app.queries.get_user_by_credentials", return_value=None)
+    def test_failed_logins_are_remembered(self, mock_get_user):
+        self.assertIsNone(verify_credentials(FakeCred("user", "bad"), db=MagicMock()))
+        self.assertIsNone(verify_credentials(FakeCred("user", "bad"), db=MagicMock()))
+        self.assertEqual(mock_get_user.call_count, 1)
+        # a different password is still checked
+        verify_credentials(FakeCred("user", "other"), db=MagicMock())
+        self.assertEqual(mock_get_user.call_count, 2)
+
+    def test_wrong_passwords_do_not_lock_out_the_account(self):
+        user = MagicMock(id=5)
+        with patch("app.queries.get_user_by_credentials", side_effect=lambda db, name, password: user if password == "pass" else None):
+            for i in range(20):
+                self.assertIsNone(verify_credentials(FakeCred("user", f"bad-{i}"), db=MagicMock()))
+            self.assertEqual(verify_credentials(FakeCred("user", "pass"), db=MagicMock()), 5)
+
+
+class TestStoredPasswords(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+
+    def tearDown(self):
+        self.db.close()
+        self.engine.dispose()
+
+    def test_test_user_is_stored_hashed(self):
+        queries.add_test_user(self.db, "alice", "wonderland")
+        user = self.db.query(User).filter_by(username="alice").one()
+        self.assertTrue(is_password_hash(user.pass_field))
+        self.assertEqual(queries.get_user_by_credentials(self.db, "alice", "wonderland").id, user.id)
+        self.assertIsNone(queries.get_user_by_credentials(self.db, "alice", "wrong"))
+
+    def test_unknown_username_costs_a_password_hash(self):
+        with patch("queries.verify_password", return_value=False) as mock_verify:
+            self.assertIsNone(queries.get_user_by_credentials(self.db, "nobody", "pass"))
+        mock_verify.assert_called_once_with("pass", DUMMY_HASH)
+
+    def test_migration_hashes_plaintext_passwords(self):
+        with self.engine.begin() as conn:
+            conn.execute(text("INSERT INTO users (username, pass) VALUES ('bob', 'builder')"))
+
+        applied = migrations.upgrade(self.engine)
+
+        self.assertIn("users.pass: 1 passwords hashed", applied)
+        self.assertIsNotNone(queries.get_user_by_credentials(self.db, "bob", "builder"))
+        self.assertEqual(migrations.hash_plaintext_passwords(self.engine), 0)
@@ -0,0 +1,207 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+import numpy as np
+import backends
+
+
+class TestExport(unittest.TestCase):
+    def test_exported_paths(self):
+        self.assertEqual(backends.exported_path("models/yolov8n.pt", "onnx"), "models/yolov8n.onnx")
+        self.assertEqual(backends.exported_path("yolov8n.pt", "openvino"), "yolov8n_openvino_model")
+
+    def test_existing_export_is_reused(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            weights = os.path.join(tmp, "yolov8n.pt")
+            open(os.path.join(tmp, "yolov8n.onnx"), "wb").close()
+            with patch("ultralytics.YOLO") as mock_yolo:
+                path = backends.export_model(weights, "onnx")
+            self.assertEqual(path, os.path.join(tmp, "yolov8n.onnx"))
+            mock_yolo.assert_not_called()
+
+    def test_missing_export_is_created(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            weights = os.path.join(tmp, "yolov8n.pt")
+            with patch("ultralytics.YOLO") as mock_yolo:
+                mock_yolo.return_value.export.return_value = "exported.onnx"
+                self.assertEqual(backends.export_model(weights, "onnx", imgsz=320), "exported.onnx")
+            mock_yolo.return_value.export.assert_called_once_with(format="onnx", imgsz=320, dynamic=True, simplify=True)
+
+    def test_load_model(self):
+        with patch("ultralytics.YOLO") as mock_yolo, patch("backends.export_model", return_value="yolov8n.onnx"):
+            backends.load_model("yolov8n.pt", "onnx")
+            mock_yolo.assert_called_with("yolov8n.onnx", task="detect")
+            backends.load_model("yolov8n.pt")
+            mock_yolo.assert_called_with("yolov8n.pt")
+
+    def test_unknown_backend(self):
+        with self.assertRaises(backends.UnknownBackend):
+            backends.load_model("yolov8n.pt", "tensorrt")
+
+
+class TestLimitThreads(unittest.TestCase):
+    def test_onnx_session_is_rebuilt_with_the_thread_count(self):
+        net = MagicMock()
+        fake_ort = MagicMock()
+        with patch.dict("sys.modules", {"onnxruntime": fake_ort}):
+            backends.limit_threads(net, "onnx", "yolov8n.onnx", 2)
+        # the first call creates the predictor whose session is replaced
+        net.assert_called_once()
+        options = fake_ort.SessionOptions.return_value
+        self.assertEqual((options.intra_op_num_threads, options.inter_op_num_threads), (2, 1))
+        fake_ort.InferenceSession.assert_called_once_with("yolov8n.onnx", options, providers=["CPUExecutionProvider"])
+        self.assertIs(net.predictor.model.backend.session, fake_ort.InferenceSession.return_value)
+
+    def test_openvino_model_is_recompiled_with_the_thread_count(self):
+        import functools
+
+        core = MagicMock()
+        net = MagicMock()
+        runtime = net.predictor.model.backend
+        # ultralytics keeps core.compile_model as a partial of a bound method of the Core
+        runtime.compile_model = functools.partial(FakeCore(core).compile_model, device_name="CPU", config={"PERFORMANCE_HINT": "LATENCY"})
+        backends.limit_threads(net, "openvino", "yolov8n_openvino_model/yolov8n.xml", 3)
+        core.read_model.assert_called_once_with(model="yolov8n_openvino_model/yolov8n.xml")
+        core.compile_model.assert_called_once_with(
+            core.read_model.return_value, device_name="CPU", config={"PERFORMANCE_HINT": "LATENCY", "INFERENCE_NUM_THREADS": 3}
+        )
+        self.assertIs(runtime.ov_compiled_model, core.compile_model.return_value)
+
+    def test_torch_and_unlimited_are_left_alone(self):
+        net = MagicMock()
+        backends.limit_threads(net, "torch", "yolov8n.pt", 2)
+        backends.limit_threads(net, "onnx", "yolov8n.onnx", 0)
+        net.assert_not_called()
+
+    def test_load_model_limits_exported_models(self):
+        with patch("ultralytics.YOLO") as mock_yolo, patch("backends.export_model", return_value="yolov8n.onnx"), \
+                patch("backends.limit_threads") as mock_limit:
+            backends.load_model("yolov8n.pt", "onnx", threads=2)
+        mock_limit.assert_called_once_with(mock_yolo.return_value, "onnx", "yolov8n.onnx", 2)
+
+
+class FakeCore:
+    def __init__(self, mock):
+        self.mock = mock
+
+    def compile_model(self, model, **kwargs):
+        return self.mock.compile_model(model, **kwargs)
+
+    def read_model(self, **kwargs):
+        return self.mock.read_model(**kwargs)
+
+
+class TestCompareDetections(unittest.TestCase):
+    def test_identical(self):
+        dets = [{"label": "person", "score": 0.9, "box": [0, 0, 10, 10]}]
+        report = backends.compare_detections(dets, dets)
+        self.assertEqual((report["matched"], report["missing"], report["extra"]), (1, 0, 0))
+        self.assertEqual(report["min_iou"], 1.0)
+
+    def test_small_drift_matches(self):
+        reference = [
+            {"label": "person", "score": 0.9, "box": [0, 0, 10, 10]},
+            {"label": "car", "score": 0.6, "box": [20, 20, 40, 40]},
+        ]
+        candidate = [
+            {"label": "car", "score": 0.62, "box": [21, 20, 40, 41]},
+            {"label": "person", "score": 0.88, "box": [0, 1, 10, 10]},
+        ]
+        report = backends.compare_detections(reference, candidate)
+        self.assertEqual(report["matched"], 2)
+        self.assertAlmostEqual(report["max_score_diff"], 0.02)
+
+    def test_wrong_label_or_far_box_is_not_a_match(self):
+        reference = [{"label": "person", "score": 0.9, "box": [0, 0, 10, 10]}]
+        candidate = [
+            {"label": "dog", "score": 0.9, "box": [0, 0, 10, 10]},
+            {"label": "person", "score": 0.9, "box": [8, 8, 20, 20]},
+        ]
+        report = backends.compare_detections(reference, candidate)
+        self.assertEqual((report["matched"], report["missing"], report["extra"]), (0, 1, 2))
+
+
+class TestQuantization(unittest.TestCase):
+    def test_letterbox(self):
+        image = np.full((100, 200, 3), 255, dtype=np.uint8)
+        boxed = backends.letterbox(image, 64)
+        self.assertEqual(boxed.shape, (64, 64, 3))
+        # the wide image is scaled to 64x32 and padded top and bottom
+        self.assertEqual(boxed[0, 0].tolist(), [114, 114, 114])
+        self.assertEqual(boxed[32, 32].tolist(), [255, 255, 255])
+
+    def test_calibration_batches(self):
+        batches = list(backends.calibration_batches("beatles.jpg", 64))
+        self.assertEqual(len(batches), 1)
+        self.assertEqual((batches[0].shape, batches[0].dtype), ((1, 3, 64, 64), np.float32))
+        self.assertLessEqual(batches[0].max(), 1.0)
+
+    def test_no_calibration_images(self):
+        with self.assertRaises(FileNotFoundError):
+            list(backends.calibration_batches("no-such-dir/*.jpg", 64))
+
+    def test_existing_quantized_model_is_reused(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            weights = os.path.join(tmp, "yolov8n.pt")
+            open(os.path.join(tmp, "yolov8n.int8-static.onnx"), "wb").close()
+            self.assertEqual(backends.quantize_model(weights, "static"), os.path.join(tmp, "yolov8n.int8-static.onnx"))
+
+    def test_quantization_needs_onnx(self):
+        with self.assertRaises(backends.UnknownBackend):
+            backends.load_model("yolov8n.pt", "torch", quantization="dynamic")
+        with self.assertRaises(backends.UnknownBackend):
+            backends.quantize_model("yolov8n.pt", "fp16")
+
+    def test_load_quantized_model(self):
+        with patch("ultralytics.YOLO") as mock_yolo, \
+                patch("backends.quantize_model", return_value="yolov8n.int8-static.onnx") as mock_quantize:
+            backends.load_model("yolov8n.pt", "onnx", imgsz=320, quantization="static", calibration="cal/*.jpg")
+        mock_quantize.assert_called_once_with("yolov8n.pt", "static", "cal/*.jpg", 320)
+        mock_yolo.assert_called_once_with("yolov8n.int8-static.onnx", task="detect")
+
+
+class TestMeanAveragePrecision(unittest.TestCase):
+    truth = {
+        "a.jpg": [{"label": "person", "score": 1.0, "box": [0, 0, 10, 10]}, {"label": "car", "score": 1.0, "box": [20, 20, 40, 40]}],
+        "b.jpg": [{"label": "person", "score": 1.0, "box": [5, 5, 15, 15]}],
+    }
+
+    def test_perfect(self):
+        self.assertEqual(backends.mean_average_precision(self.truth, self.truth), 1.0)
+
+    def test_missed_and_false_detections(self):
+        predictions = {
+            "a.jpg": [{"label": "person", "score": 0.9, "box": [0, 0, 10, 10]}, {"label": "car", "score": 0.8, "box": [20, 20, 40, 40]}],
+            # a confident false positive ranked above the real detection
+            "b.jpg": [{"label": "person", "score": 0.95, "box": [50, 50, 60, 60]}, {"label": "person", "score": 0.5, "box": [5, 5, 15, 15]}],
+        }
+        # person: precision 0 at rank 1, then 1/2 at recall 0.5 and 2/3 at recall 1, so AP is 2/3; car: 1
+        self.assertAlmostEqual(backends.mean_average_precision(self.truth, predictions), (2 / 3 + 1) / 2)
+
+    def test_stricter_iou_thresholds_lower_the_score(self):
+        shifted = {name: [{**d, "box": [v + 1 for v in d["box"]]} for d in dets] for name, dets in self.truth.items()}
+        loose = backends.mean_average_precision(self.truth, shifted, (0.5,))
+        strict = backends.mean_average_precision(self.truth, shifted, (0.5, 0.75, 0.95))
+        self.assertEqual(loose, 1.0)
+        self.assertLess(strict, loose)
+
+    def test_empty(self):
+        self.assertEqual(backends.mean_average_precision({"a.jpg": []}, {"a.jpg": []}), 1.0)
+
+
+class TestAppBackend(unittest.TestCase):
+    def test_app_loads_the_configured_backend(self):
+        import app
+
+        with patch("app.model", None), patch("app.MODEL_BACKEND", "onnx"), \
+                patch("app.backends.load_model", return_value=MagicMock()) as mock_load:
+            self.assertIs(app.get_model(), mock_load.return_value)
+        mock_load.assert_called_once_with(
+            app.MODEL_NAME, "onnx", imgsz=app.MODEL_IMAGE_SIZE, quantization=None, calibration=app.QUANTIZATION_CALIBRATION,
+            threads=app.MODEL_THREADS,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import asyncio
+import unittest
+from inference import BatchScheduler, InferencePool, InferenceQueueFull
+
+
+class TestBatchScheduler(unittest.TestCase):
+    def setUp(self):
+        self.pool = InferencePool(workers=1, queue_depth=4)
+        self.calls = []
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def run_batch(self, sources):
+        self.calls.append(list(sources))
+        return [f"result-{source}" for source in sources]
+
+    def test_concurrent_submits_share_one_model_call(self):
+        scheduler = BatchScheduler(self.pool, self.run_batch, max_batch=8, window_ms=50)
+
+        async def main():
+            return await asyncio.gather(*(scheduler.submit(i) for i in range(3)))
+
+        results = asyncio.run(main())
+        self.assertEqual(results, ["result-0", "result-1", "result-2"])
+        self.assertEqual(self.calls, [[0, 1, 2]])
+
+    def test_full_batch_is_flushed_before_the_window_ends(self):
+        scheduler = BatchScheduler(self.pool, self.run_batch, max_batch=2, window_ms=10_000)
+
+        async def main():
+            return await asyncio.wait_for(
+                asyncio.gather(*(scheduler.submit(i) for i in range(4))), timeout=5
+            )
+
+        results = asyncio.run(main())
+        self.assertEqual(results, ["result-0", "result-1", "result-2", "result-3"])
+        self.assertEqual(self.calls, [[0, 1], [2, 3]])
+
+    def test_sources_with_different_params_are_batched_apart(self):
+        def run_batch(sources, imgsz=640):
+            self.calls.append((list(sources), imgsz))
+            return [f"result-{source}@{imgsz}" for source in sources]
+
+        scheduler = BatchScheduler(self.pool, run_batch, max_batch=8, window_ms=50)
+
+        async def main():
+            return await asyncio.gather(
+                scheduler.submit(0), scheduler.submit(1, imgsz=320), scheduler.submit(2), scheduler.submit(3, imgsz=320)
+            )
+
+        self.assertEqual(asyncio.run(main()), ["result-0@640", "result-1@320", "result-2@640", "result-3@320"])
+        self.assertEqual(sorted(self.calls), [([0, 2], 640), ([1, 3], 320)])
+
+    def test_batching_disabled_runs_each_source_alone(self):
+        scheduler = BatchScheduler(self.pool, self.run_batch, max_batch=1, window_ms=10)
+
+        async def main():
+            return await asyncio.gather(scheduler.submit("a"), scheduler.submit("b"))
+
+        self.assertEqual(asyncio.run(main()), ["result-a", "result-b"])
+        self.assertEqual(self.calls, [["a"], ["b"]])
+
+    def test_model_error_is_raised_for_every_caller(self):
+        def failing_batch(sources):
+            raise ValueError("bad image")
+
+        scheduler = BatchScheduler(self.pool, failing_batch, max_batch=4, window_ms=10)
+
+        async def main():
+            return await asyncio.gather(
+                scheduler.submit(1), scheduler.submit(2), return_exceptions=True
+            )
+
+        errors = asyncio.run(main())
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+
+    def test_queue_full_propagates_to_callers(self):
+        pool = InferencePool(workers=1, queue_depth=0)
+
+        async def main():
+            pool._pending = 1  # pretend the only worker is busy
+            scheduler = BatchScheduler(pool, self.run_batch, max_batch=4, window_ms=1)
+            with self.assertRaises(InferenceQueueFull):
+                await scheduler.submit("x")
+
+        asyncio.run(main())
+
+    def test_result_count_mismatch_is_an_error(self):
+        scheduler = BatchScheduler(self.pool, lambda sources: ["only-one"], max_batch=4, window_ms=10)
+
+        async def main():
+            return await asyncio.gather(
+                scheduler.submit(1), scheduler.submit(2), return_exceptions=True
+            )
+
+        errors = asyncio.run(main())
+        self.assertTrue(all(isinstance(e, RuntimeError) for e in errors))
@@ -15,7 +15,7 @@ class TestGetPredictionsByLabel(unittest.TestCase):
             return MagicMock()
 
         app.dependency_overrides[get_db] = override_get_db
-        app.dependency_overrides[get_predictions_by_label.__globals__["get_current_user"]] = override_get_current_user
+        app.dependency_overrides[get_predictions_by_label.__globals__["get_current_user_async"]] = override_get_current_user
 
     def tearDown(self):
         app.dependency_overrides = {}
@@ -14,6 +14,8 @@ class FakePrediction:
         self.original_image = original_image
         self.predicted_image = predicted_image
         self.user_id = user_id
+        self.model_name = None
+        self.model_version = None
 
 
 class TestGetPredictionByUID(unittest.TestCase):
@@ -25,7 +27,7 @@ class TestGetPredictionByUID(unittest.TestCase):
             return 1  # logged in user_id
 
         app.dependency_overrides[get_db] = override_get_db
-        app.dependency_overrides[get_prediction.__globals__["get_current_user"]] = override_get_current_user
+        app.dependency_overrides[get_prediction.__globals__["get_current_user_async"]] = override_get_current_user
 
     def tearDown(self):
         app.dependency_overrides = {}
@@ -72,7 +74,7 @@ class TestGetPredictionByUID(unittest.TestCase):
 
     def test_get_prediction_not_authenticated(self):
         # Temporarily remove override for this test
-        app.dependency_overrides.pop(get_prediction.__globals__["get_current_user"], None)
+        app.dependency_overrides.pop(get_prediction.__globals__["get_current_user_async"], None)
         
         response = client.get("/prediction/get-owned-uid")
         
@@ -80,5 +82,5 @@ class TestGetPredictionByUID(unittest.TestCase):
         self.assertEqual(response.json()["detail"], "Not authenticated")
 
         # Restore it so it doesn’t affect other tests
-        app.dependency_overrides[get_prediction.__globals__["get_current_user"]] = lambda: 1
+        app.dependency_overrides[get_prediction.__globals__["get_current_user_async"]] = lambda: 1
 
@@ -1,7 +1,7 @@
 import unittest
 from unittest.mock import patch, MagicMock
 from fastapi.testclient import TestClient
-from app import app, verify_credentials, get_current_user, security
+from app import app, verify_credentials, get_current_user, security, auth_cache
 from db import get_db
 
 
@@ -18,6 +18,8 @@ class TestHelperFunctions(unittest.TestCase):
     def setUp(self):
         # Override DB dependency
         app.dependency_overrides[get_db] = lambda: MagicMock()
+        # each test mocks its own user lookup, so earlier logins must not be served from cache
+        auth_cache.clear()
 
     def tearDown(self):
         app.dependency_overrides = {}
@@ -0,0 +1,126 @@
+import asyncio
+import io
+import threading
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from PIL import Image
+from app import app, predict, predict_batch
+from db import get_db
+from inference import InferencePool, InferenceQueueFull
+from model_registry import LoadedModel
+
+client = TestClient(app)
+
+
+class TestInferencePool(unittest.TestCase):
+    def test_run_executes_off_the_event_loop_thread(self):
+        pool = InferencePool(workers=1, queue_depth=1)
+
+        async def main():
+            return await pool.run(lambda: threading.current_thread().name)
+
+        thread_name = asyncio.run(main())
+        pool.shutdown()
+        self.assertTrue(thread_name.startswith("inference"))
+        self.assertNotEqual(thread_name, threading.current_thread().name)
+
+    def test_run_rejects_when_queue_is_full(self):
+        pool = InferencePool(workers=1, queue_depth=1)
+        release = threading.Event()
+
+        async def main():
+            blocked = [asyncio.ensure_future(pool.run(release.wait)) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            self.assertEqual(pool.pending, 2)
+            with self.assertRaises(InferenceQueueFull):
+                await pool.run(lambda: None)
+            release.set()
+            await asyncio.gather(*blocked)
+
+        asyncio.run(main())
+        pool.shutdown()
+        self.assertEqual(pool.pending, 0)
+
+    def test_event_loop_stays_responsive_while_inference_runs(self):
+        pool = InferencePool(workers=1, queue_depth=1)
+        release = threading.Event()
+
+        async def main():
+            slow = asyncio.ensure_future(pool.run(release.wait))
+            # the loop can still schedule other work while the model call blocks its worker
+            await asyncio.sleep(0.01)
+            self.assertFalse(slow.done())
+            release.set()
+            await slow
+
+        asyncio.run(main())
+        pool.shutdown()
+
+    def test_pool_restarts_after_shutdown(self):
+        pool = InferencePool(workers=1, queue_depth=0)
+        pool.shutdown()
+        self.assertEqual(asyncio.run(pool.run(lambda: 42)), 42)
+        pool.shutdown()
+
+
+class TestModelCalls(unittest.TestCase):
+    def test_one_call_per_model_at_a_time(self):
+        running = {"a": 0, "b": 0}
+        most = {"a": 0, "b": 0}
+        both = threading.Barrier(2, timeout=5)
+        guard = threading.Lock()
+
+        def model_for(name):
+            def call(sources, **kwargs):
+                with guard:
+                    running[name] += 1
+                    most[name] = max(most[name], running[name])
+                time.sleep(0.05)
+                with guard:
+                    running[name] -= 1
+                return [None for _ in sources]
+            return MagicMock(side_effect=call)
+
+        a, b = model_for("a"), model_for("b")
+
+        def call_twice(net):
+            both.wait()
+            threads = [threading.Thread(target=predict_batch, args=([1],), kwargs={"handle": LoadedModel("m", None, net)})
+                       for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        workers = [threading.Thread(target=call_twice, args=(net,)) for net in (a, b)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(most, {"a": 1, "b": 1})
+        self.assertEqual((a.call_count, b.call_count), (2, 2))
+
+
+class TestPredictQueueFull(unittest.TestCase):
+    def setUp(self):
+        image_bytes = io.BytesIO()
+        Image.new("RGB", (10, 10), color="red").save(image_bytes, format="JPEG")
+        image_bytes.seek(0)
+        self.image_bytes = image_bytes
+
+        app.dependency_overrides[get_db] = lambda: MagicMock()
+        app.dependency_overrides[predict.__globals__["optional_auth"]] = lambda: None
+
+    def tearDown(self):
+        app.dependency_overrides = {}
+
+    @patch("app.inference_pool.run", side_effect=InferenceQueueFull("full"))
+    def test_predict_returns_503_when_queue_is_full(self, mock_run):
+        response = client.post(
+            "/predict",
+            files={"file": ("test.jpg", self.image_bytes, "image/jpeg")}
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["retry-after"], "1")
@@ -11,7 +11,7 @@ class TestGetLabels(unittest.TestCase):
     def setUp(self):
         # Mock DB and Auth
         app.dependency_overrides[get_db] = lambda: MagicMock()
-        app.dependency_overrides[get_all_labels.__globals__["get_current_user"]] = lambda: 1
+        app.dependency_overrides[get_all_labels.__globals__["get_current_user_async"]] = lambda: 1
 
     def tearDown(self):
         app.dependency_overrides = {}
@@ -37,11 +37,11 @@ class TestGetLabels(unittest.TestCase):
 
     def test_get_labels_unauthenticated(self):
         # Remove override temporarily
-        app.dependency_overrides.pop(get_all_labels.__globals__["get_current_user"], None)
+        app.dependency_overrides.pop(get_all_labels.__globals__["get_current_user_async"], None)
 
         response = client.get("/prediction/labels")
         self.assertEqual(response.status_code, 401)
         self.assertEqual(response.json()["detail"], "Not authenticated")
 
         # Restore override
-        app.dependency_overrides[get_all_labels.__globals__["get_current_user"]] = lambda: 1
+        app.dependency_overrides[get_all_labels.__globals__["get_current_user_async"]] = lambda: 1
@@ -0,0 +1,112 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import app, get_current_user, predict
+from db import get_db
+from models import Base
+import queries
+from tests.fakes import fake_box, fake_result
+
+client = TestClient(app)
+
+
+class TestLazyAnnotation(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.engine = create_engine(f"sqlite:///{self.db_path}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=self.engine)
+        self.SessionLocal = sessionmaker(bind=self.engine, autoflush=False, autocommit=False)
+
+        def override_get_db():
+            db = self.SessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_current_user] = lambda: 1
+        app.dependency_overrides[predict.__globals__["optional_auth"]] = lambda: MagicMock(username="user", password="pass")
+        self.patches = [
+            patch("app.LAZY_ANNOTATION", True),
+            patch("app.verify_credentials", return_value=1),
+            # /predict opens its session itself rather than through Depends
+            patch("app.get_db", override_get_db),
+        ]
+        for p in self.patches:
+            p.start()
+
+        mock_result = fake_result(fake_box(0, 0.9, [10, 10, 60, 60]))
+        self.mock_model = MagicMock(return_value=[mock_result])
+        self.mock_model.names = {0: "person"}
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (100, 100), color="white").save(buffer, format="PNG")
+        self.image_bytes = buffer.getvalue()
+        self.created = []
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        app.dependency_overrides = {}
+        for path in self.created:
+            if path and os.path.exists(path):
+                os.remove(path)
+        self.engine.dispose()
+        os.remove(self.db_path)
+
+    def post_image(self):
+        with patch("app.model", self.mock_model):
+            response = client.post("/predict", files={"file": ("test.png", io.BytesIO(self.image_bytes), "image/png")})
+        self.assertEqual(response.status_code, 200)
+        uid = response.json()["prediction_uid"]
+        db = self.SessionLocal()
+        prediction = queries.get_prediction_by_uid(db, uid)
+        db.close()
+        self.created += [prediction.original_image, prediction.predicted_image]
+        return prediction
+
+    def test_predict_does_not_render(self):
+        prediction = self.post_image()
+        self.mock_model.return_value[0].plot.assert_not_called()
+        self.assertTrue(os.path.exists(prediction.original_image))
+        self.assertFalse(os.path.exists(prediction.predicted_image))
+
+    def test_prediction_image_is_rendered_on_first_request(self):
+        prediction = self.post_image()
+        response = client.get(f"/prediction/{prediction.uid}/image", auth=("user", "pass"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(os.path.exists(prediction.predicted_image))
+
+        rendered = np.array(Image.open(io.BytesIO(response.content)))
+        # the box edge is drawn, the corner outside it is untouched
+        self.assertFalse((rendered[35, 10] == 255).all())
+        self.assertTrue((rendered[95, 95] == 255).all())
+
+        # later requests serve the cached file
+        with patch("app.render_annotated") as mock_render:
+            client.get(f"/prediction/{prediction.uid}/image", auth=("user", "pass"))
+        mock_render.assert_not_called()
+
+    def test_image_endpoint_renders_by_filename(self):
+        prediction = self.post_image()
+        filename = os.path.basename(prediction.predicted_image)
+        response = client.get(f"/image/predicted/{filename}")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(os.path.exists(prediction.predicted_image))
+
+    def test_unknown_filename_is_not_found(self):
+        response = client.get("/image/predicted/no-such-prediction.png")
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+import app as app_module
+from app import app
+
+
+def wait_until_ready(client, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = client.get("/ready")
+        if response.status_code == 200:
+            return response
+        time.sleep(0.01)
+    return response
+
+
+class TestLifespan(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.mock_model = MagicMock(side_effect=lambda sources, **kwargs: self.release.wait(5) and [MagicMock() for _ in sources])
+        self.patches = [
+            patch("app.model", self.mock_model),
+            patch("app.init_db"),
+            patch("app.INFERENCE_BATCH_SIZE", 4),
+            patch.dict("app.startup", {"ready": False, "error": None, "timings": {}}),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        self.release.set()
+        for p in self.patches:
+            p.stop()
+
+    def test_ready_only_after_warm_up(self):
+        with TestClient(app) as client:
+            # the server is live while the model warms up
+            self.assertEqual(client.get("/health").status_code, 200)
+            self.assertEqual(client.get("/ready").status_code, 503)
+
+            self.release.set()
+            response = wait_until_ready(client)
+            self.assertEqual(response.status_code, 200)
+            timings = response.json()["timings"]
+            self.assertTrue({"init_db", "load_model", "warmup", "warmup_batch", "total"} <= set(timings))
+
+        app_module.init_db.assert_called_once()
+        # one single image, then one full batch
+        self.assertEqual([len(call[0][0]) for call in self.mock_model.call_args_list], [1, 4])
+        # shutting down takes the instance out of rotation
+        self.assertFalse(app_module.startup["ready"])
+
+    def test_failed_warm_up_is_reported(self):
+        self.mock_model.side_effect = RuntimeError("no weights")
+        with TestClient(app) as client:
+            deadline = time.monotonic() + 5
+            while app_module.startup["error"] is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            response = client.get("/ready")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["error"], "no weights")
+
+    @patch("app.WARMUP", False)
+    def test_warm_up_can_be_disabled(self):
+        with TestClient(app) as client:
+            self.assertEqual(wait_until_ready(client).status_code, 200)
+        self.mock_model.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import io
+import os
+import tempfile
+import types
+import unittest
+from unittest.mock import patch, MagicMock
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+from prometheus_client import REGISTRY
+from app import app, predict, labels
+from db import get_db
+from result_cache import ResultCache
+import metrics
+
+client = TestClient(app)
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestPredictMetrics(unittest.TestCase):
+    def setUp(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (100, 100), color="red").save(buffer, format="JPEG")
+        self.image_bytes = buffer.getvalue()
+
+        box = MagicMock()
+        box.cls = [MagicMock()]
+        box.cls[0].item.return_value = 16
+        box.conf = [0.9]
+        box.xyxy = [MagicMock()]
+        box.xyxy[0].tolist.return_value = [0, 0, 5, 5]
+        mock_result = MagicMock()
+        mock_result.plot.return_value = np.zeros((100, 100, 3), dtype=np.uint8)
+        mock_result.boxes = [box]
+        self.mock_model = MagicMock(return_value=[mock_result])
+        self.mock_model.names = dict(enumerate(labels))
+        self.patches = [
+            patch("app.model", self.mock_model),
+            patch("app.queries.save_prediction_with_detections"),
+        ]
+        for p in self.patches:
+            p.start()
+        app.dependency_overrides[get_db] = lambda: MagicMock()
+        app.dependency_overrides[predict.__globals__["optional_auth"]] = lambda: None
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        app.dependency_overrides = {}
+
+    def post(self):
+        return client.post("/predict", files={"file": ("test.jpg", io.BytesIO(self.image_bytes), "image/jpeg")})
+
+    def test_every_stage_is_timed(self):
+        stages = ("read", "decode", "inference", "annotate", "db_write")
+        before = {stage: sample("predict_stage_seconds_count", stage=stage) for stage in stages}
+        batches = sample("inference_batch_seconds_count")
+        self.assertEqual(self.post().status_code, 200)
+        for stage in stages:
+            self.assertEqual(sample("predict_stage_seconds_count", stage=stage), before[stage] + 1, stage)
+        self.assertEqual(sample("inference_batch_seconds_count"), batches + 1)
+
+    def test_detections_and_status_codes_are_counted(self):
+        dogs = sample("detections_total", label="dog")
+        ok = sample("http_request_seconds_count", method="POST", route="/predict", status="200")
+        bad = sample("http_request_seconds_count", method="POST", route="/predict", status="400")
+        self.post()
+        client.post("/predict")
+        self.assertEqual(sample("detections_total", label="dog"), dogs + 1)
+        self.assertEqual(sample("http_request_seconds_count", method="POST", route="/predict", status="200"), ok + 1)
+        self.assertEqual(sample("http_request_seconds_count", method="POST", route="/predict", status="400"), bad + 1)
+
+    def test_metrics_endpoint(self):
+        cache = ResultCache(ttl=60)
+        with patch("app.result_cache", cache):
+            self.post()
+            self.post()
+            response = client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("text/plain", response.headers["content-type"])
+        self.assertIn("result_cache_hits_total 1.0", response.text)
+        self.assertIn("result_cache_misses_total 1.0", response.text)
+        self.assertIn("inference_pending 0.0", response.text)
+        self.assertIn('predict_stage_seconds_count{stage="inference"}', response.text)
+        # disabled components export nothing
+        self.assertNotIn("write_behind_pending", response.text)
+
+
+class TestQueryTiming(unittest.TestCase):
+    def setUp(self):
+        self.module = types.ModuleType("fake_queries")
+
+        def get_thing(db, uid):
+            return uid
+
+        def stream_things(db):
+            yield from (1, 2)
+
+        async def count_things(db):
+            return 3
+
+        def helper(uid):
+            return uid
+
+        for fn in (get_thing, stream_things, count_things, helper):
+            fn.__module__ = "fake_queries"
+            setattr(self.module, fn.__name__, fn)
+        metrics.instrument_queries(self.module)
+
+    def test_functions_taking_a_session_are_timed(self):
+        import asyncio
+
+        self.assertEqual(self.module.get_thing(None, "a"), "a")
+        self.assertEqual(list(self.module.stream_things(None)), [1, 2])
+        self.assertEqual(asyncio.run(self.module.count_things(None)), 3)
+        for name in ("get_thing", "stream_things", "count_things"):
+            self.assertGreaterEqual(sample("db_query_seconds_count", query=name), 1, name)
+        self.assertFalse(hasattr(self.module.helper, "timed_query"))
+
+    def test_instrumenting_twice_wraps_once(self):
+        wrapped = self.module.get_thing
+        metrics.instrument_queries(self.module)
+        self.assertIs(self.module.get_thing, wrapped)
+
+    def test_app_queries_are_timed(self):
+        import queries
+
+        self.assertTrue(queries.get_prediction_by_uid.timed_query)
+        self.assertFalse(hasattr(queries.detection_row, "timed_query"))
+
+
+class TestRender(unittest.TestCase):
+    def test_stats_snapshot(self):
+        text = metrics.render({"write_behind": {"pending": 3, "lag_seconds": 0.5, "written": 10, "failed": 0}}).decode()
+        self.assertIn("write_behind_pending 3.0", text)
+        self.assertIn("write_behind_written_total 10.0", text)
+
+    def test_multiprocess_snapshot_is_labelled_with_the_pid(self):
+        with tempfile.TemporaryDirectory() as tmp, patch.dict("os.environ", {"PROMETHEUS_MULTIPROC_DIR": tmp}):
+            text = metrics.render({"inference": {"pending": 2, "capacity": 18}}).decode()
+        self.assertIn(f'inference_pending{{pid="{os.getpid()}"}} 2.0', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
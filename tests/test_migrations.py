@@ -0,0 +1,69 @@
+import unittest
+from sqlalchemy import create_engine, inspect, text
+from models import Base
+import migrations
+
+
+class TestCreateMissingIndexes(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def index_names(self, table):
+        return {index["name"] for index in inspect(self.engine).get_indexes(table)}
+
+    def test_indexes_added_to_existing_tables(self):
+        # a predictions.db created before the indexes were declared
+        with self.engine.begin() as conn:
+            conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR NOT NULL UNIQUE, pass VARCHAR)"))
+            conn.execute(text(
+                "CREATE TABLE prediction_sessions (uid VARCHAR PRIMARY KEY, timestamp DATETIME, "
+                "original_image VARCHAR, predicted_image VARCHAR, user_id INTEGER REFERENCES users(id))"
+            ))
+            conn.execute(text(
+                "CREATE TABLE detection_objects (id INTEGER PRIMARY KEY, prediction_uid VARCHAR "
+                "REFERENCES prediction_sessions(uid), label VARCHAR, score FLOAT, box VARCHAR)"
+            ))
+
+        created = migrations.upgrade(self.engine)
+
+        self.assertIn("ix_detection_objects_prediction_uid", created)
+        self.assertIn("ix_detection_objects_label_prediction_uid", created)
+        self.assertIn("ix_detection_objects_score", created)
+        self.assertIn("ix_prediction_sessions_user_id_timestamp", created)
+        self.assertIn("ix_prediction_sessions_timestamp", created)
+        self.assertTrue(self.index_names("detection_objects") >= {
+            "ix_detection_objects_prediction_uid",
+            "ix_detection_objects_label_prediction_uid",
+            "ix_detection_objects_score",
+        })
+
+    def test_box_strings_are_converted_to_numeric_columns(self):
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE detection_objects (id INTEGER PRIMARY KEY, prediction_uid VARCHAR, "
+                "label VARCHAR, score FLOAT, box VARCHAR)"
+            ))
+            conn.execute(text(
+                "INSERT INTO detection_objects (prediction_uid, label, score, box) VALUES "
+                "('a', 'dog', 0.5, '[1.5, 2.0, 11.5, 12.0]'), ('b', 'cat', 0.4, 'garbage')"
+            ))
+
+        applied = migrations.upgrade(self.engine)
+
+        self.assertIn("detection_objects.x1", applied)
+        self.assertIn("detection_objects.area", applied)
+        self.assertIn("detection_objects.box: 1 rows converted", applied)
+        with self.engine.connect() as conn:
+            rows = conn.execute(text("SELECT prediction_uid, x1, y1, x2, y2, area FROM detection_objects ORDER BY id")).fetchall()
+        self.assertEqual([tuple(row) for row in rows], [
+            ("a", 1.5, 2.0, 11.5, 12.0, 100.0),
+            ("b", None, None, None, None, None),
+        ])
+
+    def test_upgrade_is_idempotent(self):
+        Base.metadata.create_all(bind=self.engine)
+        self.assertEqual(migrations.upgrade(self.engine), [])
+        self.assertEqual(migrations.upgrade(self.engine), [])
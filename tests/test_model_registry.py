@@ -0,0 +1,306 @@
+import io
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from PIL import Image
+from app import app, init_db, predict, swap_model, apply_swaps
+from db import get_db
+from model_registry import LoadedModel, ModelRegistry, UnknownModel, read_swaps, record_swap, weights_version
+import queries
+from tests.fakes import fake_result
+
+client = TestClient(app)
+
+
+class FakeModel:
+    def __init__(self, weights):
+        self.weights = weights
+        self.names = {0: f"{os.path.basename(weights)}-thing"}
+        self.calls = 0
+
+    def __call__(self, sources, **kwargs):
+        self.calls += 1
+        return [fake_result() for _ in sources]
+
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        self.loaded = []
+
+        def loader(weights):
+            self.loaded.append(weights)
+            return FakeModel(weights)
+
+        self.registry = ModelRegistry(loader, max_loaded=2, pinned=["n"])
+        for name in ("n", "s", "m"):
+            self.registry.register(name, f"{name}.pt")
+
+    def test_models_load_on_first_use(self):
+        self.assertEqual(self.loaded, [])
+        handle = self.registry.get("s")
+        self.assertIs(self.registry.get("s"), handle)
+        self.assertEqual(self.loaded, ["s.pt"])
+        with self.assertRaises(UnknownModel):
+            self.registry.get("x")
+
+    def test_least_recently_used_unpinned_model_is_evicted(self):
+        self.registry.get("s")
+        self.registry.get("n")
+        self.registry.get("m")
+        # "n" is pinned, so "s" goes even though "n" was used longer ago than "m"
+        self.assertIsNotNone(self.registry.loaded("n"))
+        self.assertIsNone(self.registry.loaded("s"))
+        self.assertEqual(self.registry.stats()["evictions"], 1)
+        self.registry.get("s")
+        self.assertEqual(self.loaded, ["s.pt", "n.pt", "m.pt", "s.pt"])
+
+    def test_concurrent_requests_load_once(self):
+        barrier = threading.Barrier(4)
+
+        def get():
+            barrier.wait()
+            self.registry.get("m")
+
+        threads = [threading.Thread(target=get) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.loaded, ["m.pt"])
+
+    def test_swap_keeps_running_calls_on_the_old_model(self):
+        old = self.registry.get("s")
+        warmed = []
+        new = self.registry.swap("s", "s-v2.pt", warm_up=warmed.append)
+        self.assertEqual(warmed, [new.model])
+        self.assertIs(self.registry.get("s"), new)
+        # whoever held the old handle can still use it
+        self.assertEqual(old.model.weights, "s.pt")
+        self.assertEqual(self.registry.stats()["swaps"], 1)
+
+    def test_swap_can_add_a_model(self):
+        self.registry.swap("custom", "custom.pt")
+        self.assertIn("custom", self.registry.names())
+
+    def test_failed_swap_keeps_the_old_model(self):
+        old = self.registry.get("s")
+        self.registry.loader = MagicMock(side_effect=FileNotFoundError("missing.pt"))
+        with self.assertRaises(FileNotFoundError):
+            self.registry.swap("s", "missing.pt")
+        self.assertIs(self.registry.get("s"), old)
+
+    def test_follow_swaps_resident_models_and_repoints_the_others(self):
+        old = self.registry.get("s")
+        swapped = self.registry.follow("s", "s-v2.pt")
+        self.assertIsNot(swapped, old)
+        self.assertEqual(self.registry.get("s").model.weights, "s-v2.pt")
+        # "m" was never loaded here, so it only loads the new weights when it is used
+        self.assertIsNone(self.registry.follow("m", "m-v2.pt"))
+        self.assertNotIn("m-v2.pt", self.loaded)
+        self.assertEqual(self.registry.get("m").model.weights, "m-v2.pt")
+
+    def test_swap_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "swaps.json")
+            self.assertEqual(read_swaps(path), {})
+            record_swap(path, "s", "s-v2.pt")
+            record_swap(path, "n", "n-v2.pt")
+            record_swap(path, "s", "s-v3.pt")
+            self.assertEqual(read_swaps(path), {"s": "s-v3.pt", "n": "n-v2.pt"})
+
+    def test_weights_version(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "w.pt")
+            with open(path, "wb") as f:
+                f.write(b"one")
+            first = weights_version(path)
+            with open(path, "wb") as f:
+                f.write(b"two")
+            self.assertNotEqual(first, weights_version(path))
+        self.assertIsNone(weights_version("no-such-file.pt"))
+
+    def test_version_of_weights_downloaded_by_the_loader(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            downloaded = os.path.join(tmp, "yolov8s.pt")
+
+            def loader(weights):
+                # like ultralytics: the file only exists once the model is loaded
+                with open(downloaded, "wb") as f:
+                    f.write(weights.encode())
+                model = FakeModel(weights)
+                model.ckpt_path = downloaded
+                return model
+
+            registry = ModelRegistry(loader)
+            registry.register("s", "yolov8s.pt")
+            self.assertEqual(registry.get("s").version, weights_version(downloaded))
+
+    def test_swapped_weights_without_a_version_still_change_it(self):
+        first = self.registry.swap("s", "remote-a.pt")
+        second = self.registry.swap("s", "remote-b.pt")
+        self.assertIsNotNone(first.version)
+        self.assertNotEqual(first, second)
+
+    def test_handles_with_the_same_version_are_equal(self):
+        self.assertEqual(LoadedModel("s", "abc", object()), LoadedModel("s", "abc", object()))
+        self.assertNotEqual(LoadedModel("s", "abc", object()), LoadedModel("s", "def", object()))
+
+
+class TestModelRouting(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # the schema is created by the app lifespan, which TestClient only runs as a context manager
+        init_db()
+
+    def setUp(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (10, 10), color="red").save(buffer, format="JPEG")
+        self.image_bytes = buffer.getvalue()
+
+        self.registry = ModelRegistry(FakeModel, max_loaded=2, pinned=["yolov8n"])
+        self.registry.register("yolov8n", "yolov8n.pt")
+        self.registry.register("small", "small.pt")
+        self.patches = [
+            patch("app.model_registry", self.registry),
+            patch("app.model", None),
+            patch("app.LAZY_ANNOTATION", False),
+        ]
+        for p in self.patches:
+            p.start()
+        app.dependency_overrides[get_db] = lambda: MagicMock()
+        app.dependency_overrides[predict.__globals__["optional_auth"]] = lambda: None
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        app.dependency_overrides = {}
+
+    def post(self, params=None):
+        return client.post("/predict", params=params, files={"file": ("test.jpg", io.BytesIO(self.image_bytes), "image/jpeg")})
+
+    @patch("app.queries.save_prediction_with_detections")
+    def test_model_parameter_routes_the_request(self, mock_save):
+        response = self.post({"model": "small"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["labels"], ["small.pt-thing"])
+        self.assertEqual(response.json()["model"], "small")
+        self.assertEqual(mock_save.call_args.kwargs["model_name"], "small")
+
+        default = self.post()
+        self.assertEqual(default.json()["labels"], ["yolov8n.pt-thing"])
+        self.assertEqual(mock_save.call_args.kwargs["model_name"], "yolov8n")
+
+    def test_unknown_model(self):
+        response = self.post({"model": "huge"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["detail"], "Unknown model: huge")
+
+    def test_list_models(self):
+        self.post({"model": "small"})
+        models = {m["name"]: m for m in client.get("/models").json()["models"]}
+        self.assertTrue(models["small"]["loaded"])
+        self.assertFalse(models["yolov8n"]["loaded"])
+
+
+class TestModelSessionColumns(unittest.TestCase):
+    def test_model_is_saved_with_the_prediction(self):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from models import Base, PredictionSession
+
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        queries.save_prediction_with_detections(db, "a", "o.jpg", "p.jpg", 1, [], model_name="small", model_version="abc")
+        queries.save_prediction_batch(db, [{
+            "uid": "b", "original_image": None, "predicted_image": None, "user_id": 1,
+            "timestamp": None, "detections": [], "model_name": "yolov8n", "model_version": "def",
+        }])
+        rows = {p.uid: (p.model_name, p.model_version) for p in db.query(PredictionSession).all()}
+        self.assertEqual(rows, {"a": ("small", "abc"), "b": ("yolov8n", "def")})
+        db.close()
+        engine.dispose()
+
+
+class TestSwapEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.registry = ModelRegistry(FakeModel, max_loaded=2, pinned=["yolov8n"])
+        self.registry.register("yolov8n", "yolov8n.pt")
+        self.patches = [
+            patch("app.model_registry", self.registry),
+            patch("app.model", None),
+            patch("app.ADMIN_USERS", {"admin"}),
+        ]
+        for p in self.patches:
+            p.start()
+        app.dependency_overrides[swap_model.__globals__["get_current_user"]] = lambda: 1
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        app.dependency_overrides = {}
+
+    def test_admin_swaps_the_default_model(self):
+        import app as app_module
+
+        response = client.post("/admin/models/yolov8n", params={"weights": "finetuned.pt"}, auth=("admin", "pass"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["weights"], "finetuned.pt")
+        self.assertEqual(app_module.model.weights, "finetuned.pt")
+        # warmed up before it was switched in
+        self.assertEqual(app_module.model.calls, 1)
+
+    def test_swap_is_recorded_for_the_other_workers(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "swaps.json")
+            with patch("app.MODEL_SWAP_FILE", path):
+                client.post("/admin/models/yolov8n", params={"weights": "finetuned.pt"}, auth=("admin", "pass"))
+            self.assertEqual(read_swaps(path), {"yolov8n": "finetuned.pt"})
+
+    def test_workers_apply_recorded_swaps(self):
+        import app as app_module
+
+        # another worker swapped the default model; this one still serves yolov8n.pt
+        self.registry.get("yolov8n")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "swaps.json")
+            record_swap(path, "yolov8n", "finetuned.pt")
+            record_swap(path, "extra", "extra.pt")
+            with patch("app.MODEL_SWAP_FILE", path), patch.dict("app.failed_swaps", clear=True):
+                apply_swaps()
+                self.assertEqual(app_module.model.weights, "finetuned.pt")
+                self.assertEqual(self.registry.get("yolov8n").model.weights, "finetuned.pt")
+                self.assertIn("extra", self.registry.names())
+                # nothing new: nothing is loaded again
+                self.registry.loader = MagicMock()
+                apply_swaps()
+                self.registry.loader.assert_not_called()
+
+    def test_swap_that_fails_here_is_not_retried(self):
+        self.registry.get("yolov8n")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "swaps.json")
+            record_swap(path, "yolov8n", "missing.pt")
+            self.registry.loader = MagicMock(side_effect=FileNotFoundError("missing.pt"))
+            with patch("app.MODEL_SWAP_FILE", path), patch.dict("app.failed_swaps", clear=True):
+                apply_swaps()
+                apply_swaps()
+        self.registry.loader.assert_called_once_with("missing.pt")
+        self.assertEqual(self.registry.get("yolov8n").model.weights, "yolov8n.pt")
+
+    def test_non_admin_is_refused(self):
+        response = client.post("/admin/models/yolov8n", params={"weights": "finetuned.pt"}, auth=("user", "pass"))
+        self.assertEqual(response.status_code, 403)
+        self.assertIsNone(self.registry.loaded("yolov8n"))
+
+    def test_bad_weights(self):
+        self.registry.loader = MagicMock(side_effect=FileNotFoundError("missing.pt"))
+        response = client.post("/admin/models/yolov8n", params={"weights": "missing.pt"}, auth=("admin", "pass"))
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
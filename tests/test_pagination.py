@@ -0,0 +1,148 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import app, get_current_user, get_current_user_async
+from db import get_db
+from models import Base
+from pagination import decode_cursor, encode_cursor
+import queries
+
+client = TestClient(app)
+
+
+class PaginationTestCase(unittest.TestCase):
+    """Runs the listing endpoints against a small real SQLite database."""
+
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.engine = create_engine(f"sqlite:///{self.db_path}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=self.engine)
+        self.SessionLocal = sessionmaker(bind=self.engine, autoflush=False, autocommit=False)
+
+        self.base_time = datetime(2024, 1, 1, 12, 0, 0)
+        db = self.SessionLocal()
+        for i in range(5):
+            queries.save_prediction_with_detections(
+                db, f"uid-{i}", "o.jpg", "p.jpg", 1,
+                [{"label": "dog", "score": 0.2 * i, "box": [0, 0, 1, 1]}],
+            )
+            queries.get_prediction_by_uid(db, f"uid-{i}").timestamp = self.base_time + timedelta(minutes=i)
+        db.commit()
+        db.close()
+
+        def override_get_db():
+            db = self.SessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_current_user] = lambda: 1
+        app.dependency_overrides[get_current_user_async] = lambda: 1
+        self.session_patch = patch("app.SessionLocal", self.SessionLocal)
+        self.session_patch.start()
+
+    def tearDown(self):
+        self.session_patch.stop()
+        app.dependency_overrides = {}
+        self.engine.dispose()
+        os.remove(self.db_path)
+
+    def collect_pages(self, url, limit):
+        pages = []
+        cursor = None
+        while True:
+            params = {"limit": limit}
+            if cursor:
+                params["after"] = cursor
+            response = client.get(url, params=params)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json())
+            cursor = response.headers.get("x-next-cursor")
+            if not cursor:
+                return pages
+
+
+class TestLabelPagination(PaginationTestCase):
+    def test_pages_cover_all_rows_once(self):
+        pages = self.collect_pages("/predictions/label/dog", limit=2)
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        uids = [row["uid"] for page in pages for row in page]
+        self.assertEqual(uids, [f"uid-{i}" for i in range(5)])
+
+    def test_unpaginated_request_returns_everything(self):
+        response = client.get("/predictions/label/dog")
+        self.assertEqual(len(response.json()), 5)
+        self.assertNotIn("x-next-cursor", response.headers)
+
+    def test_stream_returns_ndjson(self):
+        response = client.get("/predictions/label/dog", params={"stream": "true"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("application/x-ndjson"))
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([row["uid"] for row in rows], [f"uid-{i}" for i in range(5)])
+
+    def test_stream_resumes_after_cursor(self):
+        response = client.get("/predictions/label/dog", params={"stream": "true", "after": encode_cursor("uid-2")})
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([row["uid"] for row in rows], ["uid-3", "uid-4"])
+
+    def test_invalid_cursor(self):
+        response = client.get("/predictions/label/dog", params={"after": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["detail"], "Invalid cursor")
+
+    def test_cursor_of_the_wrong_type(self):
+        for url in ("/predictions/label/dog", "/predictions/score/0.3"):
+            response = client.get(url, params={"after": encode_cursor({"a": 1})})
+            self.assertEqual(response.status_code, 400, url)
+            self.assertEqual(response.json()["detail"], "Invalid cursor")
+
+    def test_limit_is_bounded(self):
+        response = client.get("/predictions/label/dog", params={"limit": 0})
+        self.assertEqual(response.status_code, 422)
+
+
+class TestScorePagination(PaginationTestCase):
+    def test_pages_cover_all_rows_once(self):
+        pages = self.collect_pages("/predictions/score/0.3", limit=2)
+        self.assertEqual([len(page) for page in pages], [2, 1])
+        uids = [row["prediction_uid"] for page in pages for row in page]
+        self.assertEqual(uids, ["uid-2", "uid-3", "uid-4"])
+
+    def test_stream_returns_ndjson(self):
+        response = client.get("/predictions/score/0.3", params={"stream": "true"})
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([row["prediction_uid"] for row in rows], ["uid-2", "uid-3", "uid-4"])
+        self.assertEqual(set(rows[0]), {"label", "score", "box", "prediction_uid"})
+
+
+class TestCursorEncoding(unittest.TestCase):
+    def test_round_trip(self):
+        cursor = encode_cursor("2024-01-01T12:00:00", "uid-1")
+        self.assertEqual(decode_cursor(cursor, datetime, str), [datetime(2024, 1, 1, 12), "uid-1"])
+
+    def test_wrong_size_is_rejected(self):
+        from fastapi import HTTPException
+        with self.assertRaises(HTTPException):
+            decode_cursor(encode_cursor("uid-1"), datetime, str)
+
+    def test_wrong_types_are_rejected(self):
+        from fastapi import HTTPException
+        for cursor, types in [
+            (encode_cursor("not-a-date", "x"), (datetime, str)),
+            (encode_cursor({"a": 1}), (str,)),
+            (encode_cursor("7"), (int,)),
+            (encode_cursor(True), (int,)),
+        ]:
+            with self.assertRaises(HTTPException, msg=cursor) as raised:
+                decode_cursor(cursor, *types)
+            self.assertEqual(raised.exception.detail, "Invalid cursor")
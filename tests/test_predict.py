@@ -1,3 +1,4 @@
+import asyncio
 import unittest
 from unittest.mock import patch, MagicMock
 from fastapi import HTTPException
@@ -8,7 +9,7 @@ import base64
 import numpy as np
 from app import app
 from db import get_db
-from app import predict
+from app import predict, init_db
 
 client = TestClient(app)
 
@@ -19,6 +20,11 @@ def encode_credentials(username, password):
 
 
 class TestPredictEndpoint(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # the schema is created by the app lifespan, which TestClient only runs as a context manager
+        init_db()
+
     def setUp(self):
         # Fake image in memory
         self.image = Image.new("RGB", (100, 100), color="blue")
@@ -57,7 +63,28 @@ class TestPredictEndpoint(unittest.TestCase):
 
 
     @patch("app.model")
-    @patch("app.queries.save_prediction_session")
+    def test_prediction_is_saved_off_the_event_loop(self, mock_model):
+        mock_result = MagicMock()
+        mock_result.boxes = []
+        mock_result.plot.return_value = np.zeros((100, 100, 3), dtype=np.uint8)
+        mock_model.return_value = [mock_result]
+        mock_model.names = ["person"]
+        loops = []
+
+        def save(*args, **kwargs):
+            try:
+                loops.append(asyncio.get_running_loop())
+            except RuntimeError:
+                loops.append(None)
+
+        with patch("app.queries.save_prediction_with_detections", side_effect=save):
+            response = client.post("/predict", files={"file": ("test.jpg", self.image_bytes, "image/jpeg")})
+        self.assertEqual(response.status_code, 200)
+        # a worker thread has no running event loop
+        self.assertEqual(loops, [None])
+
+    @patch("app.model")
+    @patch("app.queries.save_prediction_with_detections")
     def test_predict_with_valid_auth(self, mock_save_session, mock_model):
         mock_result = MagicMock()
         mock_result.boxes = []
@@ -78,7 +105,7 @@ class TestPredictEndpoint(unittest.TestCase):
         mock_save_session.assert_called_once()
 
     @patch("app.model")
-    @patch("app.queries.save_prediction_session")
+    @patch("app.queries.save_prediction_with_detections")
     def test_predict_with_invalid_auth(self, mock_save_session, mock_model):
         mock_result = MagicMock()
         mock_result.boxes = []
@@ -101,9 +128,8 @@ class TestPredictEndpoint(unittest.TestCase):
         self.assertEqual(response.status_code, 422)
 
     @patch("app.model")
-    @patch("app.queries.save_prediction_session")
-    @patch("app.queries.save_detection_object")
-    def test_predict_with_detection_boxes(self, mock_save_obj, mock_save_session, mock_model):
+    @patch("app.queries.save_prediction_with_detections")
+    def test_predict_with_detection_boxes(self, mock_save_session, mock_model):
         mock_box = MagicMock()
         mock_box.cls = [MagicMock()]
         mock_box.cls[0].item.return_value = 0
@@ -131,6 +157,11 @@ class TestPredictEndpoint(unittest.TestCase):
         json_data = response.json()
         self.assertEqual(json_data["detection_count"], 1)
         self.assertEqual(json_data["labels"], ["person"])
+        mock_save_session.assert_called_once()
+        self.assertEqual(
+            mock_save_session.call_args[0][5],
+            [{"label": "person", "score": 0.9, "box": [0, 0, 100, 100]}]
+        )
         
     def test_optional_auth_returns_none_on_invalid_credentials(self):
         """
@@ -160,7 +191,7 @@ class TestPredictEndpoint(unittest.TestCase):
         json_data = response.json()
         self.assertIn("prediction_uid", json_data)
     @patch("app.model")
-    @patch("app.queries.save_prediction_session")
+    @patch("app.queries.save_prediction_with_detections")
     def test_predict_with_http_exception_in_credentials(self, mock_save_session, mock_model):
         """
         This test covers the code path where verify_credentials raises HTTPException
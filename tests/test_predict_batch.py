@@ -0,0 +1,149 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import app, predict_many
+from models import Base, DetectionObjects, PredictionSession
+from s3_storage import S3Storage
+import queries
+from tests.fakes import fake_box, fake_model
+
+client = TestClient(app)
+
+
+def jpeg(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (10, 10), color=color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+class TestPredictBatch(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.engine = create_engine(f"sqlite:///{self.db_path}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=self.engine)
+        self.SessionLocal = sessionmaker(bind=self.engine, autoflush=False, autocommit=False)
+
+        def override_get_db():
+            db = self.SessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        self.mock_model = fake_model(fake_box(0, 0.8, [1, 2, 3, 4]))
+        self.patches = [
+            patch("app.model", self.mock_model),
+            patch("app.SessionLocal", self.SessionLocal),
+            patch("app.get_db", override_get_db),
+            patch("app.SAVE_ORIGINALS", False),
+        ]
+        for p in self.patches:
+            p.start()
+        app.dependency_overrides[predict_many.__globals__["optional_auth"]] = lambda: MagicMock(username="user", password="pass")
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        app.dependency_overrides = {}
+        db = self.SessionLocal()
+        for prediction in db.query(PredictionSession).all():
+            if prediction.predicted_image and os.path.exists(prediction.predicted_image):
+                os.remove(prediction.predicted_image)
+        db.close()
+        self.engine.dispose()
+        os.remove(self.db_path)
+
+    def post(self, files=(), params=None):
+        response = client.post(
+            "/predict/batch",
+            files=[("files", (name, io.BytesIO(data), "image/jpeg")) for name, data in files],
+            params=params,
+        )
+        return response, [json.loads(line) for line in response.text.splitlines() if line]
+
+    @patch("app.verify_credentials", return_value=1)
+    def test_every_image_is_predicted_and_saved(self, mock_verify):
+        files = [(f"{i}.jpg", jpeg((i * 40, 0, 0))) for i in range(5)]
+        response, results = self.post(files)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+        self.assertEqual(sorted(r["index"] for r in results), list(range(5)))
+        for result in results:
+            self.assertEqual(result["filename"], f"{result['index']}.jpg")
+            self.assertEqual((result["detection_count"], result["labels"]), (1, ["person"]))
+
+        # credentials are checked once for the whole batch
+        mock_verify.assert_called_once()
+        db = self.SessionLocal()
+        self.assertEqual({p.uid for p in db.query(PredictionSession).all()}, {r["prediction_uid"] for r in results})
+        self.assertEqual({p.user_id for p in db.query(PredictionSession).all()}, {1})
+        self.assertEqual(db.query(DetectionObjects).count(), 5)
+        db.close()
+        # images arriving together share model calls
+        self.assertLess(self.mock_model.call_count, 5)
+
+    @patch("app.verify_credentials", return_value=1)
+    def test_sessions_are_saved_in_bulk(self, mock_verify):
+        files = [(f"{i}.jpg", jpeg("red")) for i in range(4)]
+        with patch("app.queries.save_prediction_batch", wraps=queries.save_prediction_batch) as mock_batch:
+            self.post(files)
+        saved = sum(len(call[0][1]) for call in mock_batch.call_args_list)
+        self.assertEqual(saved, 4)
+        self.assertLess(mock_batch.call_count, 4)
+
+    @patch("app.verify_credentials", return_value=None)
+    def test_bad_image_is_reported_without_failing_the_batch(self, mock_verify):
+        response, results = self.post([("good.jpg", jpeg("red")), ("bad.jpg", b"not an image")])
+        self.assertEqual(response.status_code, 200)
+        by_name = {r["filename"]: r for r in results}
+        self.assertEqual(by_name["bad.jpg"], {"index": 1, "filename": "bad.jpg", "status_code": 400, "error": "Invalid image file"})
+        self.assertIn("prediction_uid", by_name["good.jpg"])
+
+    @patch("app.verify_credentials", return_value=None)
+    def test_unexpected_error_is_reported_without_failing_the_batch(self, mock_verify):
+        def model(sources, **kwargs):
+            raise RuntimeError("model crashed")
+
+        self.mock_model.side_effect = model
+        response, results = self.post([("a.jpg", jpeg("red")), ("b.jpg", jpeg("blue"))])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(results, key=lambda r: r["index"]),
+            [
+                {"index": 0, "filename": "a.jpg", "status_code": 500, "error": "Internal error while processing the image"},
+                {"index": 1, "filename": "b.jpg", "status_code": 500, "error": "Internal error while processing the image"},
+            ],
+        )
+
+    @patch("app.verify_credentials", return_value=None)
+    def test_s3_keys(self, mock_verify):
+        s3_client = MagicMock()
+        s3_client.get_object.side_effect = lambda Bucket, Key: {"Body": io.BytesIO(jpeg("blue"))}
+        with patch("app.AWS_REGION", "us-east-1"), patch("app.AWS_S3_BUCKET", "bucket"), \
+                patch("app.s3", S3Storage(s3_client, "bucket")):
+            response, results = self.post(params={"img": ["a.jpg", "b.jpg"], "chat_id": "chat1"})
+        self.assertEqual({r["img"] for r in results}, {"a.jpg", "b.jpg"})
+        keys = {call.kwargs["Key"] for call in s3_client.put_object.call_args_list}
+        self.assertEqual(keys, {f"chat1/predicted/{r['prediction_uid']}.jpg" for r in results})
+
+    def test_empty_batch(self):
+        response, _ = self.post()
+        self.assertEqual(response.status_code, 400)
+
+    @patch("app.BATCH_MAX_IMAGES", 2)
+    def test_batch_size_limit(self):
+        response, _ = self.post([(f"{i}.jpg", jpeg("red")) for i in range(3)])
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
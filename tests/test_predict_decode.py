@@ -0,0 +1,71 @@
+import io
+import unittest
+from unittest.mock import patch, MagicMock
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+from app import app, predict, decode_image
+from db import get_db
+
+client = TestClient(app)
+
+
+class TestPredictInMemoryDecode(unittest.TestCase):
+    def setUp(self):
+        image_bytes = io.BytesIO()
+        Image.new("RGB", (40, 30), color="green").save(image_bytes, format="PNG")
+        self.data = image_bytes.getvalue()
+
+        mock_result = MagicMock()
+        mock_result.boxes = []
+        mock_result.plot.return_value = np.zeros((30, 40, 3), dtype=np.uint8)
+        self.mock_model = MagicMock(return_value=[mock_result])
+        self.mock_model.names = ["person"]
+
+        app.dependency_overrides[get_db] = lambda: MagicMock()
+        app.dependency_overrides[predict.__globals__["optional_auth"]] = lambda: None
+
+    def tearDown(self):
+        app.dependency_overrides = {}
+
+    def post(self):
+        return client.post("/predict", files={"file": ("test.png", io.BytesIO(self.data), "image/png")})
+
+    @patch("app.queries.save_prediction_with_detections")
+    @patch("app.save_upload")
+    def test_model_receives_decoded_array(self, mock_save_upload, mock_save_session):
+        with patch("app.model", self.mock_model):
+            response = self.post()
+
+        self.assertEqual(response.status_code, 200)
+        sources = self.mock_model.call_args[0][0]
+        self.assertIsInstance(sources[0], np.ndarray)
+        self.assertEqual(sources[0].shape, (30, 40, 3))
+
+        uid = response.json()["prediction_uid"]
+        mock_save_upload.assert_called_once_with(self.data, f"uploads/original/{uid}.png")
+        self.assertEqual(mock_save_session.call_args[0][2], f"uploads/original/{uid}.png")
+
+    @patch("app.queries.save_prediction_with_detections")
+    @patch("app.save_upload")
+    def test_original_is_not_saved_when_disabled(self, mock_save_upload, mock_save_session):
+        with patch("app.model", self.mock_model), patch("app.SAVE_ORIGINALS", False):
+            response = self.post()
+
+        self.assertEqual(response.status_code, 200)
+        mock_save_upload.assert_not_called()
+        self.assertIsNone(mock_save_session.call_args[0][2])
+
+    def test_invalid_image_returns_400(self):
+        with patch("app.model", self.mock_model):
+            response = client.post("/predict", files={"file": ("test.jpg", io.BytesIO(b"not an image"), "image/jpeg")})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["detail"], "Invalid image file")
+        self.mock_model.assert_not_called()
+
+    def test_decode_image_returns_bgr(self):
+        image_bytes = io.BytesIO()
+        Image.new("RGB", (2, 2), color=(255, 0, 0)).save(image_bytes, format="PNG")
+        decoded = decode_image(image_bytes.getvalue())
+        self.assertEqual(decoded[0, 0].tolist(), [0, 0, 255])
@@ -0,0 +1,81 @@
+import io
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+import numpy as np
+from botocore.exceptions import ClientError
+from fastapi.testclient import TestClient
+from PIL import Image
+from app import app, predict, UPLOAD_DIR
+from db import get_db
+from s3_storage import S3Storage
+
+client = TestClient(app)
+
+
+class TestPredictFromS3(unittest.TestCase):
+    def setUp(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (120, 80), color="blue").save(buffer, format="JPEG")
+        self.image_bytes = buffer.getvalue()
+
+        self.s3 = MagicMock()
+        self.s3.get_object.return_value = {"Body": io.BytesIO(self.image_bytes), "ETag": '"abc"'}
+        self.patches = [
+            patch("app.AWS_REGION", "us-east-1"),
+            patch("app.AWS_S3_BUCKET", "bucket"),
+            patch("app.s3", S3Storage(self.s3, "bucket")),
+        ]
+        for p in self.patches:
+            p.start()
+        app.dependency_overrides[get_db] = lambda: MagicMock()
+        app.dependency_overrides[predict.__globals__["optional_auth"]] = lambda: None
+
+        mock_result = MagicMock()
+        mock_result.plot.return_value = np.zeros((80, 120, 3), dtype=np.uint8)
+        mock_result.boxes = []
+        self.mock_model = MagicMock(return_value=[mock_result])
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        app.dependency_overrides = {}
+
+    @patch("app.queries.save_prediction_with_detections")
+    def test_image_is_read_and_written_in_memory(self, mock_save):
+        originals_before = set(os.listdir(UPLOAD_DIR))
+        with patch("app.model", self.mock_model):
+            response = client.post("/predict", params={"img": "photos/cat.jpg", "chat_id": "chat1"})
+
+        self.assertEqual(response.status_code, 200)
+        uid = response.json()["prediction_uid"]
+        self.s3.get_object.assert_called_once_with(Bucket="bucket", Key="photos/cat.jpg")
+        self.s3.download_file.assert_not_called()
+        self.s3.upload_file.assert_not_called()
+
+        put = self.s3.put_object.call_args.kwargs
+        self.assertEqual(put["Key"], f"chat1/predicted/{uid}.jpg")
+        self.assertEqual(put["ContentType"], "image/jpeg")
+        self.assertEqual(Image.open(io.BytesIO(put["Body"])).format, "JPEG")
+        self.assertEqual(set(os.listdir(UPLOAD_DIR)), originals_before)
+
+        # the model got the decoded array and the size comes from it
+        self.assertIsInstance(self.mock_model.call_args[0][0][0], np.ndarray)
+        self.assertEqual(mock_save.call_args.kwargs["image_width"], 120)
+        self.assertEqual(mock_save.call_args.kwargs["image_height"], 80)
+        self.assertEqual(mock_save.call_args[0][2], "s3://bucket/photos/cat.jpg")
+
+    def test_missing_key(self):
+        self.s3.get_object.side_effect = ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        response = client.post("/predict", params={"img": "missing.jpg"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_upload_error(self):
+        self.s3.put_object.side_effect = ClientError({"Error": {"Code": "AccessDenied"}}, "PutObject")
+        with patch("app.model", self.mock_model):
+            response = client.post("/predict", params={"img": "photos/cat.jpg"})
+        self.assertEqual(response.status_code, 502)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import asyncio
+import io
+import time
+import types
+import unittest
+from unittest.mock import patch, MagicMock
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+from app import app, predict, choose_imgsz, labels, run_inference
+from db import get_db
+
+client = TestClient(app)
+
+
+class TestPredictSettings(unittest.TestCase):
+    def setUp(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (100, 100), color="red").save(buffer, format="JPEG")
+        self.image_bytes = buffer.getvalue()
+
+        mock_result = MagicMock()
+        mock_result.plot.return_value = np.zeros((100, 100, 3), dtype=np.uint8)
+        mock_result.boxes = []
+        self.mock_model = MagicMock(return_value=[mock_result])
+        self.mock_model.names = dict(enumerate(labels))
+        self.patches = [
+            patch("app.model", self.mock_model),
+            patch("app.queries.save_prediction_with_detections"),
+        ]
+        for p in self.patches:
+            p.start()
+        app.dependency_overrides[get_db] = lambda: MagicMock()
+        app.dependency_overrides[predict.__globals__["optional_auth"]] = lambda: None
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        app.dependency_overrides = {}
+
+    def post(self, params=None):
+        return client.post("/predict", params=params, files={"file": ("test.jpg", io.BytesIO(self.image_bytes), "image/jpeg")})
+
+    def test_settings_are_passed_to_the_model(self):
+        response = self.post({"imgsz": 320, "conf": 0.5, "iou": 0.6, "max_det": 10, "classes": ["dog", "person"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["imgsz"], 320)
+        kwargs = self.mock_model.call_args.kwargs
+        self.assertEqual(
+            {name: kwargs[name] for name in ("imgsz", "conf", "iou", "max_det", "classes")},
+            {"imgsz": 320, "conf": 0.5, "iou": 0.6, "max_det": 10, "classes": [0, 16]},
+        )
+
+    def test_defaults(self):
+        response = self.post()
+        self.assertEqual(response.json()["imgsz"], 640)
+        kwargs = self.mock_model.call_args.kwargs
+        self.assertNotIn("conf", kwargs)
+        self.assertNotIn("classes", kwargs)
+
+    def test_unknown_label(self):
+        response = self.post({"classes": ["person", "unicorn"]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["detail"], "Unknown labels: unicorn")
+        self.mock_model.assert_not_called()
+
+    def test_invalid_values(self):
+        self.assertEqual(self.post({"imgsz": 300}).status_code, 400)
+        self.assertEqual(self.post({"imgsz": 4096}).status_code, 422)
+        self.assertEqual(self.post({"conf": 1.5}).status_code, 422)
+        self.assertEqual(self.post({"max_det": 0}).status_code, 422)
+        self.mock_model.assert_not_called()
+
+    @patch("app.ADAPTIVE_IMGSZ", [(8, 320), (4, 480)])
+    def test_deep_queue_lowers_the_input_size(self):
+        with patch("app.inference_pool", MagicMock(pending=5)):
+            self.assertEqual(choose_imgsz(None), 480)
+            # a smaller requested size is kept
+            self.assertEqual(choose_imgsz(416), 416)
+        with patch("app.inference_pool", MagicMock(pending=9)):
+            self.assertEqual(choose_imgsz(640), 320)
+        with patch("app.inference_pool", MagicMock(pending=0)):
+            self.assertEqual(choose_imgsz(None), 640)
+
+
+class SharedArgsModel:
+    """Keeps the settings of the current call on the model, like ultralytics' predictor does."""
+
+    names = dict(enumerate(labels))
+
+    def __init__(self):
+        self.args = {}
+
+    def __call__(self, sources, **kwargs):
+        self.args = kwargs
+        # long enough for a concurrent call to overwrite the settings
+        time.sleep(0.05)
+        return [types.SimpleNamespace(conf=self.args.get("conf"), classes=self.args.get("classes")) for _ in sources]
+
+
+class TestConcurrentSettings(unittest.TestCase):
+    def test_concurrent_requests_keep_their_own_settings(self):
+        image = np.zeros((32, 32, 3), dtype=np.uint8)
+
+        async def run_both():
+            return await asyncio.gather(
+                run_inference(image, {"conf": 0.0001, "imgsz": 640}),
+                run_inference(image, {"conf": 0.99, "classes": (16,), "imgsz": 640}),
+            )
+
+        with patch("app.model", SharedArgsModel()):
+            for _ in range(5):
+                low, high = asyncio.run(run_both())
+                self.assertEqual((low.conf, low.classes), (0.0001, None))
+                self.assertEqual((high.conf, high.classes), (0.99, [16]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+import cv2
+import numpy as np
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from moto import mock_aws
+import boto3
+from app import app, predict_video
+from s3_storage import S3Storage, build_s3_client
+from models import Base, DetectionObjects, PredictionSession
+from video import iter_frames, next_chunk, open_video
+from tests.fakes import fake_box, fake_model
+
+client = TestClient(app)
+
+
+def write_video(path, frames=10, size=(32, 24)):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, size)
+    for i in range(frames):
+        writer.write(np.full((size[1], size[0], 3), i * 20, dtype=np.uint8))
+    writer.release()
+
+
+class VideoTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.video_path = os.path.join(self.tmp.name, "clip.avi")
+        write_video(self.video_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+class TestIterFrames(VideoTestCase):
+    def test_stride_and_timestamps(self):
+        frames = list(iter_frames(open_video(self.video_path), stride=3))
+        self.assertEqual([index for index, _, _ in frames], [0, 3, 6, 9])
+        self.assertEqual([round(ts) for _, ts, _ in frames], [0, 300, 600, 900])
+        self.assertEqual(frames[0][2].shape, (24, 32, 3))
+
+    def test_max_frames(self):
+        frames = list(iter_frames(open_video(self.video_path), stride=2, max_frames=2))
+        self.assertEqual([index for index, _, _ in frames], [0, 2])
+
+    def test_next_chunk(self):
+        frames = iter_frames(open_video(self.video_path))
+        self.assertEqual(len(next_chunk(frames, 4)), 4)
+        self.assertEqual(len(next_chunk(frames, 4)), 4)
+        self.assertEqual(len(next_chunk(frames, 4)), 2)
+        self.assertEqual(next_chunk(frames, 4), [])
+
+
+class TestPredictVideo(VideoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp.name, 'test.db')}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=self.engine)
+        self.SessionLocal = sessionmaker(bind=self.engine, autoflush=False, autocommit=False)
+
+        self.mock_model = fake_model(fake_box(0, 0.7, [0, 0, 5, 5]))
+        self.patches = [
+            patch("app.model", self.mock_model),
+            patch("app.SessionLocal", self.SessionLocal),
+            patch("app.SAVE_ORIGINALS", False),
+            patch("app.INFERENCE_BATCH_SIZE", 3),
+        ]
+        for p in self.patches:
+            p.start()
+        app.dependency_overrides[predict_video.__globals__["optional_auth"]] = lambda: None
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        app.dependency_overrides = {}
+        self.engine.dispose()
+        super().tearDown()
+
+    def post(self, params=None, data=None):
+        with open(self.video_path, "rb") as f:
+            data = data if data is not None else f.read()
+        return client.post("/predict/video", params=params, files={"file": ("clip.avi", io.BytesIO(data), "video/x-msvideo")})
+
+    def test_frames_are_streamed_and_saved(self):
+        response = self.post({"stride": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([row["frame"] for row in rows], [0, 2, 4, 6, 8])
+        self.assertEqual(rows[0]["detections"], [{"label": "person", "score": 0.7, "box": [0, 0, 5, 5]}])
+
+        # frames go to the model in chunks of INFERENCE_BATCH_SIZE
+        self.assertEqual([len(call[0][0]) for call in self.mock_model.call_args_list], [3, 2])
+
+        db = self.SessionLocal()
+        sessions = db.query(PredictionSession).all()
+        self.assertEqual({s.uid for s in sessions}, {row["prediction_uid"] for row in rows})
+        self.assertEqual({(s.image_width, s.image_height) for s in sessions}, {(32, 24)})
+        self.assertEqual(db.query(DetectionObjects).count(), 5)
+        db.close()
+
+    def test_server_sent_events(self):
+        response = self.post({"stride": 5, "format": "sse"})
+        self.assertEqual(response.headers["content-type"].split(";")[0], "text/event-stream")
+        events = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+        self.assertEqual([event["frame"] for event in events], [0, 5])
+
+    def test_max_frames(self):
+        response = self.post({"stride": 1, "max_frames": 4})
+        self.assertEqual(len(response.text.splitlines()), 4)
+
+    def test_invalid_video(self):
+        response = self.post(data=b"not a video")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["detail"], "Invalid video file")
+
+    @mock_aws
+    def test_s3_video(self):
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="bucket")
+        storage = S3Storage(build_s3_client("us-east-1"), "bucket")
+        with open(self.video_path, "rb") as f:
+            storage.client.put_object(Bucket="bucket", Key="videos/clip.avi", Body=f.read())
+        with patch("app.AWS_REGION", "us-east-1"), patch("app.AWS_S3_BUCKET", "bucket"), patch("app.s3", storage):
+            response = client.post("/predict/video", params={"video": "videos/clip.avi", "stride": 5})
+            missing = client.post("/predict/video", params={"video": "videos/missing.avi"})
+        storage.shutdown()
+        self.assertEqual([json.loads(line)["frame"] for line in response.text.splitlines()], [0, 5])
+        self.assertEqual(missing.status_code, 404)
+        db = self.SessionLocal()
+        self.assertEqual(
+            sorted(s.original_image for s in db.query(PredictionSession).all()),
+            ["s3://bucket/videos/clip.avi#frame=0", "s3://bucket/videos/clip.avi#frame=5"],
+        )
+        db.close()
+
+    def test_missing_input(self):
+        response = client.post("/predict/video")
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
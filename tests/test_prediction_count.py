@@ -12,7 +12,7 @@ class TestPredictionCount(unittest.TestCase):
     def setUp(self):
         # Override dependencies
         app.dependency_overrides[get_db] = lambda: MagicMock()
-        app.dependency_overrides[prediction_count.__globals__["get_current_user"]] = lambda: 1
+        app.dependency_overrides[prediction_count.__globals__["get_current_user_async"]] = lambda: 1
 
     def tearDown(self):
         app.dependency_overrides = {}
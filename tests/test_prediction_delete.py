@@ -1,7 +1,7 @@
 import unittest
 from unittest.mock import patch, Mock
 from fastapi.testclient import TestClient
-from app import app, get_db
+from app import app, get_db, auth_cache
 
 client = TestClient(app)
 
@@ -21,6 +21,7 @@ class TestDeletePrediction(unittest.TestCase):
         # Override get_db with a mock
         self.mock_db = Mock()
         app.dependency_overrides[get_db] = lambda: self.mock_db
+        auth_cache.clear()
 
     def tearDown(self):
         app.dependency_overrides = {}
@@ -37,6 +38,7 @@ class TestDeletePrediction(unittest.TestCase):
 
     @patch("os.path.exists", return_value=True)
     @patch("os.remove")
+    @patch("app.queries.image_shared_with_other_predictions", return_value=False)
     @patch("app.queries.delete_prediction_session")
     @patch("app.queries.delete_detection_objects_by_uid")
     @patch("app.queries.get_prediction_by_uid")
@@ -47,6 +49,7 @@ class TestDeletePrediction(unittest.TestCase):
         mock_get_prediction,
         mock_delete_detections,
         mock_delete_session,
+        mock_shared,
         mock_remove,
         mock_exists
     ):
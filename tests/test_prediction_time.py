@@ -0,0 +1,57 @@
+import json
+import unittest
+from datetime import timedelta
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app import app
+from pagination import encode_cursor
+from tests.test_pagination import PaginationTestCase
+
+client = TestClient(app)
+
+
+class TestPredictionsByTime(PaginationTestCase):
+    def window(self, **extra):
+        return {
+            "start": (self.base_time - timedelta(minutes=1)).isoformat(),
+            "end": (self.base_time + timedelta(hours=1)).isoformat(),
+            **extra,
+        }
+
+    def test_returns_predictions_in_range(self):
+        response = client.get("/prediction/time", params={
+            "start": self.base_time.isoformat(),
+            "end": (self.base_time + timedelta(minutes=2)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["uid"] for row in response.json()], ["uid-0", "uid-1", "uid-2"])
+
+    def test_keyset_pages(self):
+        uids = []
+        cursor = None
+        while True:
+            params = self.window(limit=2)
+            if cursor:
+                params["after"] = cursor
+            response = client.get("/prediction/time", params=params)
+            uids += [row["uid"] for row in response.json()]
+            cursor = response.headers.get("x-next-cursor")
+            if not cursor:
+                break
+        self.assertEqual(uids, [f"uid-{i}" for i in range(5)])
+
+    def test_cursor_that_is_not_a_timestamp(self):
+        response = client.get("/prediction/time", params=self.window(after=encode_cursor("not-a-date", "x")))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["detail"], "Invalid cursor")
+
+    def test_stream(self):
+        response = client.get("/prediction/time", params=self.window(stream="true"))
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]["timestamp"], self.base_time.isoformat())
+
+    @patch("app.queries.get_prediction_by_uid")
+    def test_time_route_is_not_taken_for_a_uid(self, mock_get):
+        client.get("/prediction/time", params=self.window())
+        mock_get.assert_not_called()
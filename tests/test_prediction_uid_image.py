@@ -13,6 +13,7 @@ class FakePrediction:
     def __init__(self, uid, predicted_image, user_id):
         self.uid = uid
         self.predicted_image = predicted_image
+        self.original_image = None
         self.user_id = user_id
 
 
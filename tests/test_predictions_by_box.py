@@ -0,0 +1,59 @@
+import unittest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app import app
+from tests.test_pagination import PaginationTestCase
+import queries
+
+client = TestClient(app)
+
+
+class TestDetectionsByBox(PaginationTestCase):
+    def setUp(self):
+        super().setUp()
+        db = self.SessionLocal()
+        queries.save_prediction_with_detections(db, "boxes", "o.jpg", "p.jpg", 1, [
+            {"label": "car", "score": 0.9, "box": [10, 10, 20, 20]},      # area 100
+            {"label": "car", "score": 0.8, "box": [100, 100, 200, 200]},  # area 10000
+            {"label": "person", "score": 0.7, "box": [0, 0, 50, 100]},    # area 5000
+        ])
+        queries.save_prediction_with_detections(db, "other-user", "o.jpg", "p.jpg", 2, [
+            {"label": "car", "score": 0.9, "box": [10, 10, 20, 20]},
+        ])
+        db.close()
+
+    def get(self, **params):
+        response = client.get("/predictions/box", params=params)
+        self.assertEqual(response.status_code, 200, response.text)
+        return response.json()
+
+    def test_filter_by_area(self):
+        rows = self.get(min_area=1000, max_area=6000)
+        self.assertEqual([row["label"] for row in rows], ["person"])
+        self.assertEqual(rows[0]["box"], [0.0, 0.0, 50.0, 100.0])
+
+    def test_filter_by_region(self):
+        rows = self.get(x1=0, y1=0, x2=60, y2=60)
+        self.assertEqual([row["box"] for row in rows if row["prediction_uid"] == "boxes"], [[10.0, 10.0, 20.0, 20.0]])
+        self.assertNotIn("other-user", [row["prediction_uid"] for row in rows])
+
+    def test_filter_by_label_and_area(self):
+        rows = self.get(label="car", min_area=500)
+        self.assertEqual([row["box"] for row in rows], [[100.0, 100.0, 200.0, 200.0]])
+
+    def test_partial_region_is_rejected(self):
+        response = client.get("/predictions/box", params={"x1": 0, "y1": 0})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["detail"], "Region needs x1, y1, x2 and y2")
+
+    def test_inverted_region_is_rejected(self):
+        response = client.get("/predictions/box", params={"x1": 10, "y1": 0, "x2": 0, "y2": 10})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_area_range(self):
+        response = client.get("/predictions/box", params={"min_area": 10, "max_area": 1})
+        self.assertEqual(response.status_code, 400)
+
+    def test_pagination(self):
+        pages = self.collect_pages("/predictions/box", limit=2)
+        self.assertEqual(sum(len(page) for page in pages), 8)
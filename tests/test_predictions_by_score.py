@@ -3,7 +3,7 @@ from unittest.mock import patch, Mock
 from fastapi.testclient import TestClient
 from app import app
 from db import get_db
-from app import get_current_user
+from app import get_current_user_async
 
 class FakeDetectionObject:
     def __init__(self, label, score, box, prediction_uid):
@@ -78,16 +78,16 @@ class TestGetPredictionsByScore(unittest.TestCase):
 
 
     def test_prediction_score_user_id_none(self):
-        # This test overrides get_current_user to return None,
+        # This test overrides get_current_user_async to return None,
         # so the if user_id is None: line is triggered
-        app.dependency_overrides[get_current_user] = lambda: None
+        app.dependency_overrides[get_current_user_async] = lambda: None
 
         response = self.client.get("/predictions/score/0.5", auth=self.credentials)
         self.assertEqual(response.status_code, 401)
         self.assertEqual(response.json(), {"detail": "Authentication required"})
 
         # Clean override
-        app.dependency_overrides.pop(get_current_user, None)
+        app.dependency_overrides.pop(get_current_user_async, None)
 
     @patch("app.verify_credentials")
     def test_prediction_score_manual_range_check(self, mock_verify_credentials):
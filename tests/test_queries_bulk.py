@@ -0,0 +1,43 @@
+import unittest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, PredictionSession, DetectionObjects
+import queries
+
+
+class TestSavePredictionWithDetections(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=self.engine)
+        self.db = sessionmaker(bind=self.engine, autoflush=False, autocommit=False)()
+
+    def tearDown(self):
+        self.db.close()
+        self.engine.dispose()
+
+    def test_session_and_detections_saved_with_one_commit(self):
+        detections = [
+            {"label": "person", "score": 0.9, "box": [0, 0, 10, 10]},
+            {"label": "dog", "score": 0.5, "box": [5, 5, 20, 20]},
+        ]
+        with patch.object(self.db, "commit", wraps=self.db.commit) as mock_commit:
+            queries.save_prediction_with_detections(
+                self.db, "bulk-uid", "o.jpg", "p.jpg", 1, detections,
+                image_width=640, image_height=480,
+            )
+        mock_commit.assert_called_once()
+
+        session = self.db.query(PredictionSession).filter_by(uid="bulk-uid").one()
+        self.assertEqual(session.user_id, 1)
+        self.assertEqual((session.image_width, session.image_height), (640, 480))
+        rows = self.db.query(DetectionObjects).filter_by(prediction_uid="bulk-uid").order_by(DetectionObjects.id).all()
+        self.assertEqual([(r.label, r.score, r.box, r.area) for r in rows], [
+            ("person", 0.9, [0.0, 0.0, 10.0, 10.0], 100.0),
+            ("dog", 0.5, [5.0, 5.0, 20.0, 20.0], 225.0),
+        ])
+
+    def test_session_without_detections(self):
+        queries.save_prediction_with_detections(self.db, "empty-uid", "o.jpg", "p.jpg", None, [])
+        self.assertIsNotNone(queries.get_prediction_by_uid(self.db, "empty-uid"))
+        self.assertEqual(self.db.query(DetectionObjects).count(), 0)
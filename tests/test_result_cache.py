@@ -0,0 +1,174 @@
+import io
+import time
+import unittest
+from unittest.mock import patch, AsyncMock, MagicMock
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import app, predict
+from db import get_db
+from models import Base
+from result_cache import ResultCache, content_digest
+import queries
+
+client = TestClient(app)
+
+
+class TestResultCache(unittest.TestCase):
+    def test_hit_and_miss_counters(self):
+        cache = ResultCache(ttl=60, max_size=10)
+        key = ResultCache.key(content_digest(b"image"), "yolov8n.pt")
+        self.assertIsNone(cache.get(key))
+        cache.put(key, {"uid": "a"})
+        self.assertEqual(cache.get(key), {"uid": "a"})
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_key_depends_on_model_and_settings(self):
+        digest = content_digest(b"image")
+        self.assertNotEqual(ResultCache.key(digest, "a.pt"), ResultCache.key(digest, "b.pt"))
+        self.assertNotEqual(ResultCache.key(digest, "a.pt", conf=0.25), ResultCache.key(digest, "a.pt", conf=0.5))
+        self.assertEqual(ResultCache.key(digest, "a.pt", conf=0.25, iou=0.7), ResultCache.key(digest, "a.pt", iou=0.7, conf=0.25))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ResultCache(ttl=60, max_size=2)
+        cache.put("a", {"uid": "a"})
+        cache.put("b", {"uid": "b"})
+        cache.get("a")
+        cache.put("c", {"uid": "c"})
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertEqual(cache.stats()["size"], 2)
+
+    def test_entries_expire(self):
+        cache = ResultCache(ttl=0.01)
+        cache.put("a", {"uid": "a"})
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("a"))
+
+    def test_forget_prediction(self):
+        cache = ResultCache()
+        cache.put("a", {"uid": "uid-1"})
+        cache.put("b", {"uid": "uid-2"})
+        cache.forget_prediction("uid-1")
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("b"))
+
+
+class TestPredictDeduplication(unittest.TestCase):
+    def setUp(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (100, 100), color="red").save(buffer, format="JPEG")
+        self.image_bytes = buffer.getvalue()
+
+        app.dependency_overrides[get_db] = lambda: MagicMock()
+        app.dependency_overrides[predict.__globals__["optional_auth"]] = lambda: None
+        self.cache_patch = patch("app.result_cache", ResultCache(ttl=60))
+        self.cache = self.cache_patch.start()
+
+        mock_result = MagicMock()
+        mock_result.plot.return_value = np.zeros((100, 100, 3), dtype=np.uint8)
+        mock_result.boxes = []
+        self.mock_model = MagicMock(return_value=[mock_result])
+        self.mock_model.names = ["person"]
+
+    def tearDown(self):
+        self.cache_patch.stop()
+        app.dependency_overrides = {}
+
+    def post(self, data):
+        return client.post("/predict", files={"file": ("test.jpg", io.BytesIO(data), "image/jpeg")})
+
+    @patch("app.queries.save_prediction_with_detections")
+    def test_same_image_skips_the_model(self, mock_save):
+        with patch("app.model", self.mock_model):
+            first = self.post(self.image_bytes).json()
+            second = self.post(self.image_bytes).json()
+
+        self.assertEqual(self.mock_model.call_count, 1)
+        self.assertFalse(first["cached"])
+        self.assertTrue(second["cached"])
+        self.assertNotEqual(first["prediction_uid"], second["prediction_uid"])
+        # the new prediction points at the files written for the first one
+        first_call, second_call = mock_save.call_args_list
+        self.assertEqual(first_call[0][2:4], second_call[0][2:4])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    @patch("app.queries.save_prediction_with_detections")
+    def test_different_image_runs_the_model(self, mock_save):
+        buffer = io.BytesIO()
+        Image.new("RGB", (100, 100), color="green").save(buffer, format="JPEG")
+        with patch("app.model", self.mock_model):
+            self.post(self.image_bytes)
+            response = self.post(buffer.getvalue())
+        self.assertFalse(response.json()["cached"])
+        self.assertEqual(self.mock_model.call_count, 2)
+
+    @patch("app.queries.save_prediction_with_detections")
+    def test_different_settings_run_the_model(self, mock_save):
+        with patch("app.model", self.mock_model):
+            self.post(self.image_bytes)
+            response = client.post(
+                "/predict", params={"conf": 0.6}, files={"file": ("test.jpg", io.BytesIO(self.image_bytes), "image/jpeg")}
+            )
+        self.assertFalse(response.json()["cached"])
+        self.assertEqual(self.mock_model.call_count, 2)
+
+    @patch("app.RESULT_CACHE_REUSE_UID", True)
+    @patch("app.queries.save_prediction_with_detections")
+    def test_reuse_uid_returns_the_first_prediction(self, mock_save):
+        with patch("app.model", self.mock_model):
+            first = self.post(self.image_bytes).json()
+            second = self.post(self.image_bytes).json()
+        self.assertEqual(first["prediction_uid"], second["prediction_uid"])
+        mock_save.assert_called_once()
+
+    @patch("app.RESULT_CACHE_REUSE_UID", True)
+    @patch("app.queries.save_prediction_with_detections")
+    def test_reuse_uid_is_scoped_to_the_caller(self, mock_save):
+        with patch("app.model", self.mock_model), patch("app.optional_user", AsyncMock(side_effect=[1, 2, 1])):
+            first = self.post(self.image_bytes).json()
+            other_user = self.post(self.image_bytes).json()
+            same_user_other_chat = client.post(
+                "/predict", params={"chat_id": "chat2"},
+                files={"file": ("test.jpg", io.BytesIO(self.image_bytes), "image/jpeg")},
+            ).json()
+        self.assertEqual(self.mock_model.call_count, 1)
+        self.assertTrue(other_user["cached"])
+        self.assertNotEqual(first["prediction_uid"], other_user["prediction_uid"])
+        self.assertNotEqual(first["prediction_uid"], same_user_other_chat["prediction_uid"])
+        # each got a prediction row of their own
+        self.assertEqual([c[0][4] for c in mock_save.call_args_list], [1, 2, 1])
+
+    @patch("app.queries.save_prediction_with_detections")
+    def test_deleted_files_are_a_miss(self, mock_save):
+        with patch("app.model", self.mock_model):
+            self.post(self.image_bytes)
+            stored = mock_save.call_args[0][2:4]
+            with patch("app.os.path.exists", side_effect=lambda path: path not in stored):
+                response = self.post(self.image_bytes)
+        self.assertFalse(response.json()["cached"])
+        self.assertEqual(self.mock_model.call_count, 2)
+
+
+class TestSharedImages(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=self.engine)
+        self.db = sessionmaker(bind=self.engine, autoflush=False, autocommit=False)()
+        queries.save_prediction_with_detections(self.db, "first", "o.jpg", "p.jpg", 1, [])
+
+    def tearDown(self):
+        self.db.close()
+        self.engine.dispose()
+
+    def test_image_shared_with_other_predictions(self):
+        self.assertFalse(queries.image_shared_with_other_predictions(self.db, "first", "p.jpg"))
+        queries.save_prediction_with_detections(self.db, "copy", "o.jpg", "p.jpg", 1, [])
+        self.assertTrue(queries.image_shared_with_other_predictions(self.db, "first", "p.jpg"))
+        self.assertTrue(queries.image_shared_with_other_predictions(self.db, "copy", "o.jpg"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import asyncio
+import io
+import unittest
+from unittest.mock import patch, MagicMock
+import boto3
+import numpy as np
+from fastapi.testclient import TestClient
+from moto import mock_aws
+from PIL import Image
+from app import app, predict
+from db import get_db
+from result_cache import ResultCache
+from s3_storage import S3Storage, build_s3_client
+
+client = TestClient(app)
+
+
+@mock_aws
+class TestS3Storage(unittest.TestCase):
+    """Runs against moto's in-process S3."""
+
+    def setUp(self):
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="bucket")
+        self.storage = S3Storage(build_s3_client("us-east-1"), "bucket", max_concurrency=4, retry_backoff=0)
+
+    def tearDown(self):
+        self.storage.shutdown()
+
+    def test_put_get_and_etag(self):
+        asyncio.run(self.storage.put("a.jpg", b"bytes", "image/jpeg"))
+        self.assertEqual(asyncio.run(self.storage.get("a.jpg")), b"bytes")
+        self.assertTrue(asyncio.run(self.storage.etag("a.jpg")))
+        self.assertEqual(self.storage.stats()["uploaded"], 1)
+
+    def test_copy(self):
+        asyncio.run(self.storage.put("a/predicted/1.jpg", b"bytes", "image/jpeg"))
+        asyncio.run(self.storage.copy("a/predicted/1.jpg", "b/predicted/2.jpg"))
+        self.assertEqual(asyncio.run(self.storage.get("b/predicted/2.jpg")), b"bytes")
+
+    def test_background_upload(self):
+        self.storage.upload_in_background("b.jpg", b"later", "image/jpeg")
+        self.assertTrue(self.storage.flush(timeout=5))
+        self.assertEqual(asyncio.run(self.storage.get("b.jpg")), b"later")
+        self.assertEqual(self.storage.stats()["pending_uploads"], 0)
+
+    def test_background_upload_failure_is_retried_and_recorded(self):
+        storage = S3Storage(build_s3_client("us-east-1"), "no-such-bucket", upload_retries=2, retry_backoff=0)
+        storage.upload_in_background("c.jpg", b"x", "image/jpeg").result(timeout=5)
+        stats = storage.stats()
+        self.assertEqual((stats["retried"], stats["failed"], stats["failed_keys"]), (2, 1, ["c.jpg"]))
+        storage.shutdown()
+
+    def test_concurrency_is_bounded(self):
+        self.assertEqual(self.storage._submit(lambda: None).result(), None)
+        self.assertEqual(self.storage._executor._max_workers, 4)
+
+
+@mock_aws
+class TestPredictBackgroundUpload(unittest.TestCase):
+    def setUp(self):
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="bucket")
+        self.storage = S3Storage(build_s3_client("us-east-1"), "bucket", retry_backoff=0)
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 48), color="blue").save(buffer, format="JPEG")
+        asyncio.run(self.storage.put("photos/cat.jpg", buffer.getvalue(), "image/jpeg"))
+
+        self.patches = [
+            patch("app.AWS_REGION", "us-east-1"),
+            patch("app.AWS_S3_BUCKET", "bucket"),
+            patch("app.s3", self.storage),
+            patch("app.S3_BACKGROUND_UPLOAD", True),
+        ]
+        for p in self.patches:
+            p.start()
+        app.dependency_overrides[get_db] = lambda: MagicMock()
+        app.dependency_overrides[predict.__globals__["optional_auth"]] = lambda: None
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        app.dependency_overrides = {}
+        self.storage.shutdown()
+
+    @patch("app.queries.save_prediction_with_detections")
+    def test_annotated_image_is_uploaded_after_the_response(self, mock_save):
+        mock_result = MagicMock()
+        mock_result.plot.return_value = np.zeros((48, 64, 3), dtype=np.uint8)
+        mock_result.boxes = []
+        with patch("app.model", MagicMock(return_value=[mock_result])):
+            response = client.post("/predict", params={"img": "photos/cat.jpg", "chat_id": "chat1"})
+        self.assertEqual(response.status_code, 200)
+        uid = response.json()["prediction_uid"]
+
+        self.assertTrue(self.storage.flush(timeout=5))
+        body = asyncio.run(self.storage.get(f"chat1/predicted/{uid}.jpg"))
+        self.assertEqual(Image.open(io.BytesIO(body)).size, (64, 48))
+        self.assertEqual(client.get("/stats/s3").json()["uploaded"], 2)
+
+    @patch("app.queries.save_prediction_with_detections")
+    def test_cache_hit_is_copied_into_the_callers_prefix(self, mock_save):
+        mock_result = MagicMock()
+        mock_result.plot.return_value = np.zeros((48, 64, 3), dtype=np.uint8)
+        mock_result.boxes = []
+        mock_model = MagicMock(return_value=[mock_result])
+        with patch("app.model", mock_model), patch("app.result_cache", ResultCache(ttl=60)):
+            first = client.post("/predict", params={"img": "photos/cat.jpg", "chat_id": "chat1"}).json()
+            self.assertTrue(self.storage.flush(timeout=5))
+            second = client.post("/predict", params={"img": "photos/cat.jpg", "chat_id": "chat2"}).json()
+        self.assertEqual(mock_model.call_count, 1)
+        self.assertTrue(second["cached"])
+        uid = second["prediction_uid"]
+        self.assertEqual(mock_save.call_args[0][3], f"s3://bucket/chat2/predicted/{uid}.jpg")
+        self.assertEqual(
+            asyncio.run(self.storage.get(f"chat2/predicted/{uid}.jpg")),
+            asyncio.run(self.storage.get(f"chat1/predicted/{first['prediction_uid']}.jpg")),
+        )
+
+    @patch("app.queries.save_prediction_with_detections")
+    def test_cache_hit_whose_object_is_missing_runs_the_model(self, mock_save):
+        mock_result = MagicMock()
+        mock_result.plot.return_value = np.zeros((48, 64, 3), dtype=np.uint8)
+        mock_result.boxes = []
+        mock_model = MagicMock(return_value=[mock_result])
+        with patch("app.model", mock_model), patch("app.result_cache", ResultCache(ttl=60)), \
+                patch("app.S3_BACKGROUND_UPLOAD", False):
+            first = client.post("/predict", params={"img": "photos/cat.jpg", "chat_id": "chat1"}).json()
+            self.storage.client.delete_object(Bucket="bucket", Key=f"chat1/predicted/{first['prediction_uid']}.jpg")
+            second = client.post("/predict", params={"img": "photos/cat.jpg", "chat_id": "chat2"}).json()
+        self.assertFalse(second["cached"])
+        self.assertEqual(mock_model.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import gc
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+import serve
+
+
+class TestPlanWorkers(unittest.TestCase):
+    def test_workers_default_to_half_the_cores(self):
+        self.assertEqual(serve.plan_workers(8), {"workers": 4, "threads": 2})
+        self.assertEqual(serve.plan_workers(1), {"workers": 1, "threads": 1})
+
+    def test_every_core_is_used(self):
+        # a worker's model runs one call at a time, so that call gets the worker's whole share
+        self.assertEqual(serve.plan_workers(16), {"workers": 8, "threads": 2})
+        self.assertEqual(serve.plan_workers(16, workers=2), {"workers": 2, "threads": 8})
+
+    def test_never_less_than_one_thread(self):
+        self.assertEqual(serve.plan_workers(2, workers=8)["threads"], 1)
+
+    def test_available_cpus(self):
+        self.assertGreaterEqual(serve.available_cpus(), 1)
+
+
+class TestPreload(unittest.TestCase):
+    def setUp(self):
+        self.patches = [
+            patch("app.init_db"),
+            patch("app.get_model"),
+            patch.dict("app.startup", {"timings": {}, "preloaded": False}),
+            patch("gc.freeze"),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_database_and_model_are_prepared_before_fork(self):
+        import app
+
+        with patch("app.MODEL_BACKEND", "torch"):
+            self.assertIs(serve.preload(), app.app)
+        app.init_db.assert_called_once()
+        # the predictor (and its fused copy of the weights) is built before the fork
+        self.assertEqual(app.get_model.return_value.call_args.kwargs["device"], "cpu")
+        self.assertTrue(app.startup["preloaded"])
+        self.assertIn("preload_model", app.startup["timings"])
+        gc.freeze.assert_called_once()
+
+    def test_other_backends_load_in_each_worker(self):
+        import app
+
+        with patch("app.MODEL_BACKEND", "onnx"):
+            serve.preload()
+        app.get_model.assert_not_called()
+        self.assertTrue(app.startup["preloaded"])
+
+    def test_lifespan_skips_preloaded_steps(self):
+        import app
+        from fastapi.testclient import TestClient
+
+        app.startup["preloaded"] = True
+        with patch("app.warm_up"), patch("app.inference_pool", MagicMock()), TestClient(app.app):
+            pass
+        app.init_db.assert_not_called()
+
+
+class TestMain(unittest.TestCase):
+    @patch("serve.Server")
+    @patch("serve.available_cpus", return_value=8)
+    def test_gunicorn_options(self, _, mock_server):
+        with patch.dict("os.environ", {"WEB_WORKERS": "2", "PORT": "9000"}):
+            os.environ.pop("MODEL_THREADS", None)
+            os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+            os.environ.pop("MODEL_SWAP_FILE", None)
+            serve.main()
+            multiproc_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+            swap_file = os.environ["MODEL_SWAP_FILE"]
+        self.assertTrue(os.path.isdir(multiproc_dir))
+        os.rmdir(multiproc_dir)
+        # every worker follows the swaps recorded here
+        self.assertTrue(os.path.isdir(os.path.dirname(swap_file)))
+        os.rmdir(os.path.dirname(swap_file))
+        options = mock_server.call_args.args[0]
+        self.assertEqual(options["workers"], 2)
+        self.assertEqual(options["bind"], "0.0.0.0:9000")
+        self.assertTrue(options["preload_app"])
+        mock_server.return_value.run.assert_called_once()
+
+        # each forked worker gets its share of the cores: 8 cores / 2 workers
+        with patch("torch.set_num_threads") as mock_threads, patch("db.engine") as mock_engine, \
+                patch("app.MODEL_THREADS", 0):
+            options["post_fork"](None, None)
+            import app
+            self.assertEqual(app.MODEL_THREADS, 4)
+        mock_threads.assert_called_once_with(4)
+        mock_engine.dispose.assert_called_once_with(close=False)
+
+    def test_server_config(self):
+        server = serve.Server({"workers": 3, "worker_class": "uvicorn_worker.UvicornWorker", "preload_app": True})
+        self.assertEqual(server.cfg.workers, 3)
+        self.assertTrue(server.cfg.preload_app)
+        self.assertEqual(server.cfg.worker_class_str, "uvicorn_worker.UvicornWorker")
+
+
+if __name__ == "__main__":
+    unittest.main()
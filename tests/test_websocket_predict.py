@@ -0,0 +1,102 @@
+import asyncio
+import base64
+import io
+import unittest
+from unittest.mock import patch, MagicMock
+from fastapi import WebSocketDisconnect
+from fastapi.testclient import TestClient
+from PIL import Image
+from app import app, receive_frames
+from tests.fakes import fake_box, fake_model
+
+client = TestClient(app)
+AUTH = {"Authorization": "Basic " + base64.b64encode(b"user:pass").decode()}
+
+
+def jpeg():
+    buffer = io.BytesIO()
+    Image.new("RGB", (16, 16), color="red").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+class TestWebSocketPredict(unittest.TestCase):
+    def setUp(self):
+        self.mock_model = fake_model(fake_box(0, 0.5, [1, 1, 4, 4]))
+        self.model_patch = patch("app.model", self.mock_model)
+        self.model_patch.start()
+
+    def tearDown(self):
+        self.model_patch.stop()
+
+    @patch("app.verify_credentials", return_value=1)
+    def test_frames_get_detections(self, mock_verify):
+        with client.websocket_connect("/ws/predict", headers=AUTH) as ws:
+            for _ in range(3):
+                ws.send_bytes(jpeg())
+                message = ws.receive_json()
+                self.assertEqual(message["detections"], [{"label": "person", "score": 0.5, "box": [1, 1, 4, 4]}])
+                self.assertIn("inference_ms", message)
+                self.assertNotIn("prediction_uid", message)
+        # credentials are checked once, at the handshake
+        mock_verify.assert_called_once()
+
+    @patch("app.verify_credentials", return_value=1)
+    def test_invalid_frame_reports_an_error(self, mock_verify):
+        with client.websocket_connect("/ws/predict", headers=AUTH) as ws:
+            ws.send_bytes(b"garbage")
+            self.assertEqual(ws.receive_json()["error"], "Invalid image file")
+            ws.send_bytes(jpeg())
+            self.assertIn("detections", ws.receive_json())
+
+    @patch("app.verify_credentials", return_value=1)
+    @patch("app.save_prediction_records")
+    def test_persist(self, mock_save, mock_verify):
+        with client.websocket_connect("/ws/predict?persist=true", headers=AUTH) as ws:
+            ws.send_bytes(jpeg())
+            message = ws.receive_json()
+        records, user_id = mock_save.call_args[0][1], mock_save.call_args[0][2]
+        self.assertEqual(records[0]["uid"], message["prediction_uid"])
+        self.assertEqual((records[0]["image_width"], records[0]["image_height"]), (16, 16))
+        self.assertEqual(user_id, 1)
+
+    @patch("app.verify_credentials", return_value=None)
+    def test_bad_credentials_are_refused(self, mock_verify):
+        with self.assertRaises(WebSocketDisconnect) as ctx:
+            with client.websocket_connect("/ws/predict", headers=AUTH):
+                pass
+        self.assertEqual(ctx.exception.code, 1008)
+
+    def test_missing_credentials_are_refused(self):
+        with self.assertRaises(WebSocketDisconnect):
+            with client.websocket_connect("/ws/predict"):
+                pass
+
+
+class FakeSocket:
+    def __init__(self, messages):
+        self.messages = list(messages)
+
+    async def receive(self):
+        return self.messages.pop(0)
+
+
+class TestReceiveFrames(unittest.TestCase):
+    def test_stale_frames_are_dropped(self):
+        socket = FakeSocket(
+            [{"type": "websocket.receive", "bytes": bytes([i])} for i in range(4)]
+            + [{"type": "websocket.receive", "text": "hello"}, {"type": "websocket.disconnect"}]
+        )
+        stats = {"received": 0, "dropped": 0}
+
+        async def go():
+            mailbox = asyncio.Queue(maxsize=1)
+            await receive_frames(socket, mailbox, stats)
+            return mailbox.get_nowait()
+
+        # nothing consumed the mailbox, so only the end marker is left and every frame was overtaken
+        self.assertIsNone(asyncio.run(go()))
+        self.assertEqual(stats, {"received": 4, "dropped": 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
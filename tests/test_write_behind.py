@@ -0,0 +1,192 @@
+import io
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import app, predict, get_prediction
+from db import get_db
+from models import Base, PredictionSession, DetectionObjects
+from write_behind import WriteBehindQueue
+import queries
+
+client = TestClient(app)
+
+
+class TestWriteBehindQueue(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.engine = create_engine(f"sqlite:///{self.db_path}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=self.engine)
+        self.SessionLocal = sessionmaker(bind=self.engine, autoflush=False, autocommit=False)
+
+    def tearDown(self):
+        self.engine.dispose()
+        os.remove(self.db_path)
+
+    def put(self, queue, uid, detections=None):
+        return queue.put(uid, "o.jpg", "p.jpg", 1, detections or [])
+
+    def test_records_are_written_in_group_commits(self):
+        queue = WriteBehindQueue(self.SessionLocal, batch_size=10, interval_ms=50)
+        for i in range(5):
+            self.assertTrue(self.put(queue, f"uid-{i}", [{"label": "dog", "score": 0.5, "box": [0, 0, 2, 2]}]))
+        with patch("write_behind.queries.save_prediction_batch", wraps=queries.save_prediction_batch) as mock_save:
+            self.assertTrue(queue.flush(timeout=5))
+        queue.stop()
+
+        self.assertEqual(mock_save.call_count, 1)
+        db = self.SessionLocal()
+        self.assertEqual(db.query(PredictionSession).count(), 5)
+        self.assertEqual(db.query(DetectionObjects).count(), 5)
+        db.close()
+        self.assertEqual(queue.stats()["written"], 5)
+        self.assertEqual(queue.stats()["pending"], 0)
+
+    def test_pending_records_are_readable_before_commit(self):
+        release = threading.Event()
+        queue = WriteBehindQueue(lambda: release.wait() and self.SessionLocal(), interval_ms=0)
+        self.put(queue, "pending-uid")
+
+        pending = queue.get_pending("pending-uid")
+        self.assertEqual(pending.uid, "pending-uid")
+        self.assertEqual(pending.user_id, 1)
+        self.assertTrue(queue.is_pending("pending-uid"))
+        self.assertIsNone(queue.get_pending("unknown"))
+
+        release.set()
+        queue.stop()
+        self.assertFalse(queue.is_pending("pending-uid"))
+
+    def test_put_returns_false_when_buffer_is_full(self):
+        release = threading.Event()
+        queue = WriteBehindQueue(lambda: release.wait() and self.SessionLocal(), max_pending=2, interval_ms=0)
+        self.assertTrue(self.put(queue, "a"))
+        self.assertTrue(self.put(queue, "b"))
+        self.assertFalse(self.put(queue, "c"))
+        self.assertGreaterEqual(queue.stats()["lag_seconds"], 0)
+        release.set()
+        queue.stop()
+
+    def test_stop_flushes_remaining_records(self):
+        queue = WriteBehindQueue(self.SessionLocal, interval_ms=10_000)
+        self.put(queue, "last-uid")
+        queue.stop(timeout=5)
+
+        db = self.SessionLocal()
+        self.assertIsNotNone(db.query(PredictionSession).filter_by(uid="last-uid").first())
+        db.close()
+
+    def test_failed_commit_is_counted(self):
+        queue = WriteBehindQueue(self.SessionLocal, interval_ms=0)
+        with patch("write_behind.queries.save_prediction_batch", side_effect=RuntimeError("db down")):
+            self.put(queue, "lost-uid")
+            queue.flush(timeout=5)
+        queue.stop()
+        self.assertEqual(queue.stats()["failed"], 1)
+
+
+    def test_transient_failure_is_retried(self):
+        calls = []
+        save_batch = queries.save_prediction_batch
+
+        def flaky(db, predictions):
+            calls.append(len(predictions))
+            if len(calls) <= 2:
+                # still readable while the writer backs off
+                self.assertTrue(queue.is_pending("a"))
+                raise RuntimeError("database is locked")
+            return save_batch(db, predictions)
+
+        queue = WriteBehindQueue(self.SessionLocal, interval_ms=20, retry_backoff_ms=1)
+        with patch("write_behind.queries.save_prediction_batch", side_effect=flaky):
+            self.put(queue, "a")
+            self.put(queue, "b")
+            self.assertTrue(queue.flush(timeout=5))
+        queue.stop()
+        self.assertEqual(calls, [2, 2, 2])
+        self.assertEqual((queue.stats()["written"], queue.stats()["failed"]), (2, 0))
+        db = self.SessionLocal()
+        self.assertEqual(db.query(PredictionSession).count(), 2)
+        db.close()
+
+    def test_bad_record_does_not_lose_the_group(self):
+        save_batch = queries.save_prediction_batch
+
+        def save(db, predictions):
+            if any(p["uid"] == "bad" for p in predictions):
+                raise ValueError("bad row")
+            return save_batch(db, predictions)
+
+        queue = WriteBehindQueue(self.SessionLocal, interval_ms=20, retries=1, retry_backoff_ms=1)
+        with patch("write_behind.queries.save_prediction_batch", side_effect=save):
+            for uid in ("a", "bad", "c"):
+                self.put(queue, uid)
+            self.assertTrue(queue.flush(timeout=5))
+        queue.stop()
+        self.assertEqual((queue.stats()["written"], queue.stats()["failed"]), (2, 1))
+        db = self.SessionLocal()
+        self.assertEqual({p.uid for p in db.query(PredictionSession).all()}, {"a", "c"})
+        db.close()
+        self.assertFalse(queue.is_pending("bad"))
+
+
+class TestPredictWriteBehind(unittest.TestCase):
+    def setUp(self):
+        image_bytes = io.BytesIO()
+        Image.new("RGB", (20, 20), color="blue").save(image_bytes, format="JPEG")
+        self.data = image_bytes.getvalue()
+
+        mock_result = MagicMock()
+        mock_result.boxes = []
+        mock_result.plot.return_value = np.zeros((20, 20, 3), dtype=np.uint8)
+        self.mock_model = MagicMock(return_value=[mock_result])
+
+        app.dependency_overrides[get_db] = lambda: MagicMock()
+        app.dependency_overrides[predict.__globals__["optional_auth"]] = lambda: None
+        app.dependency_overrides[get_prediction.__globals__["get_current_user_async"]] = lambda: None
+
+    def tearDown(self):
+        app.dependency_overrides = {}
+
+    @patch("app.queries.get_prediction_by_uid", return_value=None)
+    @patch("app.queries.save_prediction_with_detections")
+    def test_predict_queues_write_and_result_is_readable(self, mock_save, mock_get):
+        release = threading.Event()
+        queue = WriteBehindQueue(lambda: release.wait() and MagicMock(), interval_ms=0)
+        with patch("app.model", self.mock_model), patch("app.write_behind", queue):
+            response = client.post("/predict", files={"file": ("test.jpg", io.BytesIO(self.data), "image/jpeg")})
+            self.assertEqual(response.status_code, 200)
+            uid = response.json()["prediction_uid"]
+
+            lookup = client.get(f"/prediction/{uid}")
+            self.assertEqual(lookup.status_code, 200)
+            self.assertEqual(lookup.json()["uid"], uid)
+
+            stats = client.get("/stats/write-behind").json()
+            self.assertTrue(stats["enabled"])
+            self.assertEqual(stats["pending"], 1)
+            release.set()
+            queue.stop()
+
+        mock_save.assert_not_called()
+        mock_get.assert_not_called()
+
+    @patch("app.queries.save_prediction_with_detections")
+    def test_predict_writes_synchronously_when_buffer_is_full(self, mock_save):
+        queue = MagicMock()
+        queue.put.return_value = False
+        with patch("app.model", self.mock_model), patch("app.write_behind", queue):
+            response = client.post("/predict", files={"file": ("test.jpg", io.BytesIO(self.data), "image/jpeg")})
+        self.assertEqual(response.status_code, 200)
+        mock_save.assert_called_once()
+
+    def test_stats_when_disabled(self):
+        with patch("app.write_behind", None):
+            self.assertEqual(client.get("/stats/write-behind").json(), {"enabled": False})
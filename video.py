@@ -0,0 +1,56 @@
+# video.py
+
+from typing import Iterator, Tuple
+
+import cv2
+import numpy as np
+
+
+class VideoDecodeError(Exception):
+    """Raised when a video file cannot be opened."""
+
+
+def open_video(path: str) -> cv2.VideoCapture:
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        capture.release()
+        raise VideoDecodeError(f"Cannot open video {path}")
+    return capture
+
+
+def iter_frames(
+    capture: cv2.VideoCapture, stride: int = 1, max_frames: int | None = None
+) -> Iterator[Tuple[int, float, np.ndarray]]:
+    """
+    Yield (frame_index, timestamp_ms, frame) for every `stride`-th frame of an opened video,
+    then release it. Frames are decoded one at a time and skipped frames are only grabbed,
+    not decoded, so memory use does not depend on the length of the video.
+    """
+    stride = max(1, stride)
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    try:
+        index = 0
+        sampled = 0
+        while max_frames is None or sampled < max_frames:
+            if not capture.grab():
+                break
+            if index % stride == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                timestamp_ms = index * 1000 / fps if fps > 0 else capture.get(cv2.CAP_PROP_POS_MSEC)
+                yield index, timestamp_ms, frame
+                sampled += 1
+            index += 1
+    finally:
+        capture.release()
+
+
+def next_chunk(frames: Iterator, size: int) -> list:
+    """Pull up to `size` items from `frames`; an empty list means the iterator is exhausted."""
+    chunk = []
+    for item in frames:
+        chunk.append(item)
+        if len(chunk) >= size:
+            break
+    return chunk
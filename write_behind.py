@@ -0,0 +1,190 @@
+# write_behind.py
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional
+
+import queries
+from models import PredictionSession
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """
+    Buffers finished predictions in memory and writes them from a background thread,
+    grouping many requests into one commit. Records stay readable through get_pending()
+    until their commit succeeds, so callers always see their own writes. A failed commit
+    is retried `retries` times with exponential backoff, then the records are committed
+    one by one so a single bad row does not lose the group.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        max_pending: int = 1000,
+        batch_size: int = 200,
+        interval_ms: float = 50,
+        retries: int = 3,
+        retry_backoff_ms: float = 100,
+    ):
+        self.session_factory = session_factory
+        self.max_pending = max(1, max_pending)
+        self.batch_size = max(1, batch_size)
+        self.interval = max(0.0, interval_ms) / 1000
+        self.retries = max(0, retries)
+        self.retry_backoff = max(0.0, retry_backoff_ms) / 1000
+        self._pending = OrderedDict()  # uid -> (enqueued_at, record)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.written = 0
+        self.failed = 0
+
+    def put(
+        self,
+        uid: str,
+        original_image: Optional[str],
+        predicted_image: Optional[str],
+        user_id: Optional[int],
+        detections: List[dict],
+        image_width: Optional[int] = None,
+        image_height: Optional[int] = None,
+        model_name: Optional[str] = None,
+        model_version: Optional[str] = None,
+    ) -> bool:
+        """
+        Queue a prediction for writing. Returns False when the buffer is full,
+        in which case the caller should write it synchronously instead.
+        """
+        record = {
+            "uid": uid,
+            "original_image": original_image,
+            "predicted_image": predicted_image,
+            "image_width": image_width,
+            "image_height": image_height,
+            "user_id": user_id,
+            "model_name": model_name,
+            "model_version": model_version,
+            "timestamp": datetime.now(),
+            "detections": detections,
+        }
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                return False
+            self._pending[uid] = (time.monotonic(), record)
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def get_pending(self, uid: str) -> Optional[PredictionSession]:
+        """Return a not-yet-committed prediction as a detached PredictionSession, or None."""
+        with self._cond:
+            entry = self._pending.get(uid)
+        if entry is None:
+            return None
+        record = entry[1]
+        return PredictionSession(
+            uid=record["uid"],
+            timestamp=record["timestamp"],
+            original_image=record["original_image"],
+            predicted_image=record["predicted_image"],
+            image_width=record["image_width"],
+            image_height=record["image_height"],
+            user_id=record["user_id"],
+            model_name=record["model_name"],
+            model_version=record["model_version"],
+        )
+
+    def is_pending(self, uid: str) -> bool:
+        with self._cond:
+            return uid in self._pending
+
+    def stats(self) -> dict:
+        with self._cond:
+            pending = len(self._pending)
+            oldest = next(iter(self._pending.values()))[0] if self._pending else None
+        return {
+            "pending": pending,
+            "lag_seconds": round(time.monotonic() - oldest, 3) if oldest is not None else 0.0,
+            "written": self.written,
+            "failed": self.failed,
+        }
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued so far is written. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._pending and self._thread is not None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return not self._pending
+
+    def stop(self, timeout: Optional[float] = None):
+        """Write out whatever is still buffered and stop the writer thread."""
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+        with self._cond:
+            if self._thread is thread:
+                self._thread = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if not self._pending and self._stopping:
+                    return
+                # let a group of requests accumulate unless the batch is already full
+                if len(self._pending) < self.batch_size and not self._stopping:
+                    self._cond.wait(self.interval)
+                batch = [record for _, record in list(self._pending.values())[: self.batch_size]]
+            self._write(batch)
+            with self._cond:
+                for record in batch:
+                    self._pending.pop(record["uid"], None)
+                self._cond.notify_all()
+
+    def _write(self, batch: List[dict]):
+        # the records stay in _pending, and readable, until this returns
+        for attempt in range(self.retries + 1):
+            if attempt:
+                # a locked or restarting database usually recovers within a few hundred ms
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            if self._commit(batch):
+                self.written += len(batch)
+                return
+        if len(batch) > 1:
+            logger.warning("write-behind commit of %d predictions failed, writing them one by one", len(batch))
+        for record in batch:
+            if len(batch) > 1 and self._commit([record]):
+                self.written += 1
+            else:
+                self.failed += 1
+                logger.error("write-behind gave up on prediction %s", record["uid"])
+
+    def _commit(self, records: List[dict]) -> bool:
+        db = self.session_factory()
+        try:
+            queries.save_prediction_batch(db, records)
+            return True
+        except Exception:
+            db.rollback()
+            logger.warning("write-behind commit of %d predictions failed", len(records), exc_info=True)
+            return False
+        finally:
+            db.close()